@@ -1,33 +1,20 @@
+import hashlib
 import os
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.tools import DuckDuckGoSearchRun
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
+import threading
+import time
 from dotenv import load_dotenv
+from utils import telemetry
+from utils.cache import TTLCache
+from utils.search_client import SearchClient, SearchUnavailable
+
+# langchain / langchain_google_genai / langchain_community are imported on first use (see
+# `_get_search_backend` and `_get_chain`), so processes that never run an analysis start fast.
 
 load_dotenv()
 
-def get_company_details(ticker, company_name):
-    """
-    Uses Gemini and DuckDuckGo to find company details.
-    Returns a summary and key details.
-    """
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        return "Error: GOOGLE_API_KEY not found in environment variables."
+SEARCH_FALLBACK = "Search rate limit exceeded. Please rely on your internal knowledge."
 
-    try:
-        llm = ChatGoogleGenerativeAI(model="gemma-3-12b-it", google_api_key=api_key, temperature=0.7)
-        search = DuckDuckGoSearchRun()
-        
-        # Simple search for now, can be improved with an agent if complex logic is needed
-        query = f"Latest recent news and company profile for {company_name} ({ticker})"
-        try:
-            search_results = search.run(query)
-        except Exception:
-            search_results = "Search rate limit exceeded. Please rely on your internal knowledge."
-        
-        prompt_template = """
+PROMPT_TEMPLATE = """
         You are a financial analyst. Given the following search results about a company, provide a comprehensive summary.
         
         Company: {company_name} ({ticker})
@@ -45,12 +32,159 @@ def get_company_details(ticker, company_name):
         
         Format the output nicely in Markdown.
         """
+
+# prompt|llm chain, built once and reused by every analysis
+_chain = None
+_chain_api_key = None
+_clients_lock = threading.Lock()
+
+# Generated summaries, keyed by (ticker, fingerprint of company name + search results), so
+# a summary is only regenerated when the underlying news changes.
+analysis_cache = TTLCache(
+    "analysis",
+    ttl=float(os.getenv("ANALYSIS_CACHE_TTL", "86400")),
+    max_entries=int(os.getenv("ANALYSIS_CACHE_ENTRIES", "2000")),
+    max_bytes=int(os.getenv("ANALYSIS_CACHE_MB", "32")) * 1024 * 1024,
+    persist_dir=os.getenv("STOCK_CACHE_DIR", ".cache")
+)
+
+# Latest fingerprint per ticker. Within this TTL a repeat lookup trusts it and skips the
+# search entirely; afterwards the search is re-run and compared.
+fingerprint_cache = TTLCache(
+    "analysis_fingerprints",
+    ttl=float(os.getenv("ANALYSIS_SEARCH_RECHECK_TTL", "900")),
+    max_entries=int(os.getenv("ANALYSIS_CACHE_ENTRIES", "2000")),
+    persist_dir=os.getenv("STOCK_CACHE_DIR", ".cache")
+)
+
+def _fingerprint(company_name, search_results):
+    normalized = " ".join(f"{company_name}\n{search_results}".split()).lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+def invalidate_company_details(ticker=None):
+    """
+    Invalidation hook: forgets cached summaries for one ticker (or all, when None).
+    Returns the number of summaries dropped.
+    """
+    if ticker is None:
+        fingerprint_cache.invalidate()
+        return analysis_cache.invalidate_matching(lambda key: True)
+
+    ticker = ticker.strip().upper()
+    fingerprint_cache.invalidate(ticker)
+    return analysis_cache.invalidate_matching(lambda key: key[0] == ticker)
+
+def _get_search_backend():
+    with telemetry.span("search.init"):
+        from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
+        return DuckDuckGoSearchAPIWrapper()
+
+# Shared by every analysis: rate limited, cached per query and coalesced (see search_client.py)
+search_client = SearchClient(lambda: _get_search_backend())
+
+def _search_query(ticker, company_name):
+    return f"Latest recent news and company profile for {company_name} ({ticker})"
+
+def _match_terms(ticker, company_name):
+    # Words a merged batch result must mention to be credited to this company
+    name = company_name.replace("Limited", "").replace("Ltd", "").strip(" .")
+    return [name, ticker.split(".")[0]]
+
+def _get_chain(api_key):
+    global _chain, _chain_api_key
+    with _clients_lock:
+        # Rebuilt only if the API key changes
+        if _chain is None or api_key != _chain_api_key:
+            with telemetry.span("llm.init"):
+                from langchain_google_genai import ChatGoogleGenerativeAI
+                from langchain.prompts import PromptTemplate
+
+                llm = ChatGoogleGenerativeAI(model="gemma-3-12b-it", google_api_key=api_key, temperature=0.7)
+                prompt = PromptTemplate(template=PROMPT_TEMPLATE, input_variables=["company_name", "ticker", "search_results"])
+                _chain = prompt | llm
+                _chain_api_key = api_key
+        return _chain
+
+def _chunk_text(content):
+    # Message content is either a string or a list of content parts
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+
+def stream_company_details(ticker, company_name):
+    """
+    Uses Gemini and DuckDuckGo to find company details.
+    Yields the Markdown summary in chunks as the model generates it (or all at once when
+    it comes from the cache).
+    """
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        yield "Error: GOOGLE_API_KEY not found in environment variables."
+        return
+
+    cache_ticker = ticker.strip().upper()
+
+    # Recently checked: reuse the summary without searching again
+    fingerprint = fingerprint_cache.get(cache_ticker)
+    if fingerprint is not None:
+        cached = analysis_cache.get((cache_ticker, fingerprint))
+        if cached is not None:
+            telemetry.increment("analysis_served_total", source="cache")
+            yield cached
+            return
+
+    try:
+        # Waits its turn under the rate limit; only fails once retries and the cache are exhausted
+        try:
+            search_results = search_client.search(_search_query(ticker, company_name))
+        except SearchUnavailable:
+            telemetry.increment("search_fallbacks_total")
+            search_results = SEARCH_FALLBACK
+
+        # Same news as a cached summary: no need to call the model
+        fingerprint = None
+        if search_results != SEARCH_FALLBACK:
+            fingerprint = _fingerprint(company_name, search_results)
+            fingerprint_cache.set(cache_ticker, fingerprint)
+            cached = analysis_cache.get((cache_ticker, fingerprint))
+            if cached is not None:
+                telemetry.increment("analysis_served_total", source="cache")
+                yield cached
+                return
         
-        prompt = PromptTemplate(template=prompt_template, input_variables=["company_name", "ticker", "search_results"])
-        chain = LLMChain(llm=llm, prompt=prompt)
-        
-        result = chain.run(company_name=company_name, ticker=ticker, search_results=search_results)
-        return result
+        chain = _get_chain(api_key)
+
+        parts = []
+        start = time.perf_counter()
+        with telemetry.span("llm.generate"):
+            for chunk in chain.stream({"company_name": company_name, "ticker": ticker, "search_results": search_results}):
+                text = _chunk_text(chunk.content)
+                if text:
+                    if not parts:
+                        telemetry.record_duration("llm.first_token", time.perf_counter() - start)
+                    parts.append(text)
+                    yield text
+        telemetry.increment("analysis_served_total", source="model")
+
+        # Summaries written without search results are not worth keeping
+        if fingerprint is not None and parts:
+            analysis_cache.set((cache_ticker, fingerprint), "".join(parts))
 
     except Exception as e:
-        return f"Error performing AI analysis: {e}"
+        yield f"Error performing AI analysis: {e}"
+
+def warm_company_searches(companies):
+    """
+    Batch mode: pre-fetches search results for {ticker: company_name} with merged queries,
+    so later analyses of these companies start from the search cache.
+    Returns the number of companies with results.
+    """
+    items = {ticker: (_search_query(ticker, name), _match_terms(ticker, name)) for ticker, name in companies.items()}
+    return len(search_client.search_batch(items))
+
+def get_company_details(ticker, company_name):
+    """
+    Uses Gemini and DuckDuckGo to find company details.
+    Returns a summary and key details.
+    """
+    return "".join(stream_company_details(ticker, company_name))
@@ -2,17 +2,42 @@ import streamlit as st
 import pandas as pd
 import asyncio
 import os
-import ast
+import queue
 import sys
+import time
 from dotenv import load_dotenv
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+from utils import telemetry
+from utils.mcp_pool import DEFAULT_POOL_SIZE, MCPClientPool
+from utils.payloads import decode_columns, parse_tool_result
 
 # Load environment variables
 load_dotenv()
 
 st.set_page_config(page_title="AI Stock Agent", layout="wide")
 
+# Per-stage timing panel under each search (DEBUG_TIMINGS=1 or ?debug=1)
+DEBUG_TIMINGS = os.getenv("DEBUG_TIMINGS") == "1" or st.query_params.get("debug") == "1"
+
+# Seconds between live price card refreshes (0 disables live updates)
+LIVE_QUOTE_SECONDS = float(os.getenv("LIVE_QUOTE_SECONDS", "5"))
+# Price chart: range button -> (period, interval), and the most points the server sends
+CHART_RANGES = {
+    "1D": ("1d", "5m"),
+    "5D": ("5d", "15m"),
+    "1M": ("1mo", "1d"),
+    "6M": ("6mo", "1d"),
+    "1Y": ("1y", "1d"),
+    "5Y": ("5y", "1wk"),
+    # Everything the server stores: 10 years by default (HISTORY_STORE_MAX_DAYS)
+    "Max (10Y)": ("max", "1wk")
+}
+CHART_POINTS = int(os.getenv("CHART_POINTS", "400"))
+# Universes offered in the Screener tab
+SCREENER_UNIVERSES = [name.strip() for name in os.getenv("SCREENER_UNIVERSES", "NIFTY50,NIFTY500").split(",") if name.strip()]
+# Price/technical fields only: they are there for every symbol as soon as its history is
+# stored, while fundamentals (pe_ratio, market_cap, ...) fill in over the first minutes
+SCREENER_EXAMPLE = "pct_from_52w_high > -5\nvolume_ratio > 1.5\ncurrent_price > sma_50"
+
 # Ensure markdown is installed (Auto-fix for environment mismatches)
 try:
     import markdown
@@ -197,186 +222,530 @@ if not os.getenv("GOOGLE_API_KEY"):
     st.warning("⚠️ GOOGLE_API_KEY not found. Please set it in your .env file to enable AI analysis.")
 
 
+# --- TABS ---
+search_tab, compare_tab, screener_tab = st.tabs(["Search", "Compare", "Screener"])
+
 # --- SEACH BAR ---
-ticker = st.text_input("Search Ticker", placeholder="Enter a Stock Ticker (e.g., AAPL, RELIANCE, TSLA)", help="Type a ticker symbol and hit Enter").strip().upper()
+# Suggestions shown under the search box while typing
+SEARCH_SUGGESTIONS = int(os.getenv("SEARCH_SUGGESTIONS", "5"))
+
+def run_search(query=None):
+    # Button callback: starts the search (for `query`, or else what is in the search box)
+    # on the next full rerun
+    if query is None:
+        query = st.session_state.get("ticker_query", "")
+    st.session_state["ticker_query"] = query
+    st.session_state["ticker_input"] = query.strip().upper()
+
+@st.fragment
+def render_search_bar():
+    # Typing only reruns this fragment (for the suggestions); a search reruns the page
+    query_col, button_col = st.columns([6, 1], vertical_alignment="bottom")
+    query = query_col.text_input("Search Ticker", placeholder="Enter a Stock Ticker or Company (e.g., RELIANCE, TCS, Infosys)",
+                                 help="Type a ticker symbol or company name, then pick a suggestion or press Search",
+                                 key="ticker_query", live="300ms")
+    if button_col.button("Search", type="primary", use_container_width=True, on_click=run_search):
+        st.rerun()
+
+    if query.strip() and query.strip().upper() != st.session_state.get("ticker_input"):
+        matches = search_symbols_via_mcp(query.strip())
+        if matches:
+            for col, match in zip(st.columns(len(matches)), matches):
+                symbol = match["symbol"].removesuffix(".NS")
+                if col.button(f"{symbol} · {match['name']}", key=f"complete_{match['symbol']}", on_click=run_search, args=(symbol,)):
+                    st.rerun()
 
 # --- MCP FUNCTIONS ---
-async def get_metrics_via_mcp(ticker_symbol):
-    server_params = StdioServerParameters(
-        command=sys.executable,
-        args=["stock_mcp_server.py"],
-        env=os.environ
+@st.cache_resource
+def get_mcp_pool():
+    # One warm pool per Streamlit process: survives reruns and is shared by all browser sessions.
+    # Set MCP_SERVER_URL (e.g. http://127.0.0.1:8000/mcp) to use a shared server instead of stdio.
+    return MCPClientPool(
+        server_script="stock_mcp_server.py",
+        pool_size=DEFAULT_POOL_SIZE,
+        env=os.environ,
+        server_url=os.getenv("MCP_SERVER_URL")
     )
-    
-    async with stdio_client(server_params) as (read, write):
-        async with ClientSession(read, write) as session:
-            await session.initialize()
-            result = await session.call_tool("get_stock_metrics", arguments={"ticker": ticker_symbol})
-            return result.content[0].text
-
-async def get_analysis_via_mcp(ticker_symbol, company_name):
-    server_params = StdioServerParameters(
-        command=sys.executable,
-        args=["stock_mcp_server.py"],
-        env=os.environ
+
+def resolve_ticker_via_mcp(query):
+    """
+    Checks the query against the server's local symbol master (no market-data call).
+    Returns the "symbol_resolution" payload, or None if the server cannot resolve.
+    """
+    try:
+        return parse_tool_result(get_mcp_pool().call_tool("resolve_ticker", arguments={"query": query}), expected_kind="symbol_resolution")
+    except Exception:
+        return None
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def search_symbols_via_mcp(query):
+    """
+    Autocomplete matches for a partial symbol or company name from the server's symbol
+    master (no market-data call). Empty when the server cannot answer.
+    """
+    try:
+        result = get_mcp_pool().call_tool("search_symbols", arguments={"query": query, "limit": SEARCH_SUGGESTIONS})
+        return parse_tool_result(result, expected_kind="symbol_search")["results"]
+    except Exception:
+        return []
+
+async def get_metrics_batch_via_mcp(ticker_symbols):
+    result = await get_mcp_pool().acall_tool("get_stock_metrics_batch", arguments={"tickers": ticker_symbols})
+    return parse_tool_result(result, expected_kind="stock_metrics_batch")["results"]
+
+def start_analysis_via_mcp(ticker_symbol, company_name):
+    """
+    Starts analyze_company in the background. Returns (future, queue): the queue receives
+    the analysis text chunk by chunk as the server streams it via progress notifications.
+    """
+    chunks = queue.Queue()
+
+    async def on_progress(progress, total, message):
+        if message:
+            chunks.put(message)
+
+    future = get_mcp_pool().submit(
+        "analyze_company",
+        arguments={"ticker": ticker_symbol, "company_name": company_name},
+        progress_callback=on_progress
     )
-    
-    async with stdio_client(server_params) as (read, write):
-        async with ClientSession(read, write) as session:
-            await session.initialize()
-            result = await session.call_tool("analyze_company", arguments={"ticker": ticker_symbol, "company_name": company_name})
-            return result.content[0].text
+    return future, chunks
 
-# --- MAIN LOGIC ---
-if ticker:
+def get_quote_updates_via_mcp(ticker_symbol, since=0, epoch=None):
+    """
+    Changed quote fields since cursor `since` (a "quote_updates" payload). Also renews the
+    server-side subscription, so the ticker stays in the shared poll set while shown.
+    Pinned to one server: cursors are per process, another would answer with full quotes.
+    """
+    result = get_mcp_pool().call_tool("get_quote_updates", arguments={"tickers": [ticker_symbol], "since": since, "epoch": epoch}, pinned=True)
+    return parse_tool_result(result, expected_kind="quote_updates")
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_price_history_via_mcp(ticker_symbol, period, interval, points):
+    """
+    Downsampled close series for the chart (a "price_history" payload, columnar encoded).
+    """
+    arguments = {"ticker": ticker_symbol, "period": period, "interval": interval, "points": points, "encoding": "columnar"}
+    return parse_tool_result(get_mcp_pool().call_tool("get_price_history", arguments=arguments), expected_kind="price_history")
+
+def screen_stocks_via_mcp(filters, universe, sort_by=None, limit=100):
+    arguments = {"filters": filters, "universe": universe, "sort_by": sort_by or None, "limit": limit}
+    return parse_tool_result(get_mcp_pool().call_tool("screen_stocks", arguments=arguments), expected_kind="screen")
+
+@st.cache_resource
+def get_known_company_names():
+    # ticker -> company name from earlier lookups (any session), used to start the AI analysis early
+    return {}
+
+# --- UI HELPERS ---
+def render_analysis_card(placeholder, analysis_text):
+    # Convert Markdown to HTML to properly verify nesting inside the div
+    html_content = markdown.markdown(analysis_text)
+
+    # Render the card with the content inside via a SINGLE st.markdown call
+    placeholder.markdown(
+        f"""
+        <div class="ai-analysis-card">
+            <div class="ai-analysis-title">Company Details</div>
+            {html_content}
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
 
-    with st.spinner(f"Getting live market data for {ticker}..."):
+def render_price_card(current_price, prev_close, currency):
+    delta = None
+    delta_percent = 0.0
+
+    if current_price and prev_close:
+        delta = current_price - prev_close
+        delta_percent = (delta / prev_close) * 100
+
+    # Determine Colors for Price Card
+    price_color = "#1d1d1f" # Default black
+    arrow = ""
+    if delta:
+        if delta > 0:
+            price_color = "#28cd41" # Apple Green
+            arrow = "↑"
+        elif delta < 0:
+            price_color = "#ff3b30" # Apple Red
+            arrow = "↓"
+
+    # Custom HTML for Price to control colors
+    st.markdown(f"""
+    <div class="metric-card-container">
+        <div class="metric-label">Price</div>
+        <div class="metric-value" style="color: {price_color};">
+            {current_price:,.2f} <span style="font-size: 16px; color: #86868b;">{currency}</span>
+        </div>
+        <div class="metric-delta" style="color: {price_color};">
+            {arrow} {abs(delta or 0):,.2f} ({delta_percent:.2f}%)
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
+
+@st.fragment(run_every=LIVE_QUOTE_SECONDS or None)
+def render_live_price_card(ticker_symbol, currency, current_price, prev_close):
+    """
+    The price card as a fragment: on its timer only this card reruns, merging the changed
+    quote fields from the server into the copy kept in session state.
+    """
+    live = st.session_state.get("live_quote")
+    first_render = live is None or live["ticker"] != ticker_symbol
+    if first_render:
+        # The metrics were fetched a moment ago; start polling on the next tick
+        live = st.session_state["live_quote"] = {
+            "ticker": ticker_symbol, "cursor": 0, "epoch": None,
+            "quote": {"price": current_price, "previous_close": prev_close}
+        }
+
+    if LIVE_QUOTE_SECONDS and not first_render:
         try:
-            # 1. Fetch Metrics
-            stock_data_str = asyncio.run(get_metrics_via_mcp(ticker))
-            
-            # Parse result
-            stock_data = None
+            updates = get_quote_updates_via_mcp(ticker_symbol, live["cursor"], live["epoch"])
+            delta = updates["quotes"].get(ticker_symbol, {})
+            if updates["full"]:
+                live["quote"] = {"price": current_price, "previous_close": prev_close}
+            live["quote"].update(delta)
+            live["cursor"], live["epoch"] = updates["cursor"], updates["epoch"]
+        except Exception:
+            pass  # keep showing the last known price
+
+    quote = live["quote"]
+    render_price_card(quote.get("price"), quote.get("previous_close"), currency)
+
+@st.fragment
+def render_price_chart(ticker_symbol, currency):
+    """
+    Close-price chart with a range picker. Picking a range reruns only this fragment, and
+    the server downsamples every range to CHART_POINTS, so it draws equally fast at any range.
+    """
+    choice = st.radio("Range", list(CHART_RANGES), index=4, horizontal=True, key="chart_range", label_visibility="collapsed")
+    period, interval = CHART_RANGES[choice]
+    try:
+        payload = get_price_history_via_mcp(ticker_symbol, period, interval, CHART_POINTS)
+    except Exception as e:
+        st.caption(f"Chart unavailable: {e}")
+        return
+    if "error" in payload:
+        st.caption(f"Chart unavailable: {payload['error']}")
+        return
+
+    series = decode_columns(payload["series"])
+    index = pd.to_datetime(series["t"], unit="s")
+    if interval.endswith("m") and interval != "1mo":
+        # Intraday bars: show exchange time
+        index = index.tz_localize("UTC").tz_convert("Asia/Kolkata").tz_localize(None)
+    st.line_chart(pd.DataFrame({"Close": series["close"]}, index=index), height=300)
+
+    stats = payload["stats"]
+    st.caption(
+        f"{choice}: {stats['change_pct']:+.2f}% · High {stats['high']:,.2f} · Low {stats['low']:,.2f} {currency}"
+        f" · {len(index)} of {payload['points_in']} points"
+    )
+
+def _stage_frame(stages):
+    frame = pd.DataFrame.from_dict(stages, orient="index")
+    if frame.empty:
+        return frame
+    return frame[["count", "errors", "p50_ms", "p90_ms", "p99_ms", "max_ms"]].sort_index()
+
+def render_debug_timings(timings):
+    """
+    Where the time went: this search's milestones, the client pool's stage latencies
+    (spawn, handshake, tool round trips) and the server's (yfinance, search, LLM, ...).
+    """
+    with st.expander("Debug timings"):
+        st.markdown("**This search** (ms after Enter)")
+        st.dataframe(pd.DataFrame({"ms": {step: round(seconds * 1000, 1) for step, seconds in timings.items()}}))
+
+        st.markdown("**Client pool** (this Streamlit process)")
+        st.dataframe(_stage_frame(telemetry.stage_summary()))
+
+        try:
+            server = parse_tool_result(get_mcp_pool().call_tool("get_metrics", arguments={"recent": 5}), expected_kind="metrics")
+        except Exception as e:
+            st.caption(f"Server metrics unavailable: {e}")
+            return
+        st.markdown("**Server** (the pooled server process that answered)")
+        st.dataframe(_stage_frame(server["stages"]))
+        for trace in server["recent_traces"]:
+            spans = ", ".join(f"{span['stage']} {span['ms']:.0f}ms" for span in trace["spans"])
+            st.caption(f"{trace['name']} {trace.get('ticker', '')} · {trace['ms']:.0f}ms · {spans or 'no upstream calls'}")
+
+# --- MAIN LOGIC ---
+with search_tab:
+    render_search_bar()
+    ticker = st.session_state.get("ticker_input", "")
+    search_started = time.perf_counter()
+    timings = {}
+
+    # 0. Reject unknown symbols up front and offer the closest matches instead
+    resolution = resolve_ticker_via_mcp(ticker) if ticker else None
+    if ticker:
+        timings["resolve"] = time.perf_counter() - search_started
+    if resolution is not None:
+        if resolution["symbol"] is None:
+            st.error(f"❌ '{ticker}' is not a listed NSE symbol or company.")
+            if resolution["suggestions"]:
+                st.caption("Did you mean:")
+                suggestion_cols = st.columns(len(resolution["suggestions"]))
+                for col, match in zip(suggestion_cols, resolution["suggestions"]):
+                    col.button(f"{match['symbol'].removesuffix('.NS')} · {match['name']}", key=f"suggest_{match['symbol']}",
+                               on_click=run_search, args=(match["symbol"].removesuffix(".NS"),))
+            ticker = ""
+        else:
+            # Company names resolve to their symbol ("INFOSYS" -> "INFY")
+            ticker = resolution["symbol"].removesuffix(".NS")
+
+    if ticker:
+
+        with st.spinner(f"Getting live market data for {ticker}..."):
             try:
-                if stock_data_str.startswith("{"):
-                    stock_data = ast.literal_eval(stock_data_str)
-            except Exception as e:
-                st.error(f"Error parsing data: {e}")
-
-            if stock_data:
-                if "error" in stock_data:
-                    st.error(f"❌ {stock_data['error']}")
-                else:
-                    # --- SUCCESS STATE UI ---
-                    company_name = stock_data.get('company_name', ticker)
-                    currency = stock_data.get('currency', 'USD')
-                    
-                    st.markdown(f"<h2 style='text-align: center; margin-bottom: 25px;'>{company_name} <span style='color: #86868b; font-weight: 400;'>({ticker})</span></h2>", unsafe_allow_html=True)
+                # 1. Fetch Metrics and indicators concurrently. If an earlier lookup told us the
+                # company name, start the AI analysis right away too (speculatively).
+                pool = get_mcp_pool()
+                metrics_future = pool.submit("get_stock_metrics", arguments={"ticker": ticker})
+                technicals_future = pool.submit("get_technicals", arguments={"tickers": [ticker]})
 
-                    # Metric Row 1
-                    col1, col2, col3, col4 = st.columns(4)
-                    
-                    current_price = stock_data.get('current_price')
-                    prev_close = stock_data.get('previous_close')
-                    
-                    delta = None
-                    delta_percent = 0.0
-                    
-                    if current_price and prev_close:
-                        delta = current_price - prev_close
-                        delta_percent = (delta / prev_close) * 100
+                known_names = get_known_company_names()
+                analysis = start_analysis_via_mcp(ticker, known_names[ticker]) if ticker in known_names else None
+
+                stock_data = None
+                try:
+                    stock_data = parse_tool_result(metrics_future.result(), expected_kind="stock_metrics")["data"]
+                    timings["metrics"] = time.perf_counter() - search_started
+                except ValueError as e:
+                    st.error(f"Error parsing data: {e}")
+
+                if not stock_data or "error" in stock_data:
+                    if analysis is not None:
+                        analysis[0].cancel()
+                    technicals_future.cancel()
+
+                if stock_data:
+                    if "error" in stock_data:
+                        st.error(f"❌ {stock_data['error']}")
+                    else:
+                        # --- SUCCESS STATE UI ---
+                        company_name = stock_data.get('company_name', ticker)
+                        currency = stock_data.get('currency', 'USD')
+
+                        # 2. The company name is known now: start the analysis before rendering anything
+                        known_names[ticker] = company_name
+                        if analysis is None:
+                            analysis = start_analysis_via_mcp(ticker, company_name)
                     
-                    # Determine Colors for Price Card
-                    price_color = "#1d1d1f" # Default black
-                    arrow = ""
-                    if delta:
-                        if delta > 0:
-                            price_color = "#28cd41" # Apple Green
-                            arrow = "↑"
-                        elif delta < 0:
-                            price_color = "#ff3b30" # Apple Red
-                            arrow = "↓"
-                            
-                    with col1:
-                        # Custom HTML for Price to control colors
-                        st.markdown(f"""
-                        <div class="metric-card-container">
-                            <div class="metric-label">Price</div>
-                            <div class="metric-value" style="color: {price_color};">
-                                {current_price:,.2f} <span style="font-size: 16px; color: #86868b;">{currency}</span>
+                        st.markdown(f"<h2 style='text-align: center; margin-bottom: 25px;'>{company_name} <span style='color: #86868b; font-weight: 400;'>({ticker})</span></h2>", unsafe_allow_html=True)
+
+                        # Metric Row 1
+                        col1, col2, col3, col4 = st.columns(4)
+
+                        with col1:
+                            # Refreshes itself in place (live quotes) without rerunning the page
+                            render_live_price_card(ticker, currency, stock_data.get('current_price'), stock_data.get('previous_close'))
+                        
+                        with col2:
+                            val = stock_data.get('market_cap')
+                            fmt_val = f"{val/1e9:.2f}B" if isinstance(val, (int, float)) else "N/A"
+                            # st.metric("Market Cap", fmt_val)
+                            st.markdown(f"""
+                            <div class="metric-card-container">
+                                <div class="metric-label">Market Cap</div>
+                                <div class="metric-value" style="color: #1d1d1f;">{fmt_val}</div>
                             </div>
-                            <div class="metric-delta" style="color: {price_color};">
-                                {arrow} {abs(delta):,.2f} ({delta_percent:.2f}%)
+                            """, unsafe_allow_html=True)
+
+                        with col3:
+                             # st.metric("52W High", f"{stock_data.get('52_week_high', 'N/A')}")
+                             st.markdown(f"""
+                            <div class="metric-card-container">
+                                <div class="metric-label">52W High</div>
+                                <div class="metric-value" style="color: #1d1d1f;">{stock_data.get('52_week_high', 'N/A')}</div>
                             </div>
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                    with col2:
-                        val = stock_data.get('market_cap')
-                        fmt_val = f"{val/1e9:.2f}B" if isinstance(val, (int, float)) else "N/A"
-                        # st.metric("Market Cap", fmt_val)
-                        st.markdown(f"""
-                        <div class="metric-card-container">
-                            <div class="metric-label">Market Cap</div>
-                            <div class="metric-value" style="color: #1d1d1f;">{fmt_val}</div>
-                        </div>
-                        """, unsafe_allow_html=True)
-
-                    with col3:
-                         # st.metric("52W High", f"{stock_data.get('52_week_high', 'N/A')}")
-                         st.markdown(f"""
-                        <div class="metric-card-container">
-                            <div class="metric-label">52W High</div>
-                            <div class="metric-value" style="color: #1d1d1f;">{stock_data.get('52_week_high', 'N/A')}</div>
-                        </div>
-                        """, unsafe_allow_html=True)
-
-                    with col4:
-                        # st.metric("52W Low", f"{stock_data.get('52_week_low', 'N/A')}")
-                        st.markdown(f"""
-                        <div class="metric-card-container">
-                            <div class="metric-label">52W Low</div>
-                            <div class="metric-value" style="color: #1d1d1f;">{stock_data.get('52_week_low', 'N/A')}</div>
-                        </div>
-                        """, unsafe_allow_html=True)
-
-
-
-                    # --- Technicals Section (Bulleted) ---
-                    st.markdown("### Technicals")
+                            """, unsafe_allow_html=True)
+
+                        with col4:
+                            # st.metric("52W Low", f"{stock_data.get('52_week_low', 'N/A')}")
+                            st.markdown(f"""
+                            <div class="metric-card-container">
+                                <div class="metric-label">52W Low</div>
+                                <div class="metric-value" style="color: #1d1d1f;">{stock_data.get('52_week_low', 'N/A')}</div>
+                            </div>
+                            """, unsafe_allow_html=True)
+                        # --- Price Chart (downsampled on the server) ---
+                        render_price_chart(ticker, currency)
+
+                        # --- Technicals Section (Bulleted) ---
+                        st.markdown("### Technicals")
                     
-                    display_keys = {
-                        "open": "Open",
-                        "day_high": "Day High",
-                        "day_low": "Day Low",
-                        "volume": "Volume",
-                        "pe_ratio": "P/E Ratio",
-                        "dividend_yield": "Div Yield",
-                        "beta": "Beta"
-                    }
+                        display_keys = {
+                            "open": "Open",
+                            "day_high": "Day High",
+                            "day_low": "Day Low",
+                            "volume": "Volume",
+                            "pe_ratio": "P/E Ratio",
+                            "dividend_yield": "Div Yield",
+                            "beta": "Beta",
+                            "rsi_14": "RSI (14)",
+                            "macd": "MACD",
+                            "sma_50": "SMA 50",
+                            "sma_200": "SMA 200",
+                            "atr_14": "ATR (14)",
+                            "volatility_20d": "Volatility (20D)"
+                        }
+
+                        # Indicators computed server-side from the stored daily history
+                        tech_values = dict(stock_data)
+                        try:
+                            indicators = parse_tool_result(technicals_future.result(), expected_kind="technicals")["results"].get(ticker, {})
+                            timings["technicals"] = time.perf_counter() - search_started
+                        except Exception:
+                            indicators = {}
+                        if "error" not in indicators:
+                            for key, val in indicators.items():
+                                if key == "volatility_20d" and isinstance(val, float):
+                                    tech_values[key] = f"{val * 100:.1f}%"
+                                elif key == "beta" and tech_values.get("beta") is not None:
+                                    continue
+                                elif isinstance(val, float):
+                                    tech_values[key] = round(val, 2)
                     
-                    # Create a multi-column bullet layout for technicals
-                    tech_cols = st.columns(4) # Distribute bullets across 4 columns for a clean look
+                        # Create a multi-column bullet layout for technicals
+                        tech_cols = st.columns(4) # Distribute bullets across 4 columns for a clean look
                     
-                    items_list = list(display_keys.items())
+                        items_list = list(display_keys.items())
                     
-                    for i, (key, label) in enumerate(items_list):
-                        val = stock_data.get(key)
-                        val_str = str(val) if val is not None else "N/A"
-                        
-                        # Calculate which column to place this item in
-                        col_index = i % 4
-                        with tech_cols[col_index]:
-                            st.markdown(
-                                f"""
-                                <div style="background-color: white; padding: 10px; border-radius: 10px; border: 1px solid #e5e5ea; margin-bottom: 10px; text-align: center;">
-                                    <div style="font-size: 12px; color: #86868b; text-transform: uppercase;">{label}</div>
-                                    <div style="font-size: 16px; font-weight: 600; color: #1d1d1f;">{val_str}</div>
-                                </div>
-                                """, 
-                                unsafe_allow_html=True
-                            )
-
-                    st.markdown("<br>", unsafe_allow_html=True)
-
-                    # --- AI Analysis Section ---
-                    with st.spinner("Analyzing market structure & news..."):
-                        analysis_text = asyncio.run(get_analysis_via_mcp(ticker, company_name))
+                        for i, (key, label) in enumerate(items_list):
+                            val = tech_values.get(key)
+                            val_str = str(val) if val is not None else "N/A"
                         
-                        # Convert Markdown to HTML to properly verify nesting inside the div
-                        import markdown
-                        html_content = markdown.markdown(analysis_text)
-                        
-                        # Render the card with the content inside via a SINGLE st.markdown call
-                        st.markdown(
-                            f"""
-                            <div class="ai-analysis-card">
-                                <div class="ai-analysis-title">Company Details</div>
-                                {html_content}
-                            </div>
-                            """, 
-                            unsafe_allow_html=True
-                        )
+                            # Calculate which column to place this item in
+                            col_index = i % 4
+                            with tech_cols[col_index]:
+                                st.markdown(
+                                    f"""
+                                    <div style="background-color: white; padding: 10px; border-radius: 10px; border: 1px solid #e5e5ea; margin-bottom: 10px; text-align: center;">
+                                        <div style="font-size: 12px; color: #86868b; text-transform: uppercase;">{label}</div>
+                                        <div style="font-size: 16px; font-weight: 600; color: #1d1d1f;">{val_str}</div>
+                                    </div>
+                                    """, 
+                                    unsafe_allow_html=True
+                                )
 
-        except Exception as e:
-            st.error(f"System Error: {str(e)}")
+                        st.markdown("<br>", unsafe_allow_html=True)
+
+                        # --- AI Analysis Section (streamed into the card as it is generated) ---
+                        analysis_future, analysis_chunks = analysis
+                        analysis_placeholder = st.empty()
+                        render_analysis_card(analysis_placeholder, "*Analyzing market structure & news...*")
+
+                        analysis_text = ""
+                        while not (analysis_future.done() and analysis_chunks.empty()):
+                            try:
+                                analysis_text += analysis_chunks.get(timeout=0.1)
+                            except queue.Empty:
+                                continue
+                            timings.setdefault("analysis first chunk", time.perf_counter() - search_started)
+                            # Drain whatever else has arrived, then repaint once
+                            while not analysis_chunks.empty():
+                                analysis_text += analysis_chunks.get_nowait()
+                            render_analysis_card(analysis_placeholder, analysis_text)
+
+                        # The final tool result is authoritative (covers servers that do not stream)
+                        render_analysis_card(analysis_placeholder, analysis_future.result().content[0].text)
+                        timings["analysis done"] = time.perf_counter() - search_started
+
+            except Exception as e:
+                st.error(f"System Error: {str(e)}")
+
+        if DEBUG_TIMINGS:
+            render_debug_timings(timings)
+
+# --- COMPARE VIEW ---
+with compare_tab:
+    watchlist = st.text_input("Compare Tickers", placeholder="Comma-separated tickers (e.g., RELIANCE, TCS, INFY, HDFCBANK)", help="Metrics for all tickers are fetched in a single batch call")
+    compare_tickers = list(dict.fromkeys(t.strip().upper() for t in watchlist.split(",") if t.strip()))
+
+    if compare_tickers:
+        with st.spinner(f"Getting live market data for {len(compare_tickers)} tickers..."):
+            try:
+                batch = asyncio.run(get_metrics_batch_via_mcp(compare_tickers))
+
+                rows = []
+                errors = []
+                for symbol in compare_tickers:
+                    data = batch.get(symbol, {"error": "No result returned"})
+                    if "error" in data:
+                        errors.append(f"**{symbol}**: {data['error']}")
+                        continue
+
+                    current_price = data.get('current_price')
+                    prev_close = data.get('previous_close')
+                    change_pct = (current_price - prev_close) / prev_close * 100 if current_price and prev_close else None
+                    market_cap = data.get('market_cap')
+
+                    rows.append({
+                        "Ticker": symbol,
+                        "Company": data.get('company_name', symbol),
+                        "Price": current_price,
+                        "Change %": change_pct,
+                        "Market Cap (B)": market_cap / 1e9 if isinstance(market_cap, (int, float)) else None,
+                        "P/E": data.get('pe_ratio'),
+                        "52W High": data.get('52_week_high'),
+                        "52W Low": data.get('52_week_low'),
+                        "Div Yield": data.get('dividend_yield'),
+                        "Currency": data.get('currency')
+                    })
+
+                if rows:
+                    st.dataframe(
+                        pd.DataFrame(rows).set_index("Ticker"),
+                        use_container_width=True,
+                        column_config={
+                            "Price": st.column_config.NumberColumn(format="%.2f"),
+                            "Change %": st.column_config.NumberColumn(format="%.2f%%"),
+                            "Market Cap (B)": st.column_config.NumberColumn(format="%.2f"),
+                            "P/E": st.column_config.NumberColumn(format="%.2f"),
+                            "52W High": st.column_config.NumberColumn(format="%.2f"),
+                            "52W Low": st.column_config.NumberColumn(format="%.2f")
+                        }
+                    )
+                for error in errors:
+                    st.error(f"❌ {error}")
+
+            except Exception as e:
+                st.error(f"System Error: {str(e)}")
+
+# --- SCREENER VIEW ---
+with screener_tab:
+    with st.form("screener_form"):
+        universe_col, sort_col = st.columns(2)
+        universe = universe_col.selectbox("Universe", SCREENER_UNIVERSES)
+        sort_by = sort_col.text_input("Sort by", placeholder="Field to rank by (default: first filter)")
+        filter_text = st.text_area("Filters", value=SCREENER_EXAMPLE, help="One per line: <field> <op> <number or field>, e.g. current_price > sma_200")
+        run_screen = st.form_submit_button("Run Screen")
+
+    if run_screen:
+        filters = [line.strip() for line in filter_text.splitlines() if line.strip()]
+        with st.spinner(f"Screening {universe}..."):
+            try:
+                screen = screen_stocks_via_mcp(filters, universe, sort_by.strip())
+                st.caption(
+                    f"{screen['matched']} of {screen['screened']} symbols match · as of {screen['as_of']}"
+                    f" · fundamentals cached for {screen['fundamentals_coverage'] * 100:.0f}%"
+                )
+                if screen["results"]:
+                    frame = pd.DataFrame(screen["results"]).set_index("symbol")
+                    if "market_cap" in frame:
+                        frame["market_cap"] = frame["market_cap"] / 1e9
+                        frame = frame.rename(columns={"market_cap": "market_cap (B)"})
+                    st.dataframe(frame, use_container_width=True, column_config={
+                        column: st.column_config.NumberColumn(format="%.2f")
+                        for column in frame.columns if column != "name"
+                    })
+                if screen["fundamentals_coverage"] < 1.0:
+                    st.info("Fundamentals (P/E, market cap, dividend yield) are still being fetched for part of this universe; filters on them skip those symbols until then.")
+
+            except Exception as e:
+                st.error(f"System Error: {str(e)}")
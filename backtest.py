@@ -0,0 +1,248 @@
+"""
+Vectorized backtesting of simple signal rules over the locally stored daily history.
+
+A whole parameter grid is evaluated array-at-a-time: positions for every (parameter
+combination, ticker, day) are built as one 3-D array per chunk of combinations, and
+returns, costs and summary statistics are reduced along the time axis. Indicators are
+computed once per distinct parameter (one SMA per window; all RSI periods in one pass).
+Chunks can optionally be spread over a process pool.
+
+Rules are long-only and trade at the close on the day the signal changes, so the position
+earns the next day's return:
+
+  sma_cross  long while SMA(fast) > SMA(slow)
+  rsi        enter when RSI(period) < lower, exit when RSI(period) > upper
+"""
+import itertools
+import os
+
+import numpy as np
+
+from utils.concurrency import get_process_pool
+from utils.risk import forward_fill, simple_returns
+from utils.stock_data import get_histories
+from utils.technicals import TRADING_DAYS, align, rsi, sma
+
+STRATEGIES = {
+    "sma_cross": {"fast": [5, 10, 20, 30, 50], "slow": [50, 100, 150, 200]},
+    "rsi": {"period": [7, 14, 21], "lower": [20, 25, 30, 35], "upper": [60, 65, 70, 75, 80]}
+}
+
+BACKTEST_LOOKBACK_DAYS = int(os.getenv("BACKTEST_LOOKBACK_DAYS", "750"))
+BACKTEST_MAX_COMBOS = int(os.getenv("BACKTEST_MAX_COMBOS", "20000"))
+# Size of the (combos x tickers x days) arrays built per chunk; bounds peak memory
+BACKTEST_CHUNK_ELEMENTS = int(os.getenv("BACKTEST_CHUNK_ELEMENTS", "4000000"))
+# Extra bars loaded before the test window so the slowest indicator is warmed up
+WARMUP_DAYS = 250
+
+STAT_FIELDS = ("total_return", "cagr", "volatility", "sharpe", "max_drawdown", "trades", "exposure")
+
+def expand_grid(strategy, grid=None):
+    """
+    Cartesian product of the grid (strategy defaults for missing keys), minus combinations
+    that make no sense (fast >= slow, lower >= upper). Returns a list of dicts.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy '{strategy}', expected one of {tuple(STRATEGIES)}")
+    grid = dict(grid or {})
+    unknown = set(grid) - set(STRATEGIES[strategy])
+    if unknown:
+        raise ValueError(f"Unknown parameters for {strategy}: {', '.join(sorted(unknown))}")
+
+    names = list(STRATEGIES[strategy])
+    values = [sorted(set(grid.get(name) or STRATEGIES[strategy][name])) for name in names]
+    combos = [dict(zip(names, combo)) for combo in itertools.product(*values)]
+    if strategy == "sma_cross":
+        combos = [c for c in combos if 1 <= c["fast"] < c["slow"]]
+    else:
+        combos = [c for c in combos if c["period"] >= 2 and 0 <= c["lower"] < c["upper"] <= 100]
+    for combo in combos:
+        for name in ("fast", "slow", "period"):
+            if name in combo:
+                combo[name] = int(combo[name])
+    if not combos:
+        raise ValueError("The parameter grid has no valid combinations")
+    if len(combos) > BACKTEST_MAX_COMBOS:
+        raise ValueError(f"Too many parameter combinations ({len(combos)}); the limit is {BACKTEST_MAX_COMBOS}")
+    return combos
+
+def indicators(close, strategy, combos, window):
+    """
+    The indicator series every combination needs, computed once over the full history:
+    {window: SMA} or {period: RSI}, each (n_tickers, n_days).
+    """
+    if strategy == "sma_cross":
+        windows = sorted({c["fast"] for c in combos} | {c["slow"] for c in combos})
+        # Only the test window is compared, so keep just that slice
+        return {w: sma(close, w)[:, -window:] for w in windows}
+
+    # All periods at once: one Wilder pass over the tiled (periods x tickers, days) matrix
+    n = close.shape[0]
+    periods = sorted({c["period"] for c in combos})
+    values = rsi(np.tile(close, (len(periods), 1)), np.repeat(np.asarray(periods, dtype=float), n))
+    return {period: values[i * n:(i + 1) * n] for i, period in enumerate(periods)}
+
+def positions(series, strategy, combos, window):
+    """
+    0/1 position held at each close of the test window, shaped (len(combos), n_tickers, window).
+    """
+    if strategy == "sma_cross":
+        fast = np.stack([series[c["fast"]] for c in combos])
+        slow = np.stack([series[c["slow"]] for c in combos])
+        return (fast > slow).astype(float)
+
+    levels = np.stack([series[c["period"]] for c in combos])
+    lower = np.array([c["lower"] for c in combos], dtype=float)[:, None, None]
+    upper = np.array([c["upper"] for c in combos], dtype=float)[:, None, None]
+    # Long while the latest entry signal is more recent than the latest exit signal
+    # (signals before the test window count too)
+    index = np.arange(levels.shape[-1])
+    last_entry = np.maximum.accumulate(np.where(levels < lower, index, -1), axis=-1)
+    last_exit = np.maximum.accumulate(np.where(levels > upper, index, -1), axis=-1)
+    return (last_entry[..., -window:] > last_exit[..., -window:]).astype(float)
+
+def simulate(position, returns, cost):
+    """
+    Daily strategy returns: yesterday's position times today's return, minus `cost` per
+    unit of position change. `returns` is (n_tickers, n_days) with 0 before listing.
+    Returns (daily returns, position changes).
+    """
+    held = np.zeros_like(position)
+    held[..., 1:] = position[..., :-1]
+    change = np.diff(position, axis=-1, prepend=0.0)
+    daily = held * returns
+    if cost:
+        daily -= cost * np.abs(change)
+    return daily, change
+
+def summarize(daily, change, position, days):
+    """
+    Statistics along the last axis. `days` (n_tickers,) counts the days each ticker was
+    listed; `daily` and `position` are zero on the others. Returns {field: array}.
+    """
+    days = np.maximum(days, 2)
+    wealth = np.cumprod(1.0 + daily, axis=-1)
+    growth = wealth[..., -1]
+    peaks = np.maximum(np.maximum.accumulate(wealth, axis=-1), 1.0)
+    mean = daily.sum(axis=-1) / days
+    variance = np.maximum(((daily * daily).sum(axis=-1) - days * mean * mean) / (days - 1), 0.0)
+    std = np.sqrt(variance)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(std > 0, mean / std * np.sqrt(TRADING_DAYS), np.nan)
+        cagr = np.where(growth > 0, growth ** (TRADING_DAYS / days) - 1.0, -1.0)
+    return {
+        "total_return": growth - 1.0,
+        "cagr": cagr,
+        "volatility": std * np.sqrt(TRADING_DAYS),
+        "sharpe": sharpe,
+        "max_drawdown": (1.0 - wealth / peaks).max(axis=-1),
+        "trades": (change > 0).sum(axis=-1).astype(float),
+        "exposure": position.sum(axis=-1) / days
+    }
+
+def evaluate_chunk(series, returns, days, strategy, combos, cost):
+    """
+    Statistics for `combos` over the test window: {field: (len(combos), n_tickers)}.
+    Module-level so it can run in a worker process.
+    """
+    position = positions(series, strategy, combos, returns.shape[-1])
+    daily, change = simulate(position, returns, cost)
+    return summarize(daily, change, position, days)
+
+def _chunks(combos, n_tickers, n_days):
+    size = max(1, BACKTEST_CHUNK_ELEMENTS // max(1, n_tickers * n_days))
+    return [combos[start:start + size] for start in range(0, len(combos), size)]
+
+def run_grid(close, strategy, combos, window, cost=0.0, processes=False):
+    """
+    Evaluates every combination over the last `window` days of the price matrix `close`
+    (n_tickers, n_days; earlier days only warm the indicators up).
+    Returns {field: (len(combos), n_tickers)}.
+    """
+    returns = simple_returns(close)[:, -window:]
+    days = (~np.isnan(returns)).sum(axis=-1)
+    returns = np.nan_to_num(returns)
+    series = indicators(close, strategy, combos, window)
+
+    chunks = _chunks(combos, close.shape[0], window)
+    if processes and len(chunks) > 1:
+        pool = get_process_pool()
+        args = [(series, returns, days, strategy, chunk, cost) for chunk in chunks]
+        parts = list(pool.map(evaluate_chunk, *zip(*args)))
+    else:
+        parts = [evaluate_chunk(series, returns, days, strategy, chunk, cost) for chunk in chunks]
+    return {field: np.concatenate([part[field] for part in parts]) for field in STAT_FIELDS}
+
+def _nanmean(values):
+    values = values[~np.isnan(values)]
+    return float(values.mean()) if len(values) else None
+
+def _stats_dict(stats, index):
+    return {field: float(stats[field][index]) for field in STAT_FIELDS}
+
+def backtest(tickers, strategy="sma_cross", grid=None, lookback=BACKTEST_LOOKBACK_DAYS, cost_bps=10.0, top=5,
+             processes=False):
+    """
+    Runs the grid over the stored histories of `tickers` (resolved like `get_stock_data`).
+    Combinations are ranked by their mean Sharpe ratio across tickers. For the `top` best,
+    returns the mean stats, per-ticker stats and the equity curve of an equal-weight
+    portfolio of the tickers; also each ticker's best combination and buy-and-hold stats.
+    """
+    combos = expand_grid(strategy, grid)
+    # Trading days -> calendar days, including the indicator warm-up
+    resolved, histories = get_histories(tickers, min_days=int((lookback + WARMUP_DAYS) * 365 / TRADING_DAYS) + 7)
+    symbols = list(dict.fromkeys(symbol for symbol in resolved.values() if not histories[symbol].empty))
+    excluded = {ticker: f"No historical data found for {symbol}. Symbol might be invalid or delisted."
+                for ticker, symbol in resolved.items() if histories[symbol].empty}
+    if not symbols:
+        raise ValueError("None of the tickers has price history")
+
+    dates, cols = align([histories[symbol] for symbol in symbols], fields=("adj_close",))
+    close = forward_fill(cols["adj_close"])[:, -(lookback + WARMUP_DAYS):]
+    window = min(lookback, close.shape[1])
+    dates = dates[-window:]
+    cost = cost_bps / 10000.0
+
+    stats = run_grid(close, strategy, combos, window, cost, processes)
+    # Mean Sharpe across tickers; combinations that never trade rank last
+    scored = ~np.isnan(stats["sharpe"])
+    mean_sharpe = np.where(scored.any(axis=1), np.nansum(stats["sharpe"], axis=1) / np.maximum(scored.sum(axis=1), 1), -np.inf)
+    ranking = np.argsort(-mean_sharpe, kind="stable")
+
+    # Equity curves only for the winners (cheap to recompute in-process)
+    best = [int(i) for i in ranking[:max(1, top)]]
+    returns = simple_returns(close)[:, -window:]
+    listed = ~np.isnan(returns)
+    returns = np.nan_to_num(returns)
+    position = positions(indicators(close, strategy, [combos[i] for i in best], window), strategy, [combos[i] for i in best], window)
+    daily, _ = simulate(position, returns, cost)
+    portfolio_curves = np.cumprod(1.0 + daily.mean(axis=1), axis=-1)
+
+    hold = listed[None].astype(float)
+    hold_stats = summarize(*simulate(hold, returns, 0.0), hold, listed.sum(axis=-1))
+
+    per_ticker_best = np.nanargmax(np.nan_to_num(stats["sharpe"], nan=-np.inf), axis=0)
+    return {
+        "strategy": strategy,
+        "combinations": len(combos),
+        "start": str(dates[0]),
+        "end": str(dates[-1]),
+        "days": int(window),
+        "cost_bps": cost_bps,
+        "dates": [str(date) for date in dates],
+        "top": [
+            {
+                "params": combos[i],
+                "mean": {field: _nanmean(stats[field][i]) for field in STAT_FIELDS},
+                "tickers": {symbol: _stats_dict(stats, (i, j)) for j, symbol in enumerate(symbols)},
+                "equity": np.round(portfolio_curves[rank], 4)
+            }
+            for rank, i in enumerate(best)
+        ],
+        "best_by_ticker": {
+            symbol: {"params": combos[per_ticker_best[j]], **_stats_dict(stats, (per_ticker_best[j], j))}
+            for j, symbol in enumerate(symbols)
+        },
+        "buy_and_hold": {symbol: _stats_dict(hold_stats, (0, j)) for j, symbol in enumerate(symbols)},
+        "excluded": excluded
+    }
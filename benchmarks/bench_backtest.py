@@ -0,0 +1,84 @@
+"""
+Runs a full SMA-crossover grid through `backtest.py` on synthetic closes. A sample of
+the grid is replayed with pandas, one combination and one ticker at a time; its time is
+extrapolated to the whole grid and its Sharpe ratios are compared.
+
+    python benchmarks/bench_backtest.py --tickers 20 --days 1000 --max-seconds 5.0
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import best_of, finish  # noqa: E402
+from utils import backtest  # noqa: E402
+from utils.technicals import TRADING_DAYS  # noqa: E402
+
+def synthetic_closes(n_tickers, n_days, seed=7):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0004, 0.018, (n_tickers, n_days))
+    return 100.0 * np.exp(np.cumsum(returns, axis=1))
+
+def naive_pandas(close, combos, window, cost):
+    """
+    Sharpe ratio of every SMA-crossover combination, one (combination, ticker) at a time.
+    """
+    sharpe = np.full((len(combos), close.shape[0]), np.nan)
+    for j in range(close.shape[0]):
+        prices = pd.Series(close[j])
+        returns = prices.pct_change().iloc[-window:].fillna(0.0)
+        for i, combo in enumerate(combos):
+            position = (prices.rolling(combo["fast"]).mean() > prices.rolling(combo["slow"]).mean()).astype(float).iloc[-window:]
+            daily = position.shift(1, fill_value=0.0) * returns - cost * position.diff().fillna(position).abs()
+            std = daily.std()
+            if std > 0:
+                sharpe[i, j] = daily.mean() / std * np.sqrt(TRADING_DAYS)
+    return sharpe
+
+def main():
+    parser = argparse.ArgumentParser(description="Grid backtester vs. a per-combination pandas loop.")
+    parser.add_argument("--tickers", type=int, default=20)
+    parser.add_argument("--days", type=int, default=1000)
+    parser.add_argument("--fast", type=int, default=40, help="Fast SMA windows 2..N")
+    parser.add_argument("--slow", type=int, default=200, help="Slow SMA windows up to N, step 5")
+    parser.add_argument("--naive-combos", type=int, default=50, help="Combinations timed with pandas (extrapolated)")
+    parser.add_argument("--processes", action="store_true", help="Spread chunks over the process pool")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--max-seconds", type=float, help="Fail if the vectorized backtester is slower than this")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    combos = backtest.expand_grid("sma_cross", {"fast": list(range(2, args.fast + 1)), "slow": list(range(10, args.slow + 1, 5))})
+    close = synthetic_closes(args.tickers, args.days + backtest.WARMUP_DAYS)
+    cost = 0.001
+
+    vec_time, stats = best_of(backtest.run_grid, args.repeats, close, "sma_cross", combos, args.days, cost, args.processes)
+    sample = combos[:args.naive_combos]
+    naive_time, naive = best_of(naive_pandas, 1, close, sample, args.days, cost)
+    naive_total = naive_time * len(combos) / len(sample)
+
+    max_abs_diff = float(np.nanmax(np.abs(stats["sharpe"][:len(sample)] - naive)))
+    results = {
+        "benchmark": "backtest",
+        "tickers": args.tickers,
+        "days": args.days,
+        "combinations": len(combos),
+        "vectorized_seconds": vec_time,
+        "naive_pandas_seconds_estimated": naive_total,
+        "speedup": naive_total / vec_time,
+        "max_abs_diff_sharpe": max_abs_diff
+    }
+
+    print(f"{len(combos)} combinations x {args.tickers} tickers x {args.days} days")
+    print(f"  vectorized numpy : {vec_time * 1000:9.1f} ms")
+    print(f"  pandas loop      : {naive_total * 1000:9.1f} ms  (estimated from {len(sample)} combinations, {results['speedup']:.0f}x slower)")
+    print(f"  max |diff|       : {max_abs_diff:.2e}")
+
+    finish(results, args.output, vec_time, args.max_seconds)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Payload size and encode time for price charts. A synthetic close series of growing
+length is encoded in full (JSON lists, as `get_stock_metrics(include_history=True)` sends
+it) and after LTTB downsampling in `charts.py` (columnar).
+
+    python benchmarks/bench_chart.py --points 400 --max-seconds 0.05
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import finish  # noqa: E402
+from utils import charts  # noqa: E402
+from utils.payloads import encode_columns  # noqa: E402
+
+SIZES = (250, 2_500, 25_000, 250_000)
+
+def full_payload(t, close):
+    return json.dumps(encode_columns({"t": t, "close": close}, "json"))
+
+def downsampled_payload(t, close, points):
+    picked = charts.lttb(t, close, points)
+    return json.dumps(encode_columns({"t": t[picked], "close": close[picked]}, "columnar"))
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Chart payload size, full vs. LTTB-downsampled.")
+    parser.add_argument("--points", type=int, default=400)
+    parser.add_argument("--max-seconds", type=float, help="Fail if downsampling the largest series is slower than this")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(5)
+    rows = []
+    for size in SIZES:
+        t = 1_600_000_000 + 60 * np.arange(size, dtype=np.int64)
+        close = 1000.0 * np.exp(np.cumsum(rng.normal(0.0, 0.001, size)))
+        full_time, full = timed(full_payload, t, close)
+        down_time, down = timed(downsampled_payload, t, close, args.points)
+        rows.append({"bars": size, "full_bytes": len(full), "full_seconds": full_time,
+                     "downsampled_bytes": len(down), "downsampled_seconds": down_time})
+
+    print(f"{'bars':>8} {'full KB':>10} {'full ms':>9} {'lttb KB':>9} {'lttb ms':>9}")
+    for row in rows:
+        print(f"{row['bars']:>8} {row['full_bytes'] / 1024:>10.1f} {row['full_seconds'] * 1000:>9.1f}"
+              f" {row['downsampled_bytes'] / 1024:>9.1f} {row['downsampled_seconds'] * 1000:>9.1f}")
+
+    results = {"benchmark": "chart", "points": args.points, "results": rows}
+    finish(results, args.output, rows[-1]["downsampled_seconds"], args.max_seconds)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+End-to-end latency and throughput through the real MCP server, with no network access.
+
+The server runs via `offline_server.py`, so yfinance, DuckDuckGo and Gemini are replaced
+by the deterministic fakes in `fakes.py` (latencies set with the --*-ms flags). Calls go
+through `MCPClientPool`, the same client the dashboard uses. Scenarios:
+
+  single_cold         get_stock_metrics, a new ticker per call (store sync + info fetch)
+  single_warm         get_stock_metrics, the same ticker every call (cache hits)
+  batch               get_stock_metrics_batch, --batch-size new tickers per call
+  concurrent_metrics  --clients sessions against one shared HTTP server, mixed tickers
+  analysis            analyze_company, a new company per call (search + streamed LLM)
+  concurrent_analysis --clients sessions running analyze_company against the shared server
+
+    python benchmarks/bench_offline.py --requests 50 --clients 8 --output offline.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OFFLINE_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "offline_server.py")
+sys.path.insert(0, ROOT)
+from utils.mcp_pool import MCPClientPool  # noqa: E402
+
+SCENARIOS = ("single_cold", "single_warm", "batch", "concurrent_metrics", "analysis", "concurrent_analysis")
+
+def summarize(latencies, wall_seconds, errors, **extra):
+    latencies_ms = np.asarray(latencies) * 1000.0
+    summary = {
+        "requests": len(latencies),
+        "errors": errors,
+        "latency_ms": {
+            "p50": float(np.percentile(latencies_ms, 50)),
+            "p90": float(np.percentile(latencies_ms, 90)),
+            "p99": float(np.percentile(latencies_ms, 99)),
+            "mean": float(latencies_ms.mean()),
+            "max": float(latencies_ms.max())
+        },
+        "throughput_rps": len(latencies) / wall_seconds if wall_seconds else None
+    }
+    summary.update(extra)
+    return summary
+
+def _failed(result):
+    if result.isError:
+        return True
+    payload = result.structuredContent or {}
+    data = payload.get("data") or {}
+    results = payload.get("results") or {}
+    return "error" in data or any("error" in value for value in results.values())
+
+def run_sequential(pool, calls):
+    """
+    One call at a time; `calls` is a list of (tool, arguments).
+    """
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    for tool, arguments in calls:
+        t0 = time.perf_counter()
+        result = pool.call_tool(tool, arguments)
+        latencies.append(time.perf_counter() - t0)
+        errors += _failed(result)
+    return latencies, time.perf_counter() - start, errors
+
+def run_streaming(pool, calls):
+    """
+    Like `run_sequential`, also recording time to the first streamed chunk.
+    """
+    latencies, first_chunks, errors = [], [], 0
+    start = time.perf_counter()
+    for tool, arguments in calls:
+        first = []
+        t0 = time.perf_counter()
+
+        async def on_progress(progress, total, message):
+            if not first:
+                first.append(time.perf_counter() - t0)
+
+        result = pool.submit(tool, arguments, progress_callback=on_progress).result()
+        latencies.append(time.perf_counter() - t0)
+        first_chunks.append(first[0] if first else latencies[-1])
+        errors += _failed(result)
+    return latencies, first_chunks, time.perf_counter() - start, errors
+
+def run_closed_loop(pool, client_calls):
+    """
+    Each client issues its own calls back to back; all clients run at once.
+    """
+    latencies, errors = [], 0
+
+    async def client(calls):
+        nonlocal errors
+        for tool, arguments in calls:
+            t0 = time.perf_counter()
+            result = await pool.acall_tool(tool, arguments)
+            latencies.append(time.perf_counter() - t0)
+            errors += _failed(result)
+
+    async def run_all():
+        await asyncio.gather(*[client(calls) for calls in client_calls])
+
+    start = time.perf_counter()
+    asyncio.run(run_all())
+    return latencies, time.perf_counter() - start, errors
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_http_server(env, port, timeout=60):
+    process = subprocess.Popen(
+        [sys.executable, OFFLINE_SERVER, "--transport", "streamable-http", "--host", "127.0.0.1", "--port", str(port)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("offline server exited during startup")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("offline server did not start")
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline MCP server benchmark")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=40, help="calls per metrics scenario (per client when concurrent)")
+    parser.add_argument("--analysis-requests", type=int, default=8, help="calls per analysis scenario (per client when concurrent)")
+    parser.add_argument("--batch-size", type=int, default=25)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--yf-latency-ms", type=float, default=80)
+    parser.add_argument("--search-latency-ms", type=float, default=150)
+    parser.add_argument("--llm-first-token-ms", type=float, default=300)
+    parser.add_argument("--llm-chunk-ms", type=float, default=20)
+    parser.add_argument("--llm-chunks", type=int, default=40)
+    parser.add_argument("--search-rate-per-minute", type=float, default=600,
+                        help="search client rate limit inside the server (SEARCH_RATE_PER_MINUTE)")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    # Fresh caches and history store for every run
+    cache_dir = tempfile.mkdtemp(prefix="stock-bench-")
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")])),
+        "STOCK_CACHE_DIR": cache_dir,
+        "HISTORY_STORE_DIR": os.path.join(cache_dir, "history"),
+        "FAKE_YF_LATENCY_MS": str(args.yf_latency_ms),
+        "FAKE_SEARCH_LATENCY_MS": str(args.search_latency_ms),
+        "FAKE_LLM_FIRST_TOKEN_MS": str(args.llm_first_token_ms),
+        "FAKE_LLM_CHUNK_MS": str(args.llm_chunk_ms),
+        "FAKE_LLM_CHUNKS": str(args.llm_chunks),
+        "SEARCH_RATE_PER_MINUTE": str(args.search_rate_per_minute)
+    })
+
+    results = {}
+    stdio_pool = http_pool = http_server = None
+    try:
+        if any(not name.startswith("concurrent") for name in scenarios):
+            stdio_pool = MCPClientPool(server_script=OFFLINE_SERVER, pool_size=1, env=env)
+            stdio_pool.call_tool("get_cache_stats")  # exclude process start-up
+
+        if any(name.startswith("concurrent") for name in scenarios):
+            port = _free_port()
+            http_server = start_http_server(env, port)
+            http_pool = MCPClientPool(pool_size=args.clients, server_url=f"http://127.0.0.1:{port}/mcp")
+            http_pool.call_tool("get_cache_stats")
+
+        for name in scenarios:
+            if name == "single_cold":
+                calls = [("get_stock_metrics", {"ticker": f"COLD{i:04d}"}) for i in range(args.requests)]
+                latencies, wall, errors = run_sequential(stdio_pool, calls)
+                results[name] = summarize(latencies, wall, errors, transport="stdio", clients=1)
+
+            elif name == "single_warm":
+                stdio_pool.call_tool("get_stock_metrics", {"ticker": "WARM"})
+                calls = [("get_stock_metrics", {"ticker": "WARM"})] * args.requests
+                latencies, wall, errors = run_sequential(stdio_pool, calls)
+                results[name] = summarize(latencies, wall, errors, transport="stdio", clients=1)
+
+            elif name == "batch":
+                batches = max(3, args.requests // 5)
+                calls = [("get_stock_metrics_batch", {"tickers": [f"BATCH{b:03d}X{i:03d}" for i in range(args.batch_size)]})
+                         for b in range(batches)]
+                latencies, wall, errors = run_sequential(stdio_pool, calls)
+                results[name] = summarize(latencies, wall, errors, transport="stdio", clients=1, batch_size=args.batch_size,
+                                          tickers_per_second=batches * args.batch_size / wall)
+
+            elif name == "concurrent_metrics":
+                # A small shared universe, so clients overlap the way real users do
+                universe = [f"SHARED{i:02d}" for i in range(max(2, args.clients * 2))]
+                client_calls = [[("get_stock_metrics", {"ticker": universe[(c + i) % len(universe)]}) for i in range(args.requests)]
+                                for c in range(args.clients)]
+                latencies, wall, errors = run_closed_loop(http_pool, client_calls)
+                results[name] = summarize(latencies, wall, errors, transport="streamable-http", clients=args.clients)
+
+            elif name == "analysis":
+                calls = [("analyze_company", {"ticker": f"AI{i:03d}", "company_name": f"Company {i}"}) for i in range(args.analysis_requests)]
+                latencies, first_chunks, wall, errors = run_streaming(stdio_pool, calls)
+                results[name] = summarize(latencies, wall, errors, transport="stdio", clients=1,
+                                          first_chunk_ms={"p50": float(np.percentile(first_chunks, 50) * 1000),
+                                                          "p99": float(np.percentile(first_chunks, 99) * 1000)})
+
+            elif name == "concurrent_analysis":
+                client_calls = [[("analyze_company", {"ticker": f"CAI{c:02d}X{i:02d}", "company_name": f"Company {c}-{i}"})
+                                 for i in range(args.analysis_requests)] for c in range(args.clients)]
+                latencies, wall, errors = run_closed_loop(http_pool, client_calls)
+                results[name] = summarize(latencies, wall, errors, transport="streamable-http", clients=args.clients)
+
+            row = results[name]
+            print(f"{name:<20} n={row['requests']:<4} err={row['errors']:<3} "
+                  f"p50={row['latency_ms']['p50']:8.1f}ms  p99={row['latency_ms']['p99']:8.1f}ms  "
+                  f"{row['throughput_rps']:7.1f} req/s")
+    finally:
+        for pool in (stdio_pool, http_pool):
+            if pool is not None:
+                pool.close()
+        if http_server is not None:
+            http_server.terminate()
+            http_server.wait(timeout=10)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    report = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "config": vars(args),
+        "scenarios": results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Times `risk.compute_risk` on random-walk histories that share a market factor (a few
+list late, to exercise the missing-data paths) and checks correlation, volatility, VaR and
+drawdown against pandas `DataFrame.corr`/`cov` with a per-ticker drawdown loop.
+
+    python benchmarks/bench_risk.py --tickers 500 --days 750 --max-seconds 1.0
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import best_of, finish  # noqa: E402
+from utils import risk  # noqa: E402
+from utils.history_store import BAR_DTYPE, PriceHistory  # noqa: E402
+
+def synthetic_histories(n_tickers, n_days, seed=11):
+    """
+    Random walks sharing a market factor; every 25th ticker lists a third of the way in.
+    """
+    rng = np.random.default_rng(seed)
+    dates = np.busday_offset(np.datetime64("2021-01-01"), np.arange(n_days), roll="forward")
+    market = rng.normal(0.0003, 0.01, n_days)
+    histories = []
+    for i in range(n_tickers + 1):
+        returns = market * (rng.uniform(0.5, 1.5) if i < n_tickers else 1.0) + rng.normal(0.0, 0.015, n_days)
+        start = n_days // 3 if i % 25 == 24 else 0
+        bars = np.zeros(n_days - start, dtype=BAR_DTYPE)
+        bars["date"] = dates[start:]
+        for field in ("open", "high", "low", "close", "adj_close"):
+            bars[field] = 100.0 * np.exp(np.cumsum(returns))[start:]
+        histories.append(PriceHistory(f"SYM{i}" if i < n_tickers else "^NSEI", bars))
+    return histories[:-1], histories[-1]
+
+def vectorized(histories, benchmark, lookback):
+    return risk.compute_risk(histories, np.ones(len(histories)), benchmark, lookback)
+
+def naive_pandas(histories, benchmark, lookback):
+    prices = pd.DataFrame({h.symbol: pd.Series(h["adj_close"].astype(float), index=h["date"]) for h in histories})
+    returns = prices.ffill().pct_change(fill_method=None).iloc[-lookback:]
+    weights = np.full(len(histories), 1.0 / len(histories))
+    cov = returns.cov()
+    corr = returns.corr()
+    portfolio = returns.fillna(0.0) @ weights
+
+    drawdowns = []
+    for column in list(returns.columns):
+        wealth = pd.concat([pd.Series([1.0]), (1.0 + returns[column].fillna(0.0)).cumprod()], ignore_index=True)
+        drawdowns.append((1.0 - wealth / wealth.cummax()).max())
+    return {
+        "correlation": corr.values,
+        "volatility": np.sqrt(np.diag(cov.values) * risk.TRADING_DAYS),
+        "var_95": -portfolio.quantile(0.05),
+        "max_drawdown": np.array(drawdowns)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Portfolio risk engine vs. pandas.")
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--days", type=int, default=750)
+    parser.add_argument("--lookback", type=int, default=risk.RISK_LOOKBACK_DAYS)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--max-seconds", type=float, help="Fail if the vectorized engine is slower than this")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    histories, benchmark = synthetic_histories(args.tickers, args.days)
+    vec_time, vec = best_of(vectorized, args.repeats, histories, benchmark, args.lookback)
+    naive_time, naive = best_of(naive_pandas, args.repeats, histories, benchmark, args.lookback)
+
+    max_abs_diff = {
+        "correlation": float(np.nanmax(np.abs(vec["correlation"] - naive["correlation"]))),
+        "volatility": float(np.nanmax(np.abs(np.array([h["volatility_annual"] for h in vec["holdings"]]) - naive["volatility"]))),
+        "var_95": abs(vec["portfolio"]["historical_var"]["95"] - naive["var_95"]),
+        "max_drawdown": float(np.nanmax(np.abs(np.array([h["max_drawdown"] for h in vec["holdings"]]) - naive["max_drawdown"])))
+    }
+    results = {
+        "benchmark": "risk",
+        "tickers": args.tickers,
+        "days": args.days,
+        "lookback": args.lookback,
+        "vectorized_seconds": vec_time,
+        "naive_pandas_seconds": naive_time,
+        "speedup": naive_time / vec_time,
+        "max_abs_diff": max_abs_diff
+    }
+
+    print(f"{args.tickers} tickers x {args.days} days (lookback {args.lookback})")
+    print(f"  vectorized numpy : {vec_time * 1000:9.1f} ms")
+    print(f"  pandas           : {naive_time * 1000:9.1f} ms  ({results['speedup']:.1f}x slower)")
+    print(f"  max |diff|       : {max(max_abs_diff.values()):.2e}")
+
+    finish(results, args.output, vec_time, args.max_seconds)
+
+if __name__ == "__main__":
+    main()
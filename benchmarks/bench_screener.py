@@ -0,0 +1,83 @@
+"""
+How fast `screener.py` answers a screen. Builds the snapshot table for a synthetic
+universe (done once per refresh on the server), times a three-filter screen over it, and
+checks the matches against a pandas loop that derives each symbol's fields separately.
+
+    python benchmarks/bench_screener.py --tickers 500 --max-seconds 0.01
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import best_of, finish  # noqa: E402
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_risk import synthetic_histories  # noqa: E402
+from utils import screener  # noqa: E402
+
+FILTERS = ["pct_from_52w_high > -5", "volume_ratio > 1.2", "current_price > sma_50"]
+
+def vectorized_screen(table):
+    parsed = [screener.parse_filter(spec) for spec in FILTERS]
+    mask = screener.apply_filters(table, parsed)
+    return [table["symbol"][row] for row in screener.rank(table, mask, "volume_ratio", limit=500)]
+
+def naive_pandas(histories):
+    matches = []
+    for history in histories:
+        frame = history.to_frame()
+        close = frame["Close"]
+        year = frame[frame.index >= frame.index[-1] - pd.Timedelta(days=365)]
+        row = {
+            "current_price": close.iloc[-1],
+            "52_week_high": year["High"].max(),
+            "volume_ratio": frame["Volume"].iloc[-1] / frame["Volume"].iloc[-21:-1].mean(),
+            "sma_50": close.rolling(50).mean().iloc[-1]
+        }
+        near_high = (row["current_price"] / row["52_week_high"] - 1.0) * 100.0 > -5
+        if near_high and row["volume_ratio"] > 1.2 and row["current_price"] > row["sma_50"]:
+            matches.append((history.symbol, row["volume_ratio"]))
+    return [symbol for symbol, _ in sorted(matches, key=lambda match: -match[1])]
+
+def main():
+    parser = argparse.ArgumentParser(description="Universe screener vs. a per-symbol pandas loop.")
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--days", type=int, default=750)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, help="Fail if a screen over the cached table is slower than this")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    histories, benchmark = synthetic_histories(args.tickers, args.days)
+    for history in histories:
+        # Volumes vary, so volume_ratio filters have something to find
+        history.bars["volume"] = np.random.default_rng(len(history.symbol)).integers(1e5, 1e6, len(history))
+
+    build_time, table = best_of(screener.build_table, args.repeats, histories, benchmark)
+    screen_time, matches = best_of(vectorized_screen, args.repeats, table)
+    naive_time, naive = best_of(naive_pandas, 1, histories)
+
+    results = {
+        "benchmark": "screener",
+        "tickers": args.tickers,
+        "days": args.days,
+        "build_table_seconds": build_time,
+        "screen_seconds": screen_time,
+        "naive_pandas_seconds": naive_time,
+        "matched": len(matches),
+        "same_matches": matches == naive
+    }
+
+    print(f"{args.tickers} tickers x {args.days} days, {len(FILTERS)} filters -> {len(matches)} matches")
+    print(f"  build table (cached) : {build_time * 1000:9.1f} ms")
+    print(f"  screen over table    : {screen_time * 1000:9.3f} ms")
+    print(f"  pandas per symbol    : {naive_time * 1000:9.1f} ms")
+    print(f"  same matches         : {results['same_matches']}")
+
+    finish(results, args.output, screen_time, args.max_seconds)
+
+if __name__ == "__main__":
+    main()
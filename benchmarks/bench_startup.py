@@ -0,0 +1,106 @@
+"""
+How long `stock_mcp_server.py` takes to come up from cold. In fresh processes it measures:
+  * import time of the server module (and which heavy packages it loaded), and
+  * time to first tool response: spawn over stdio -> initialize -> first call returns.
+
+    python benchmarks/bench_startup.py --repeats 5 --output startup.json
+
+The default first call is `get_cache_stats`, which needs no network. Pass
+`--tool get_stock_metrics --arguments '{"ticker": "TCS"}'` to include a real fetch.
+`--max-import-seconds` / `--max-first-response-seconds` turn it into a regression check
+(non-zero exit when the median is slower).
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_SCRIPT = os.path.join(ROOT, "stock_mcp_server.py")
+
+# Packages that must not be imported until an analysis actually runs
+DEFERRED_MODULES = ("langchain", "langchain_core", "langchain_google_genai", "langchain_community", "duckduckgo_search")
+
+IMPORT_PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import stock_mcp_server
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {deferred!r} if m in sys.modules]}}))
+"""
+
+def measure_import():
+    probe = IMPORT_PROBE.format(root=ROOT, deferred=DEFERRED_MODULES)
+    out = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+async def measure_first_response(tool, arguments):
+    params = StdioServerParameters(command=sys.executable, args=[SERVER_SCRIPT], env=dict(os.environ), cwd=ROOT)
+    start = time.perf_counter()
+    async with stdio_client(params) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            initialized = time.perf_counter() - start
+            result = await session.call_tool(tool, arguments=arguments)
+            first_response = time.perf_counter() - start
+    if result.isError:
+        raise RuntimeError(f"{tool} failed: {result.content}")
+    return {"initialize_seconds": initialized, "first_response_seconds": first_response}
+
+def summarize(values):
+    return {"median": statistics.median(values), "min": min(values), "max": max(values)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start time of the MCP server.")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--tool", default="get_cache_stats")
+    parser.add_argument("--arguments", default="{}", help="JSON arguments for --tool")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--max-import-seconds", type=float)
+    parser.add_argument("--max-first-response-seconds", type=float)
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.repeats)]
+    responses = [asyncio.run(measure_first_response(args.tool, json.loads(args.arguments))) for _ in range(args.repeats)]
+
+    results = {
+        "python": sys.version.split()[0],
+        "repeats": args.repeats,
+        "tool": args.tool,
+        "import_seconds": summarize([run["seconds"] for run in imports]),
+        "deferred_modules_loaded": sorted({name for run in imports for name in run["loaded"]}),
+        "initialize_seconds": summarize([run["initialize_seconds"] for run in responses]),
+        "first_response_seconds": summarize([run["first_response_seconds"] for run in responses])
+    }
+
+    print(f"import stock_mcp_server   median {results['import_seconds']['median']:.3f}s")
+    print(f"spawn -> initialized      median {results['initialize_seconds']['median']:.3f}s")
+    print(f"spawn -> first {args.tool:<11} median {results['first_response_seconds']['median']:.3f}s")
+    if results["deferred_modules_loaded"]:
+        print(f"WARNING: imported at startup: {', '.join(results['deferred_modules_loaded'])}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failures = []
+    if results["deferred_modules_loaded"]:
+        failures.append("deferred modules imported at startup")
+    if args.max_import_seconds and results["import_seconds"]["median"] > args.max_import_seconds:
+        failures.append(f"import median above {args.max_import_seconds}s")
+    if args.max_first_response_seconds and results["first_response_seconds"]["median"] > args.max_first_response_seconds:
+        failures.append(f"first response median above {args.max_first_response_seconds}s")
+    if failures:
+        print(f"FAIL: {'; '.join(failures)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
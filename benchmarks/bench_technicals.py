@@ -0,0 +1,97 @@
+"""
+Times the indicator math in `technicals.py` on random-walk OHLC prices for every ticker at
+once, then recomputes each indicator ticker by ticker with pandas `rolling`/`ewm` and
+reports how much slower that is and the largest difference between the two.
+
+    python benchmarks/bench_technicals.py --tickers 500 --days 750
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import best_of, finish  # noqa: E402
+from utils import technicals  # noqa: E402
+
+def synthetic_ohlc(n_tickers, n_days, seed=7):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0004, 0.018, size=(n_tickers, n_days))
+    close = 100.0 * np.exp(np.cumsum(returns, axis=1))
+    spread = np.abs(rng.normal(0.0, 0.01, size=close.shape)) * close
+    return close + spread, close - spread, close
+
+def vectorized(high, low, close):
+    macd_line, macd_signal, _ = technicals.macd(close)
+    _, bb_upper, bb_lower = technicals.bollinger(close)
+    return {
+        "sma_50": technicals.sma(close, 50),
+        "ema_20": technicals.ema(close, 20),
+        "rsi_14": technicals.rsi(close, 14),
+        "macd": macd_line,
+        "macd_signal": macd_signal,
+        "bb_upper": bb_upper,
+        "bb_lower": bb_lower,
+        "atr_14": technicals.atr(high, low, close, 14),
+        "volatility_20d": technicals.realized_volatility(close, 20)
+    }
+
+def naive_pandas(high, low, close):
+    out = {name: np.empty_like(close) for name in vectorized(high[:1], low[:1], close[:1])}
+    for row in range(close.shape[0]):
+        c, h, l = pd.Series(close[row]), pd.Series(high[row]), pd.Series(low[row])
+        delta = c.diff()
+        gain = delta.clip(lower=0).ewm(alpha=1 / 14, adjust=False, ignore_na=True).mean()
+        loss = (-delta.clip(upper=0)).ewm(alpha=1 / 14, adjust=False, ignore_na=True).mean()
+        macd_line = c.ewm(span=12, adjust=False).mean() - c.ewm(span=26, adjust=False).mean()
+        mid, std = c.rolling(20).mean(), c.rolling(20).std(ddof=0)
+        prev = c.shift()
+        true_range = pd.concat([h - l, (h - prev).abs(), (l - prev).abs()], axis=1).max(axis=1)
+
+        out["sma_50"][row] = c.rolling(50).mean()
+        out["ema_20"][row] = c.ewm(span=20, adjust=False).mean()
+        out["rsi_14"][row] = 100 - 100 / (1 + gain / loss)
+        out["macd"][row] = macd_line
+        out["macd_signal"][row] = macd_line.ewm(span=9, adjust=False).mean()
+        out["bb_upper"][row] = mid + 2 * std
+        out["bb_lower"][row] = mid - 2 * std
+        out["atr_14"][row] = true_range.ewm(alpha=1 / 14, adjust=False).mean()
+        out["volatility_20d"][row] = np.log(c / prev).rolling(20).std() * np.sqrt(technicals.TRADING_DAYS)
+    return out
+
+def main():
+    parser = argparse.ArgumentParser(description="Indicator engine vs. per-ticker pandas.")
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--days", type=int, default=750)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    high, low, close = synthetic_ohlc(args.tickers, args.days)
+    vec_time, vec = best_of(vectorized, args.repeats, high, low, close)
+    naive_time, naive = best_of(naive_pandas, args.repeats, high, low, close)
+
+    max_abs_diff = {
+        name: float(np.nanmax(np.abs(vec[name] - naive[name]))) for name in vec
+    }
+    results = {
+        "benchmark": "technicals",
+        "tickers": args.tickers,
+        "days": args.days,
+        "vectorized_seconds": vec_time,
+        "naive_pandas_seconds": naive_time,
+        "speedup": naive_time / vec_time,
+        "max_abs_diff": max_abs_diff
+    }
+
+    print(f"{args.tickers} tickers x {args.days} days")
+    print(f"  vectorized numpy : {vec_time * 1000:9.1f} ms")
+    print(f"  naive pandas loop: {naive_time * 1000:9.1f} ms  ({results['speedup']:.1f}x slower)")
+    print(f"  max |diff|       : {max(max_abs_diff.values()):.2e}")
+
+    finish(results, args.output)
+
+if __name__ == "__main__":
+    main()
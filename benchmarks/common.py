@@ -0,0 +1,28 @@
+"""
+Timing and reporting helpers shared by the benchmark scripts.
+"""
+import json
+import sys
+import time
+
+def best_of(fn, repeats, *args):
+    """
+    Fastest wall time of `repeats` calls to fn(*args), and the last call's result.
+    """
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def finish(results, output=None, seconds=None, budget=None):
+    """
+    Writes `results` as JSON to `output` (if given), then exits with an error when
+    `seconds` is over the `budget` (if given).
+    """
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+    if budget is not None and seconds > budget:
+        sys.exit(f"FAIL: {seconds:.4f}s exceeds the {budget:.4f}s budget")
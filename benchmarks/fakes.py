@@ -0,0 +1,164 @@
+"""
+Deterministic local stand-ins for the services the server talks to, for offline benchmarks:
+
+  * a synthetic `yfinance` module (histories and `.info`),
+  * a canned DuckDuckGo search backend, and
+  * a fake Gemini chain that streams a fixed answer.
+
+Latencies are configured through environment variables so they can be set on a server
+process from the outside (see `offline_server.py`). Call `install()` before importing
+`stock_mcp_server`.
+"""
+import functools
+import itertools
+import os
+import sys
+import time
+import types
+import zlib
+
+import numpy as np
+import pandas as pd
+
+YF_LATENCY_MS = float(os.getenv("FAKE_YF_LATENCY_MS", "80"))
+SEARCH_LATENCY_MS = float(os.getenv("FAKE_SEARCH_LATENCY_MS", "150"))
+LLM_FIRST_TOKEN_MS = float(os.getenv("FAKE_LLM_FIRST_TOKEN_MS", "300"))
+LLM_CHUNK_MS = float(os.getenv("FAKE_LLM_CHUNK_MS", "20"))
+LLM_CHUNKS = int(os.getenv("FAKE_LLM_CHUNKS", "40"))
+# Vary the search results on every call, so cached summaries never match and every
+# analysis goes through the (fake) model
+SEARCH_UNIQUE = os.getenv("FAKE_SEARCH_UNIQUE", "1") == "1"
+
+# Synthetic price series all start here, so overlapping fetches agree bar for bar
+EPOCH = pd.Timestamp("2012-01-02")
+
+_search_counter = itertools.count()
+
+def _sleep_ms(ms):
+    if ms > 0:
+        time.sleep(ms / 1000.0)
+
+@functools.lru_cache(maxsize=8)
+def _dates(end):
+    return pd.bdate_range(EPOCH, end, tz="Asia/Kolkata")
+
+@functools.lru_cache(maxsize=4096)
+def _series(symbol, end):
+    """
+    Business-day OHLCV random walk from EPOCH to `end`, seeded by the symbol.
+    """
+    dates = _dates(end)
+    rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+    close = (100.0 + zlib.crc32(symbol.encode()) % 2000) * np.exp(np.cumsum(rng.normal(0.0003, 0.017, len(dates))))
+    spread = np.abs(rng.normal(0.0, 0.008, len(dates))) * close
+    return pd.DataFrame({
+        "Open": close - spread / 2,
+        "High": close + spread,
+        "Low": close - spread,
+        "Close": close,
+        "Adj Close": close * 0.98,
+        "Volume": rng.integers(100_000, 5_000_000, len(dates)).astype(float)
+    }, index=pd.DatetimeIndex(dates, name="Date"))
+
+def _history(symbol, start=None):
+    frame = _series(symbol.upper(), pd.Timestamp.today().normalize())
+    if start is not None:
+        frame = frame[frame.index >= pd.Timestamp(start).tz_localize("Asia/Kolkata")]
+    return frame.copy()
+
+def _intraday(symbol, period, interval):
+    """
+    Minute bars over the last sessions (09:15-15:30 IST), a random walk around the last close.
+    """
+    sessions = {"1d": 1, "5d": 5, "1mo": 22, "3mo": 64, "6mo": 126, "1y": 250}[period]
+    minutes = int(interval.rstrip("m"))
+    days = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=sessions, tz="Asia/Kolkata")
+    offsets = pd.to_timedelta(np.arange(9 * 60 + 15, 15 * 60 + 30, minutes), unit="min")
+    index = pd.DatetimeIndex([day + offset for day in days for offset in offsets], name="Datetime")
+    rng = np.random.default_rng(zlib.crc32(f"{symbol}/{interval}".encode()))
+    close = _history(symbol)["Close"].iloc[-1] * np.exp(np.cumsum(rng.normal(0.0, 0.001 * np.sqrt(minutes), len(index))))
+    return pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Adj Close": close,
+                         "Volume": rng.integers(1_000, 50_000, len(index)).astype(float)}, index=index)
+
+class FakeTicker:
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    def history(self, start=None, period=None, interval="1d", auto_adjust=True, actions=True, **kwargs):
+        _sleep_ms(YF_LATENCY_MS)
+        if interval.endswith("m") and interval != "1mo":
+            return _intraday(self.symbol.upper(), period, interval)
+        return _history(self.symbol, start)
+
+    @property
+    def info(self):
+        _sleep_ms(YF_LATENCY_MS)
+        seed = zlib.crc32(self.symbol.encode())
+        return {
+            "longName": f"{self.symbol.split('.')[0].title()} Synthetic Ltd",
+            "currency": "INR",
+            "marketCap": float(1e9 + seed % 10**12),
+            "trailingPE": 10.0 + seed % 40,
+            "dividendYield": (seed % 300) / 100.0,
+            "beta": 0.5 + (seed % 100) / 100.0
+        }
+
+def download(tickers, start=None, group_by="ticker", **kwargs):
+    # One round trip for the whole group, like the real bulk endpoint
+    _sleep_ms(YF_LATENCY_MS)
+    symbols = [tickers] if isinstance(tickers, str) else list(tickers)
+    return pd.concat({symbol: _history(symbol, start) for symbol in symbols}, axis=1)
+
+def make_yfinance_module():
+    module = types.ModuleType("yfinance")
+    module.Ticker = FakeTicker
+    module.download = download
+    module.__fake__ = True
+    return module
+
+class FakeSearch:
+    """
+    Same `results()` interface as langchain's DuckDuckGoSearchAPIWrapper.
+    """
+
+    def results(self, query, max_results=4):
+        _sleep_ms(SEARCH_LATENCY_MS)
+        nonce = f" (result set {next(_search_counter)})" if SEARCH_UNIQUE else ""
+        return [{"title": query, "link": "https://example.com/news",
+                 "snippet": f"Canned news and company profile for: {query}{nonce}"}]
+
+    def run(self, query):
+        return " ".join(result["snippet"] for result in self.results(query))
+
+class _Chunk:
+    def __init__(self, content):
+        self.content = content
+
+class FakeChain:
+    """
+    Streams a fixed Markdown answer in LLM_CHUNKS pieces with configurable latency.
+    """
+
+    def stream(self, inputs):
+        _sleep_ms(LLM_FIRST_TOKEN_MS)
+        words = f"**{inputs['company_name']}** ({inputs['ticker']}) is a synthetic company used for benchmarking. ".split()
+        for i in range(LLM_CHUNKS):
+            if i:
+                _sleep_ms(LLM_CHUNK_MS)
+            yield _Chunk(words[i % len(words)] + " ")
+
+    def invoke(self, inputs):
+        return _Chunk("".join(chunk.content for chunk in self.stream(inputs)))
+
+def install():
+    """
+    Swaps in the fakes. Must run before `stock_mcp_server` (or `stock_data`) is imported.
+    """
+    os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+    # Synthetic tickers are not on the NSE list; skip the download and validation
+    os.environ["SYMBOL_MASTER_AUTO_DOWNLOAD"] = "0"
+    sys.modules["yfinance"] = make_yfinance_module()
+
+    from utils import ai_analysis
+    ai_analysis.search_client.backend_factory = FakeSearch
+    ai_analysis._get_chain = lambda api_key: FakeChain()
@@ -0,0 +1,18 @@
+"""
+Runs the real `stock_mcp_server.py` with the offline fakes from `fakes.py` installed.
+Accepts the same command-line flags as the server (e.g. `--transport streamable-http`).
+"""
+import os
+import runpy
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fakes  # noqa: E402
+
+# Guarded: process-pool workers (spawn) re-import this module and must not start a server
+if __name__ == "__main__":
+    fakes.install()
+    runpy.run_path(os.path.join(ROOT, "stock_mcp_server.py"), run_name="__main__")
@@ -0,0 +1,336 @@
+import atexit
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves still replace the file atomically, just without the merge lock
+    fcntl = None
+
+# Every cache created in this process, by name (used for stats reporting)
+CACHES = {}
+
+# Shared workers for stale-while-revalidate refreshes
+_refresh_pool = ThreadPoolExecutor(max_workers=int(os.getenv("CACHE_REFRESH_WORKERS", "2")), thread_name_prefix="cache-refresh")
+# One background writer, so pickling never runs on a request thread
+_save_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-save")
+
+def _sizeof(value):
+    """
+    Rough memory footprint of a cached value, in bytes.
+    """
+    if hasattr(value, "nbytes"):
+        # numpy arrays and array-backed objects
+        return int(value.nbytes)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_sizeof(k) + _sizeof(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a freshness TTL and a stale-while-revalidate window.
+
+    * age < ttl                  -> fresh hit
+    * ttl <= age < ttl+stale_ttl -> stale hit: the old value is returned immediately and,
+                                    if a loader is given, refreshed in the background
+    * otherwise                  -> miss
+
+    Entries are evicted least-recently-used first once `max_entries` or `max_bytes` is
+    exceeded. With `persist_dir` set the cache is pickled to `<persist_dir>/<name>.pkl`
+    (from a background thread at most every `persist_interval` seconds, and at exit) and
+    reloaded on start-up. Saves merge with what other processes wrote to the same file
+    (newest entry per key wins) instead of overwriting it.
+    """
+
+    def __init__(self, name, ttl, stale_ttl=0.0, max_entries=1024, max_bytes=None,
+                 persist_dir=None, persist_interval=5.0):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.persist_path = os.path.join(persist_dir, f"{name}.pkl") if persist_dir else None
+        self.persist_interval = persist_interval
+
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()  # key -> (stored_at, size, value)
+        self._bytes = 0
+        self._refreshing = set()
+        self._dirty = False
+        self._last_save = 0.0
+        self._save_scheduled = False
+        self._save_lock = threading.Lock()
+        # Invalidations not yet written out, so a save does not merge them back from disk
+        self._cleared_at = 0.0
+        self._dropped = {}
+        self._counters = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0, "evictions": 0}
+
+        if self.persist_path:
+            self._load()
+            atexit.register(self.save)
+        CACHES[name] = self
+
+    def get(self, key, loader=None, default=None):
+        """
+        Returns the cached value (fresh or stale) or `default` on a miss.
+        A stale hit schedules `loader` in the background when one is given.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters["misses"] += 1
+                return default
+
+            stored_at, _, value = entry
+            age = now - stored_at
+            if age < self.ttl:
+                self._counters["hits"] += 1
+                self._entries.move_to_end(key)
+                return value
+
+            if age >= self.ttl + self.stale_ttl:
+                self._remove(key)
+                self._counters["misses"] += 1
+                return default
+
+            self._counters["stale_hits"] += 1
+            self._entries.move_to_end(key)
+            if loader is not None and key not in self._refreshing:
+                self._refreshing.add(key)
+                _refresh_pool.submit(self._refresh, key, loader)
+            return value
+
+    def get_or_load(self, key, loader):
+        """
+        Cached value for `key`, calling `loader()` synchronously on a miss.
+        Loader exceptions propagate and nothing is cached.
+        """
+        sentinel = object()
+        value = self.get(key, loader=loader, default=sentinel)
+        if value is sentinel:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def _refresh(self, key, loader):
+        try:
+            value = loader()
+        except Exception:
+            with self._lock:
+                self._counters["refresh_errors"] += 1
+        else:
+            self.set(key, value)
+            with self._lock:
+                self._counters["refreshes"] += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def set(self, key, value, stored_at=None):
+        size = _sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (stored_at or time.time(), size, value)
+            self._bytes += size
+            self._evict()
+            self._dirty = True
+        self._maybe_save()
+
+    def invalidate(self, key=None):
+        """
+        Drops one key, or everything when `key` is None.
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._bytes = 0
+                self._cleared_at = time.time()
+                self._dropped.clear()
+            else:
+                if key in self._entries:
+                    self._remove(key)
+                self._dropped[key] = time.time()
+            self._dirty = True
+        self._maybe_save(force=True)
+
+    def invalidate_matching(self, predicate):
+        """
+        Drops every key for which `predicate(key)` is true. Returns how many were dropped.
+        """
+        with self._lock:
+            doomed = [key for key in self._entries if predicate(key)]
+            now = time.time()
+            for key in doomed:
+                self._remove(key)
+                self._dropped[key] = now
+            if doomed:
+                self._dirty = True
+        if doomed:
+            self._maybe_save(force=True)
+        return len(doomed)
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or (self.max_bytes is not None and self._bytes > self.max_bytes and len(self._entries) > 1)
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._counters["evictions"] += 1
+
+    def _maybe_save(self, force=False):
+        if not self.persist_path:
+            return
+        with self._lock:
+            if self._save_scheduled or not (force or time.time() - self._last_save >= self.persist_interval):
+                return
+            self._save_scheduled = True
+            self._last_save = time.time()
+        _save_pool.submit(self._save_in_background)
+
+    def _save_in_background(self):
+        try:
+            self.save()
+        finally:
+            # Writes that arrived during the save get one more, once the interval is up
+            with self._lock:
+                delay = self._last_save + self.persist_interval - time.time() if self._dirty else None
+                if delay is None:
+                    self._save_scheduled = False
+        if delay is not None:
+            timer = threading.Timer(max(0.0, delay), _save_pool.submit, args=(self._save_in_background,))
+            timer.daemon = True
+            timer.start()
+
+    def save(self):
+        """
+        Writes the cache to `persist_path`, merged with the entries already on disk.
+        Blocks; `set` and friends schedule this on the background writer instead.
+        """
+        if not self.persist_path:
+            return
+        with self._save_lock:
+            self._save()
+
+    def _save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = {key: (stored_at, value) for key, (stored_at, _, value) in self._entries.items()}
+            cleared_at, dropped = self._cleared_at, self._dropped
+            self._dropped = {}
+            self._dirty = False
+            self._last_save = time.time()
+
+        try:
+            os.makedirs(os.path.dirname(self.persist_path), exist_ok=True)
+            with open(f"{self.persist_path}.lock", "a") as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                merged = self._merge(self._read(), snapshot, cleared_at, dropped)
+                tmp_path = f"{self.persist_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    pickle.dump(merged, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self.persist_path)
+        except Exception:
+            # Persistence is best effort; the in-memory cache keeps working
+            with self._lock:
+                self._dirty = True
+                for key, dropped_at in dropped.items():
+                    self._dropped.setdefault(key, dropped_at)
+
+    def _merge(self, on_disk, snapshot, cleared_at, dropped):
+        """
+        Entries from another process's save plus ours, newest per key, minus anything
+        expired or invalidated here since, trimmed to `max_entries`/`max_bytes`.
+        """
+        cutoff = time.time() - (self.ttl + self.stale_ttl)
+        merged = {
+            key: entry for key, entry in on_disk.items()
+            if entry[0] > max(cutoff, cleared_at, dropped.get(key, 0.0))
+        }
+        for key, entry in snapshot.items():
+            if key not in merged or merged[key][0] <= entry[0]:
+                merged[key] = entry
+
+        kept, total = {}, 0
+        for key, (stored_at, value) in sorted(merged.items(), key=lambda item: -item[1][0]):
+            if len(kept) >= self.max_entries:
+                break
+            if self.max_bytes is not None:
+                total += _sizeof(value)
+                if total > self.max_bytes and kept:
+                    break
+            kept[key] = (stored_at, value)
+        return kept
+
+    def _read(self):
+        try:
+            with open(self.persist_path, "rb") as f:
+                return pickle.load(f)
+        except Exception:
+            return {}
+
+    def _load(self):
+        snapshot = self._read()
+        cutoff = time.time() - (self.ttl + self.stale_ttl)
+        with self._lock:
+            for key, (stored_at, value) in sorted(snapshot.items(), key=lambda item: item[1][0]):
+                if stored_at > cutoff:
+                    size = _sizeof(value)
+                    self._entries[key] = (stored_at, size, value)
+                    self._bytes += size
+            self._evict()
+
+    def peek(self, key, default=None):
+        """
+        The cached value (fresh or stale) or `default`, without counting a hit or miss,
+        refreshing or touching the LRU order. For bulk reads that are not user lookups.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or time.time() - entry[0] >= self.ttl + self.stale_ttl:
+            return default
+        return entry[2]
+
+    def age(self, key):
+        """
+        Seconds since `key` was stored, or None if absent. Not counted as a hit or miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        return time.time() - entry[0] if entry is not None else None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["hits"] + stats["stale_hits"]) / lookups if lookups else None
+        return stats
+
+def all_stats():
+    """
+    Stats for every cache in the process, keyed by cache name.
+    """
+    return {name: cache.stats() for name, cache in CACHES.items()}
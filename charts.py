@@ -0,0 +1,160 @@
+"""
+Price history for charts, downsampled on the server.
+
+Daily, weekly and monthly series come from the local history store (weekly/monthly bars
+are resampled from the daily ones); intraday series are fetched from Yahoo and cached
+briefly. Either way the close series is reduced to at most `points` samples with
+Largest-Triangle-Three-Buckets (LTTB), which keeps the peaks and troughs a plain stride
+would drop, so the payload and the client's render time stay bounded whatever the range.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from utils import history_store, telemetry
+from utils.cache import TTLCache
+from utils.stock_data import get_histories, is_listed, resolve_ticker, unlisted_error
+
+# Calendar days covered by each daily-bar period ("max" is everything the store keeps)
+CHART_PERIODS = {
+    "1mo": 31, "3mo": 92, "6mo": 183, "1y": 366, "2y": 731, "5y": 1827, "10y": 3653, "max": history_store.MAX_DAYS
+}
+DAILY_INTERVALS = ("1d", "1wk", "1mo")
+# Intraday intervals and the longest period Yahoo serves for each
+INTRADAY_PERIODS = {
+    "1m": ("1d", "5d"),
+    "5m": ("1d", "5d", "1mo"),
+    "15m": ("1d", "5d", "1mo"),
+    "30m": ("1d", "5d", "1mo"),
+    "60m": ("1d", "5d", "1mo", "3mo", "6mo", "1y")
+}
+
+CHART_DEFAULT_POINTS = 500
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "2000"))
+
+intraday_cache = TTLCache(
+    "intraday",
+    ttl=float(os.getenv("CHART_INTRADAY_TTL", "60")),
+    stale_ttl=float(os.getenv("CHART_INTRADAY_STALE_TTL", "600")),
+    max_entries=int(os.getenv("CHART_INTRADAY_CACHE_ENTRIES", "200"))
+)
+
+def lttb(x, y, threshold):
+    """
+    Indices of the `threshold` points of (x, y) chosen by Largest-Triangle-Three-Buckets.
+    The first and last points are always kept; each bucket in between contributes the point
+    forming the largest triangle with the previously kept point and the next bucket's mean.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # threshold - 2 buckets over the interior points [1, n - 1)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    # Third vertex for bucket i: the mean of bucket i + 1 (the last point for the last bucket)
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Twice the triangle area; the constant factor does not change the argmax
+        area = np.abs((x[a] - next_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def resample(dates, close, interval):
+    """
+    Weekly (Monday-based) or monthly closes from daily ones: the period's first date and
+    its last close.
+    """
+    days = dates.astype("datetime64[D]")
+    if interval == "1wk":
+        # Day 0 (1970-01-01) was a Thursday; shift so weeks start on Monday
+        key = (days.astype(np.int64) + 3) // 7
+    else:
+        key = days.astype("datetime64[M]").astype(np.int64)
+    starts = np.flatnonzero(np.diff(key, prepend=key[0] - 1))
+    ends = np.append(starts[1:], len(key)) - 1
+    return dates[starts], close[ends]
+
+def _daily_bars(symbol, period, interval):
+    days = CHART_PERIODS[period]
+    _, histories = get_histories([symbol], min_days=days)
+    history = histories[symbol].last_days(days)
+    dates = np.asarray(history["date"])
+    close = np.asarray(history["close"], dtype=np.float64)
+    if interval != "1d" and len(dates):
+        dates, close = resample(dates, close, interval)
+    # Epoch seconds at midnight, the same convention as `history_columns`
+    return dates.astype("datetime64[s]").astype(np.int64), close
+
+def _download_intraday(symbol, period, interval):
+    with telemetry.span("yfinance.intraday"):
+        return yf.Ticker(symbol).history(period=period, interval=interval, auto_adjust=False, actions=False)
+
+def _intraday_bars(symbol, period, interval):
+    frame = intraday_cache.get_or_load((symbol, period, interval), lambda: _download_intraday(symbol, period, interval))
+    frame = frame.dropna(subset=["Close"]) if not frame.empty else frame
+    index = pd.DatetimeIndex(frame.index)
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    t = np.asarray((index - pd.Timestamp(0)) // pd.Timedelta(seconds=1), dtype=np.int64)
+    return t, frame["Close"].to_numpy(dtype=np.float64)
+
+def check_range(period, interval):
+    """
+    Raises ValueError for an unknown or unsupported period/interval pair.
+    """
+    if interval in INTRADAY_PERIODS:
+        if period not in INTRADAY_PERIODS[interval]:
+            raise ValueError(f"Period '{period}' is not available at interval {interval}; use one of {INTRADAY_PERIODS[interval]}")
+    elif interval in DAILY_INTERVALS:
+        if period not in CHART_PERIODS:
+            raise ValueError(f"Unknown period '{period}', expected one of {tuple(CHART_PERIODS)}")
+    else:
+        raise ValueError(f"Unknown interval '{interval}', expected one of {DAILY_INTERVALS + tuple(INTRADAY_PERIODS)}")
+
+def get_price_history(ticker, period="1y", interval="1d", points=CHART_DEFAULT_POINTS):
+    """
+    Close-price series of `ticker` over `period` at `interval`, downsampled with LTTB to at
+    most `points` samples. Returns {"symbol", "points_in", "t", "close", "stats"}
+    (or {"error": ...}); `t` is epoch seconds, `stats` is computed from the full series.
+    """
+    check_range(period, interval)
+    symbol = resolve_ticker(ticker)
+    if not is_listed(symbol):
+        return {"error": unlisted_error(symbol)}
+
+    if interval in INTRADAY_PERIODS:
+        t, close = _intraday_bars(symbol, period, interval)
+    else:
+        t, close = _daily_bars(symbol, period, interval)
+    keep = np.flatnonzero(~np.isnan(close))
+    if not len(keep):
+        return {"error": f"No price history found for {symbol} (period={period}, interval={interval})."}
+
+    picked = keep[lttb(t[keep], close[keep], max(3, points))]
+    return {
+        "symbol": symbol,
+        "points_in": int(len(keep)),
+        "t": t[picked],
+        "close": close[picked],
+        "stats": {
+            "first": float(close[keep[0]]),
+            "last": float(close[keep[-1]]),
+            "high": float(close[keep].max()),
+            "low": float(close[keep].min()),
+            "change_pct": float((close[keep[-1]] / close[keep[0]] - 1.0) * 100.0)
+        }
+    }
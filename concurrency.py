@@ -0,0 +1,167 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Blocking work is split by kind so slow LLM calls can never occupy the threads that
+# serve cheap market-data lookups (and vice versa).
+MARKET_DATA_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv("MCP_MARKET_DATA_WORKERS", "16")),
+    thread_name_prefix="market-data"
+)
+LLM_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv("MCP_LLM_WORKERS", "4")),
+    thread_name_prefix="llm"
+)
+
+# CPU-bound numeric work (e.g. backtest grids) can be fanned out over processes. The pool is
+# created on first use, with "spawn" so workers do not inherit the server's threads.
+PROCESS_WORKERS = int(os.getenv("MCP_PROCESS_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+def get_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _process_pool
+
+async def run_in_pool(pool, fn, *args, **kwargs):
+    """
+    Runs a blocking function on `pool` without blocking the event loop. The caller's
+    context variables (e.g. the active telemetry trace) are visible inside `fn`.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(pool, functools.partial(context.run, fn, *args, **kwargs))
+
+class SingleFlight:
+    """
+    Request coalescing: while a call for `key` is in flight, further calls with the same key
+    wait for it and share its result instead of starting their own upstream fetch.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        """
+        Awaits `fn()` (an async callable) once per key at a time.
+        Cancelling one waiter does not cancel the shared call.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {"in_flight": len(self._inflight), "executions": self.executions, "coalesced": self.coalesced}
+
+_DONE = object()
+
+class _Flight:
+    def __init__(self):
+        self.chunks = []
+        self.subscribers = []
+        self.finished = False
+        self.error = None
+
+    def subscribe(self):
+        # Late joiners get a replay of everything produced so far
+        queue = asyncio.Queue()
+        for chunk in self.chunks:
+            queue.put_nowait(chunk)
+        if self.finished:
+            queue.put_nowait(_DONE)
+        else:
+            self.subscribers.append(queue)
+        return queue
+
+    def publish(self, chunk):
+        self.chunks.append(chunk)
+        for queue in self.subscribers:
+            queue.put_nowait(chunk)
+
+    def finish(self, error=None):
+        self.finished = True
+        self.error = error
+        for queue in self.subscribers:
+            queue.put_nowait(_DONE)
+        self.subscribers = []
+
+class StreamingSingleFlight(SingleFlight):
+    """
+    SingleFlight for blocking generators: the generator runs once per key on a thread pool
+    and every concurrent caller receives every chunk.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._flights = {}
+        self._producers = set()
+
+    async def stream(self, key, gen_fn, pool, limiter=None):
+        """
+        Async iterator over the chunks of `gen_fn()`, shared by all callers with the same key.
+        `limiter` (an async context manager) is held only by the single producing run.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            self.executions += 1
+            flight = _Flight()
+            self._flights[key] = flight
+            loop = asyncio.get_running_loop()
+
+            def produce():
+                for chunk in gen_fn():
+                    loop.call_soon_threadsafe(flight.publish, chunk)
+
+            async def run():
+                try:
+                    async with (limiter or contextlib.nullcontext()):
+                        await loop.run_in_executor(pool, contextvars.copy_context().run, produce)
+                except Exception as e:
+                    flight.finish(e)
+                else:
+                    flight.finish()
+                finally:
+                    if not flight.finished:
+                        flight.finish(RuntimeError("Stream producer was cancelled"))
+                    self._flights.pop(key, None)
+
+            # Keep a reference so the producer finishes even if every caller goes away
+            task = asyncio.ensure_future(run())
+            self._producers.add(task)
+            task.add_done_callback(self._producers.discard)
+        else:
+            self.coalesced += 1
+
+        queue = flight.subscribe()
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is _DONE:
+                    break
+                yield chunk
+        finally:
+            if queue in flight.subscribers:
+                flight.subscribers.remove(queue)
+        if flight.error is not None:
+            raise flight.error
+
+    def stats(self):
+        stats = super().stats()
+        stats["in_flight"] = len(self._flights)
+        return stats
@@ -0,0 +1,309 @@
+import datetime
+import json
+import os
+import threading
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from utils import telemetry
+
+# On-disk layout: one structured .npy file per symbol, opened memory-mapped
+STORE_DIR = os.getenv("HISTORY_STORE_DIR", os.path.join(os.getenv("STOCK_CACHE_DIR", ".cache"), "history"))
+# Depth fetched the first time a symbol is seen (matches the old period="1y" fetch)
+INITIAL_DAYS = int(os.getenv("HISTORY_STORE_INITIAL_DAYS", "366"))
+# Bars older than this are dropped when a symbol is rewritten
+MAX_DAYS = int(os.getenv("HISTORY_STORE_MAX_DAYS", "3660"))
+# Relative change in a re-downloaded close/adj_close that means Yahoo re-based the series
+# (split, bonus or dividend) and the stored bars must be replaced
+ADJUSTMENT_TOLERANCE = float(os.getenv("HISTORY_STORE_ADJUSTMENT_TOLERANCE", "0.0005"))
+
+BAR_DTYPE = np.dtype([
+    ("date", "<M8[D]"),
+    ("open", "<f4"),
+    ("high", "<f4"),
+    ("low", "<f4"),
+    ("close", "<f4"),
+    ("adj_close", "<f4"),
+    ("volume", "<f8")
+])
+
+_FIELDS = {"Open": "open", "High": "high", "Low": "low", "Close": "close", "Adj Close": "adj_close", "Volume": "volume"}
+
+_locks = {}
+_locks_guard = threading.Lock()
+# symbol -> first date Yahoo has for it (None: history reaches back further than we asked)
+_listed_from = {}
+
+class PriceHistory:
+    """
+    Read-only daily bars for one symbol, backed by a (usually memory-mapped) structured array.
+    Prices are unadjusted, as quoted; `adj_close` is split/dividend adjusted for return math.
+    """
+
+    def __init__(self, symbol, bars):
+        self.symbol = symbol
+        self.bars = bars
+
+    def __len__(self):
+        return len(self.bars)
+
+    @property
+    def empty(self):
+        return len(self.bars) == 0
+
+    @property
+    def nbytes(self):
+        return self.bars.nbytes
+
+    def __getitem__(self, field):
+        return self.bars[field]
+
+    def last_days(self, days):
+        """
+        Bars within `days` calendar days of the last stored bar.
+        """
+        if self.empty:
+            return self
+        cutoff = self.bars["date"][-1] - np.timedelta64(days, "D")
+        start = int(np.searchsorted(self.bars["date"], cutoff, side="right"))
+        return PriceHistory(self.symbol, self.bars[start:])
+
+    def to_frame(self):
+        """
+        OHLCV DataFrame in the same shape as `yf.Ticker.history()`.
+        """
+        frame = pd.DataFrame(
+            {column: np.asarray(self.bars[field], dtype=np.float64) for column, field in _FIELDS.items()},
+            index=pd.DatetimeIndex(np.asarray(self.bars["date"]).astype("datetime64[ns]"), name="Date")
+        )
+        return frame
+
+def _symbol_lock(symbol):
+    with _locks_guard:
+        return _locks.setdefault(symbol, threading.Lock())
+
+def _path(symbol):
+    return os.path.join(STORE_DIR, f"{quote(symbol, safe='')}.npy")
+
+def _meta_path(symbol):
+    return os.path.join(STORE_DIR, f"{quote(symbol, safe='')}.json")
+
+def _today():
+    return np.datetime64(datetime.date.today(), "D")
+
+def _read(symbol):
+    try:
+        return np.load(_path(symbol), mmap_mode="r")
+    except (FileNotFoundError, ValueError):
+        return np.empty(0, dtype=BAR_DTYPE)
+
+def _write(symbol, bars):
+    os.makedirs(STORE_DIR, exist_ok=True)
+    tmp_path = f"{_path(symbol)}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, bars)
+    os.replace(tmp_path, _path(symbol))
+
+def frame_to_bars(frame):
+    """
+    Converts a yfinance OHLCV DataFrame into the store's structured array.
+    """
+    frame = frame.dropna(subset=["Close"])
+    index = pd.DatetimeIndex(frame.index)
+    if index.tz is not None:
+        # Keep the exchange-local calendar date
+        index = index.tz_localize(None)
+
+    bars = np.empty(len(frame), dtype=BAR_DTYPE)
+    bars["date"] = index.values.astype("datetime64[D]")
+    for column, field in _FIELDS.items():
+        source = column if column in frame.columns else "Close"
+        bars[field] = frame[source].to_numpy(dtype=np.float64)
+    return bars
+
+def listed_from(symbol):
+    """
+    Earliest date Yahoo had bars for when `symbol` was last fully fetched, if that was
+    later than the start asked for (i.e. the stock listed more recently), else None.
+    """
+    if symbol not in _listed_from:
+        try:
+            with open(_meta_path(symbol)) as f:
+                _listed_from[symbol] = np.datetime64(json.load(f)["listed_from"], "D")
+        except (FileNotFoundError, ValueError, KeyError):
+            _listed_from[symbol] = None
+    return _listed_from[symbol]
+
+def _record_listing(symbol, start, bars):
+    """
+    After a full fetch from `start`, remembers whether the history begins later than that.
+    """
+    first = bars["date"][0] if len(bars) else None
+    if first is not None and first > start + np.timedelta64(7, "D"):
+        os.makedirs(STORE_DIR, exist_ok=True)
+        tmp_path = f"{_meta_path(symbol)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"listed_from": str(first)}, f)
+        os.replace(tmp_path, _meta_path(symbol))
+        _listed_from[symbol] = first
+    else:
+        try:
+            os.remove(_meta_path(symbol))
+        except FileNotFoundError:
+            pass
+        _listed_from[symbol] = None
+
+def _merge(symbol, existing, new_bars):
+    """
+    Appends `new_bars`, letting them overwrite any overlapping (possibly partial) bars.
+    The file is only rewritten when that changes something.
+    """
+    if len(new_bars):
+        keep = existing[existing["date"] < new_bars["date"][0]]
+        merged = np.concatenate([np.asarray(keep), new_bars])
+    else:
+        merged = np.asarray(existing)
+
+    cutoff = _today() - np.timedelta64(MAX_DAYS, "D")
+    merged = merged[merged["date"] >= cutoff]
+    if len(merged) != len(existing) or not np.array_equal(merged, existing):
+        _write(symbol, merged)
+    return merged
+
+def _rebased(existing, new_bars):
+    """
+    True if re-downloaded bars disagree with the stored copies of the same days, i.e. Yahoo
+    back-adjusted the series since it was stored. The last stored bar is skipped: it may
+    have been saved mid-session.
+    """
+    new_bars = new_bars[new_bars["date"] < existing["date"][-1]] if len(existing) else new_bars[:0]
+    if not len(new_bars):
+        return False
+    index = np.searchsorted(existing["date"], new_bars["date"])
+    same_day = existing["date"][index] == new_bars["date"]
+    old, new = existing[index[same_day]], new_bars[same_day]
+    for field in ("close", "adj_close"):
+        stored = np.asarray(old[field], dtype=np.float64)
+        fresh = np.asarray(new[field], dtype=np.float64)
+        if np.any(np.abs(fresh - stored) > ADJUSTMENT_TOLERANCE * np.abs(stored)):
+            return True
+    return False
+
+def _fetch_start(symbol, existing, min_days):
+    """
+    Returns (start, full). `full` means a fresh backfill from `min_days` ago; otherwise only
+    the tail is fetched, starting at the second-to-last stored bar (the last may have been
+    partial, the one before it is compared to spot re-based prices).
+    """
+    wanted = _today() - np.timedelta64(min_days, "D")
+    if len(existing) == 0:
+        return wanted, True
+    first = existing["date"][0]
+    listed = listed_from(symbol)
+    if first > wanted + np.timedelta64(7, "D") and (listed is None or first > listed):
+        return wanted, True
+    return existing["date"][max(len(existing) - 2, 0)], False
+
+def _refetch_start(existing, min_days):
+    """
+    Start of the full re-download that replaces a re-based history: as deep as before.
+    """
+    return min(existing["date"][0], _today() - np.timedelta64(min_days, "D"))
+
+def covers(history, min_days):
+    """
+    True if `history` already reaches back `min_days` calendar days, or to the symbol's
+    listing date (so `sync` would only fetch its tail).
+    """
+    return not _fetch_start(history.symbol, history.bars, min_days)[1]
+
+def load(symbol):
+    """
+    Stored bars for `symbol` without touching the network.
+    """
+    return PriceHistory(symbol, _read(symbol))
+
+def _download(symbol, start):
+    with telemetry.span("yfinance.history"):
+        frame = yf.Ticker(symbol).history(start=str(start), auto_adjust=False, actions=False)
+    return frame_to_bars(frame) if not frame.empty else np.empty(0, dtype=BAR_DTYPE)
+
+def _store(symbol, existing, new_bars, full_from=None):
+    """
+    Saves freshly downloaded bars (replacing everything when `full_from` is the start of a
+    full fetch) and returns the symbol's `PriceHistory`. Call with the symbol lock held.
+    A full fetch that comes back empty (Yahoo hiccup) leaves the stored bars and listing alone.
+    """
+    if full_from is not None and len(new_bars):
+        existing = np.empty(0, dtype=BAR_DTYPE)
+        _record_listing(symbol, full_from, new_bars)
+    if len(new_bars) == 0 and len(existing) == 0:
+        return PriceHistory(symbol, existing)
+    _merge(symbol, existing, new_bars)
+    return PriceHistory(symbol, _read(symbol))
+
+def sync(symbol, min_days=INITIAL_DAYS):
+    """
+    Brings one symbol up to date, downloading only the bars missing since the last stored
+    date (or a full `min_days` backfill the first time, or when Yahoo has re-based the
+    stored prices), and returns its `PriceHistory`.
+    """
+    with _symbol_lock(symbol):
+        existing = _read(symbol)
+        start, full = _fetch_start(symbol, existing, min_days)
+        new_bars = _download(symbol, start)
+        if not full and _rebased(existing, new_bars):
+            start, full = _refetch_start(existing, min_days), True
+            new_bars = _download(symbol, start)
+        return _store(symbol, existing, new_bars, full_from=start if full else None)
+
+def _split_bulk(bulk, symbol):
+    if isinstance(bulk.columns, pd.MultiIndex):
+        return bulk[symbol] if symbol in bulk.columns.get_level_values(0) else pd.DataFrame()
+    return bulk
+
+def _download_many(symbols, start):
+    with telemetry.span("yfinance.download"):
+        bulk = yf.download(symbols, start=str(start), group_by="ticker", auto_adjust=False,
+                           actions=False, threads=True, progress=False)
+    bars = {}
+    for symbol in symbols:
+        frame = _split_bulk(bulk, symbol)
+        bars[symbol] = frame_to_bars(frame) if not frame.empty else np.empty(0, dtype=BAR_DTYPE)
+    return bars
+
+def sync_many(symbols, min_days=INITIAL_DAYS):
+    """
+    Bulk version of `sync`. Symbols needing only their tail are fetched with one
+    multi-symbol `yf.download`; symbols needing a full backfill (first seen, or re-based
+    since they were stored) with another. Returns {symbol: PriceHistory}.
+    """
+    symbols = list(dict.fromkeys(symbols))
+    existing = {symbol: _read(symbol) for symbol in symbols}
+    plans = {symbol: _fetch_start(symbol, bars, min_days) for symbol, bars in existing.items()}
+
+    results = {}
+    tail = [symbol for symbol in symbols if not plans[symbol][1]]
+    if tail:
+        fetched = _download_many(tail, min(plans[symbol][0] for symbol in tail))
+        for symbol in tail:
+            new_bars = fetched[symbol]
+            if _rebased(existing[symbol], new_bars):
+                plans[symbol] = (_refetch_start(existing[symbol], min_days), True)
+                continue
+            # The bulk download started at the earliest tail; keep the bars from this symbol's own start
+            new_bars = new_bars[new_bars["date"] >= plans[symbol][0]]
+            with _symbol_lock(symbol):
+                results[symbol] = _store(symbol, existing[symbol], new_bars)
+
+    full = [symbol for symbol in symbols if plans[symbol][1]]
+    if full:
+        fetched = _download_many(full, min(plans[symbol][0] for symbol in full))
+        for symbol in full:
+            with _symbol_lock(symbol):
+                results[symbol] = _store(symbol, existing[symbol], fetched[symbol], full_from=plans[symbol][0])
+
+    return {symbol: results[symbol] for symbol in symbols}
@@ -0,0 +1,296 @@
+import asyncio
+import os
+import sys
+import threading
+from collections import namedtuple
+from contextlib import AsyncExitStack
+from datetime import timedelta
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.sse import sse_client
+from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
+
+from utils import telemetry
+
+# Pool defaults (overridable via environment variables)
+DEFAULT_POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", "2"))
+HEALTH_CHECK_INTERVAL = float(os.getenv("MCP_HEALTH_CHECK_INTERVAL", "30"))
+CALL_TIMEOUT = float(os.getenv("MCP_CALL_TIMEOUT", "120"))
+RESPAWN_BACKOFF_MAX = 30.0
+# Failed spawns in a row after which the calls waiting for a server are failed
+SPAWN_ATTEMPTS = 3
+# Calls one session runs at the same time (streamed analyses hold theirs until they finish)
+SESSION_CONCURRENCY = int(os.getenv("MCP_SESSION_CONCURRENCY", "8"))
+
+# A queued tool call. `retried` marks calls that must not be replayed on a fresh server,
+# `pinned` calls that must run on the first worker's server.
+_Call = namedtuple("_Call", ["name", "arguments", "timeout", "progress_callback", "future", "retried", "pinned"])
+
+class MCPClientPool:
+    """
+    A pool of long-lived MCP client sessions to warm `stock_mcp_server.py` processes.
+
+    By default every worker spawns its own stdio server. If `server_url` is given, the workers
+    instead connect to one shared server started with `--transport streamable-http` (or `sse`
+    when the URL ends in `/sse`), and no processes are spawned locally.
+
+    The pool owns a private asyncio event loop running in a daemon thread, so it can be
+    shared across Streamlit reruns and browser sessions (each of which uses its own loop).
+    Every worker keeps one server process + initialized `ClientSession` open, pulls tool
+    calls off a shared queue (running up to `session_concurrency` of them at once), pings
+    the server while idle and respawns it if it dies. Pinned calls all go to the first
+    worker, for tools whose answers depend on per-process state (live quote cursors).
+    """
+
+    def __init__(self, server_script="stock_mcp_server.py", pool_size=DEFAULT_POOL_SIZE,
+                 health_check_interval=HEALTH_CHECK_INTERVAL, env=None, server_url=None,
+                 session_concurrency=SESSION_CONCURRENCY):
+        self.server_url = server_url or None
+        self.server_params = StdioServerParameters(
+            command=sys.executable,
+            args=[server_script],
+            env=dict(env if env is not None else os.environ)
+        )
+        self.pool_size = max(1, int(pool_size))
+        self.health_check_interval = health_check_interval
+        self.session_concurrency = max(1, int(session_concurrency))
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="mcp-client-pool", daemon=True)
+        self._thread.start()
+
+        self._queue = None
+        self._pinned = None
+        self._workers = []
+        self._healthy = {}
+        self._in_flight = {}
+        self._closed = False
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+
+    async def _start(self):
+        self._queue = asyncio.Queue()
+        self._pinned = asyncio.Queue()
+        for worker_id in range(self.pool_size):
+            self._healthy[worker_id] = False
+            self._workers.append(asyncio.create_task(self._worker(worker_id)))
+
+    def close(self):
+        """
+        Stops all workers (terminating their server processes) and the pool's event loop.
+        """
+        if self._closed:
+            return
+        self._closed = True
+
+        async def _shutdown():
+            for task in self._workers:
+                task.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(_shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+    async def _open_session(self, stack):
+        with telemetry.span("client.spawn" if self.server_url is None else "client.connect"):
+            if self.server_url is None:
+                read, write = await stack.enter_async_context(stdio_client(self.server_params))
+            elif self.server_url.rstrip("/").endswith("/sse"):
+                read, write = await stack.enter_async_context(sse_client(self.server_url))
+            else:
+                read, write, _ = await stack.enter_async_context(streamablehttp_client(self.server_url))
+        # For stdio this includes the server's import time: it answers once it is loaded
+        with telemetry.span("client.initialize"):
+            session = await stack.enter_async_context(ClientSession(read, write))
+            await session.initialize()
+        return session
+
+    async def _run(self, session, job, in_flight, slots, failure):
+        """
+        One tool call on `session`. A broken session is reported through `failure`; the job
+        then stays in `in_flight` so the worker can retry it on a fresh server.
+        """
+        future = job.future
+        try:
+            with telemetry.span("client.call", tool=job.name):
+                result = await session.call_tool(
+                    job.name,
+                    arguments=job.arguments,
+                    read_timeout_seconds=timedelta(seconds=job.timeout),
+                    progress_callback=job.progress_callback
+                )
+        except McpError as e:
+            if e.error.code == CONNECTION_CLOSED:
+                if not failure.done():
+                    failure.set_exception(e)
+                return
+            # Protocol-level failure (e.g. request timeout): the session is still usable
+            if not future.done():
+                future.set_exception(e)
+        except Exception as e:
+            if not failure.done():
+                failure.set_exception(e)
+            return
+        else:
+            if not future.done():
+                future.set_result(result)
+        in_flight.pop(future, None)
+        slots.release()
+
+    async def _serve(self, session, in_flight, tasks, queues):
+        """
+        Pulls calls off `queues` and runs each as its own task on `session` (a ClientSession
+        multiplexes concurrent requests), at most `session_concurrency` at a time, so a long
+        streamed analysis does not hold up quick calls behind it. Raises once the session breaks.
+        """
+        slots = asyncio.Semaphore(self.session_concurrency)
+        failure = self._loop.create_future()
+        getters = {}
+        try:
+            while True:
+                await slots.acquire()
+                for queue in queues:
+                    if queue not in getters:
+                        getters[queue] = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({failure, *getters.values()}, timeout=self.health_check_interval,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if failure in done:
+                    failure.result()
+                ready = [queue for queue, getter in getters.items() if getter in done]
+                if not ready:
+                    slots.release()
+                    # Idle: make sure the server is still alive
+                    await asyncio.wait_for(session.send_ping(), timeout=10)
+                    continue
+
+                job = getters.pop(ready[0]).result()
+                if job.future.cancelled():
+                    slots.release()
+                    continue
+                in_flight[job.future] = job
+                task = asyncio.create_task(self._run(session, job, in_flight, slots, failure))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            # A call taken off a queue but not started goes back for the next session
+            for queue, getter in getters.items():
+                if getter.done() and not getter.cancelled():
+                    queue.put_nowait(getter.result())
+                else:
+                    getter.cancel()
+
+    def _fail_queued(self, worker_id, error):
+        """
+        Fails the calls only this worker could serve: pinned ones, and every queued one once
+        no worker has a live session.
+        """
+        queues = [self._pinned] if worker_id == 0 else []
+        if not any(self._healthy.values()):
+            queues.append(self._queue)
+        for queue in queues:
+            while not queue.empty():
+                job = queue.get_nowait()
+                if not job.future.done():
+                    job.future.set_exception(error)
+
+    async def _worker(self, worker_id):
+        backoff = 0.5
+        spawn_failures = 0
+        while True:
+            in_flight = {}
+            tasks = set()
+            opened = False
+            try:
+                async with AsyncExitStack() as stack:
+                    session = await self._open_session(stack)
+                    opened = True
+                    self._healthy[worker_id] = True
+                    self._in_flight[worker_id] = in_flight
+                    backoff = 0.5
+                    spawn_failures = 0
+                    try:
+                        queues = [self._queue, self._pinned] if worker_id == 0 else [self._queue]
+                        await self._serve(session, in_flight, tasks, queues)
+                    finally:
+                        for task in list(tasks):
+                            task.cancel()
+                        await asyncio.gather(*tasks, return_exceptions=True)
+
+            except asyncio.CancelledError:
+                self._healthy[worker_id] = False
+                for job in in_flight.values():
+                    if not job.future.done():
+                        job.future.cancel()
+                raise
+            except Exception as e:
+                # The server died or the session broke: retry the in-flight calls once on a
+                # fresh server, then respawn with capped exponential backoff.
+                self._healthy[worker_id] = False
+                for job in in_flight.values():
+                    if job.future.done():
+                        continue
+                    if job.retried:
+                        job.future.set_exception(e)
+                    else:
+                        (self._pinned if job.pinned else self._queue).put_nowait(job._replace(retried=True))
+                spawn_failures = 0 if opened else spawn_failures + 1
+                if spawn_failures >= SPAWN_ATTEMPTS:
+                    # The server does not start: fail waiting calls instead of queueing them forever
+                    self._fail_queued(worker_id, RuntimeError(f"MCP server is not available: {e}"))
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, RESPAWN_BACKOFF_MAX)
+
+    async def _submit(self, name, arguments, timeout, progress_callback, pinned):
+        future = self._loop.create_future()
+        # With a shared server every session already talks to the same process
+        pinned = pinned and self.server_url is None
+        # Streamed calls are not replayed: the caller would see the same chunks twice
+        job = _Call(name, arguments, timeout, progress_callback, future, progress_callback is not None, pinned)
+        await (self._pinned if pinned else self._queue).put(job)
+        # Queue wait + call, as seen by the caller, under one deadline
+        with telemetry.span("client.request", tool=name):
+            try:
+                return await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"{name} did not finish within {timeout:g}s") from None
+
+    def submit(self, name, arguments=None, timeout=CALL_TIMEOUT, progress_callback=None, pinned=False):
+        """
+        Schedules a tool call on the pool and returns a `concurrent.futures.Future`. `timeout`
+        covers the whole call, time spent queued for a free session included.
+        `progress_callback(progress, total, message)` is an async function; it runs on the
+        pool's event loop thread for every progress notification the tool sends.
+        `pinned` calls all run on the first worker's server.
+        """
+        if self._closed:
+            raise RuntimeError("MCP client pool is closed")
+        return asyncio.run_coroutine_threadsafe(
+            self._submit(name, arguments or {}, timeout, progress_callback, pinned), self._loop
+        )
+
+    def call_tool(self, name, arguments=None, timeout=CALL_TIMEOUT, pinned=False):
+        """
+        Blocking tool call through one of the warm sessions.
+        """
+        return self.submit(name, arguments, timeout, pinned=pinned).result()
+
+    async def acall_tool(self, name, arguments=None, timeout=CALL_TIMEOUT, pinned=False):
+        """
+        Awaitable tool call usable from any event loop (e.g. inside `asyncio.run`).
+        """
+        return await asyncio.wrap_future(self.submit(name, arguments, timeout, pinned=pinned))
+
+    def health(self):
+        """
+        Returns a small status dict: configured size and number of live sessions.
+        """
+        return {
+            "transport": "stdio" if self.server_url is None else self.server_url,
+            "pool_size": self.pool_size,
+            "healthy_workers": sum(1 for ok in self._healthy.values() if ok),
+            "queued_calls": self._queue.qsize() + self._pinned.qsize() if self._queue else 0,
+            "running_calls": sum(len(jobs) for jobs in self._in_flight.values())
+        }
@@ -0,0 +1,146 @@
+import base64
+import datetime
+import json
+import math
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+from typing_extensions import NotRequired, TypedDict
+
+# Bump when a payload changes shape in a way older clients cannot read
+SCHEMA_VERSION = 1
+
+ENCODINGS = ("json", "columnar")
+
+class ColumnBlock(TypedDict):
+    """
+    A table stored column-wise. With encoding="json" each column is a plain list; with
+    encoding="columnar" each column is {"dtype", "shape", "b64"} (raw little-endian bytes).
+    """
+    encoding: str
+    length: int
+    columns: dict[str, Any]
+
+class StockMetricsPayload(TypedDict):
+    kind: str
+    version: int
+    ticker: str
+    data: dict[str, Any]
+    # FastMCP serializes an omitted field as null, so the schema must allow it
+    history: NotRequired[Optional[ColumnBlock]]
+
+class StockMetricsBatchPayload(TypedDict):
+    kind: str
+    version: int
+    results: dict[str, dict[str, Any]]
+
+def to_jsonable(value):
+    """
+    Recursively converts numpy / pandas scalars into plain JSON types.
+    NaN and +/-inf become None so the result is strict JSON.
+    """
+    if isinstance(value, dict):
+        return {str(k): to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return [to_jsonable(v) for v in value.tolist()]
+    if value is pd.NaT:
+        return None
+    if isinstance(value, (pd.Timestamp, datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+def encode_array(values, dtype=None):
+    """
+    Encodes a 1-D array as base64 of its little-endian bytes.
+    """
+    arr = np.ascontiguousarray(values, dtype=dtype)
+    arr = arr.astype(arr.dtype.newbyteorder("<"), copy=False)
+    return {
+        "dtype": arr.dtype.str,
+        "shape": list(arr.shape),
+        "b64": base64.b64encode(arr.tobytes()).decode("ascii")
+    }
+
+def decode_array(obj):
+    """
+    Inverse of `encode_array`.
+    """
+    raw = base64.b64decode(obj["b64"])
+    return np.frombuffer(raw, dtype=np.dtype(obj["dtype"])).reshape(obj["shape"])
+
+def encode_columns(columns, encoding="json"):
+    """
+    Packs a dict of equal-length arrays into a `ColumnBlock`.
+    Float NaNs survive the "columnar" encoding and become None with "json".
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown encoding '{encoding}', expected one of {ENCODINGS}")
+
+    arrays = {name: np.asarray(values) for name, values in columns.items()}
+    length = len(next(iter(arrays.values()))) if arrays else 0
+
+    if encoding == "columnar":
+        packed = {name: encode_array(arr) for name, arr in arrays.items()}
+    else:
+        packed = {name: to_jsonable(arr) for name, arr in arrays.items()}
+
+    return {"encoding": encoding, "length": length, "columns": packed}
+
+def decode_columns(block):
+    """
+    Unpacks a `ColumnBlock` into a dict of numpy arrays.
+    """
+    if block["encoding"] == "columnar":
+        return {name: decode_array(obj) for name, obj in block["columns"].items()}
+    return {
+        name: np.array([np.nan if v is None else v for v in values])
+        for name, values in block["columns"].items()
+    }
+
+def history_columns(history, encoding="json"):
+    """
+    Column block for an OHLCV DataFrame. Timestamps are sent as epoch seconds ("t").
+    """
+    index = pd.DatetimeIndex(history.index)
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+
+    columns = {"t": np.asarray((index - pd.Timestamp(0)) // pd.Timedelta(seconds=1), dtype=np.int64)}
+    for field in ("Open", "High", "Low", "Close"):
+        columns[field.lower()] = history[field].to_numpy(dtype=np.float64)
+    columns["volume"] = history["Volume"].to_numpy(dtype=np.float64)
+    return encode_columns(columns, encoding)
+
+def make_payload(kind, **fields):
+    """
+    Wraps tool output in a versioned envelope: {"kind", "version", ...fields}.
+    """
+    payload = {"kind": kind, "version": SCHEMA_VERSION}
+    payload.update(fields)
+    return payload
+
+def parse_tool_result(result, expected_kind: Optional[str] = None):
+    """
+    Client-side counterpart: reads a CallToolResult's structured content (falling back to
+    the JSON text block) and checks the envelope.
+    """
+    if result.isError:
+        message = result.content[0].text if result.content else "Unknown tool error"
+        raise ValueError(message)
+
+    payload = result.structuredContent
+    if payload is None:
+        payload = json.loads(result.content[0].text)
+
+    if expected_kind and payload.get("kind") != expected_kind:
+        raise ValueError(f"Unexpected payload kind '{payload.get('kind')}', expected '{expected_kind}'")
+    if payload.get("version", 0) > SCHEMA_VERSION:
+        raise ValueError(f"Payload version {payload.get('version')} is newer than supported ({SCHEMA_VERSION})")
+    return payload
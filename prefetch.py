@@ -0,0 +1,227 @@
+"""
+Background prefetching: keeps the most requested tickers and configured watchlists (by
+default the NIFTY 50 constituents) warm in the `stock_data` caches, so popular lookups are
+served from memory instead of paying a cold Yahoo fetch.
+
+The scheduler runs on its own daemon thread, refreshes on a market-hours-aware cadence,
+spaces its upstream requests out (with jitter), and backs off while interactive requests
+are in flight.
+"""
+import datetime
+import math
+import os
+import random
+import sys
+import threading
+import time
+from zoneinfo import ZoneInfo
+
+from utils import telemetry
+from utils.stock_data import history_cache, info_cache, prefetch, resolve_ticker
+
+# NIFTY 50 constituents (NSE, 2025 composition)
+NIFTY50 = (
+    "ADANIENT", "ADANIPORTS", "APOLLOHOSP", "ASIANPAINT", "AXISBANK", "BAJAJ-AUTO", "BAJFINANCE",
+    "BAJAJFINSV", "BEL", "BHARTIARTL", "CIPLA", "COALINDIA", "DRREDDY", "EICHERMOT", "ETERNAL",
+    "GRASIM", "HCLTECH", "HDFCBANK", "HDFCLIFE", "HEROMOTOCO", "HINDALCO", "HINDUNILVR", "ICICIBANK",
+    "INDUSINDBK", "INFY", "ITC", "JIOFIN", "JSWSTEEL", "KOTAKBANK", "LT", "M&M", "MARUTI",
+    "NESTLEIND", "NTPC", "ONGC", "POWERGRID", "RELIANCE", "SBILIFE", "SBIN", "SHRIRAMFIN",
+    "SUNPHARMA", "TATACONSUM", "TATAMOTORS", "TATASTEEL", "TCS", "TECHM", "TITAN", "TRENT",
+    "ULTRACEMCO", "WIPRO"
+)
+# Named groups usable in PREFETCH_WATCHLIST
+WATCHLISTS = {"NIFTY50": NIFTY50}
+
+# Comma-separated tickers and/or watchlist names
+PREFETCH_WATCHLIST = os.getenv("PREFETCH_WATCHLIST", "NIFTY50,^NSEI,^NSEBANK")
+# Most requested tickers kept warm in addition to the watchlist
+PREFETCH_TOP_N = int(os.getenv("PREFETCH_TOP_N", "20"))
+# Request counts decay with this half-life, so yesterday's favourites fade out
+PREFETCH_HALF_LIFE = float(os.getenv("PREFETCH_HALF_LIFE", "3600"))
+# Seconds between cycles outside market hours (quotes do not move then)
+PREFETCH_OFF_HOURS_INTERVAL = float(os.getenv("PREFETCH_OFF_HOURS_INTERVAL", "1800"))
+# Upper bound on upstream requests (a bulk download counts as one) the scheduler may make
+PREFETCH_REQUESTS_PER_MINUTE = float(os.getenv("PREFETCH_REQUESTS_PER_MINUTE", "30"))
+# Symbols per bulk history download
+PREFETCH_BATCH_SIZE = int(os.getenv("PREFETCH_BATCH_SIZE", "25"))
+# Longest a request is held back while interactive calls are running
+PREFETCH_MAX_YIELD = float(os.getenv("PREFETCH_MAX_YIELD", "10"))
+# Also warm the news search cache for the top-N tickers (batched DuckDuckGo queries)
+PREFETCH_NEWS = os.getenv("PREFETCH_NEWS", "0") == "1"
+
+MARKET_TZ = ZoneInfo("Asia/Kolkata")
+# NSE cash session is 09:15-15:30 IST; start early and stop late so the open and close are warm
+MARKET_OPEN = datetime.time(9, 0)
+MARKET_CLOSE = datetime.time(15, 45)
+
+def market_is_open(now=None):
+    """
+    True on weekdays between MARKET_OPEN and MARKET_CLOSE IST (exchange holidays are not modelled).
+    """
+    now = (now or datetime.datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() <= MARKET_CLOSE
+
+def parse_watchlist(spec):
+    """
+    "NIFTY50,^NSEI,TCS" -> resolved symbols, expanding named watchlists.
+    """
+    symbols = []
+    for item in (part.strip() for part in spec.split(",")):
+        if not item:
+            continue
+        for ticker in WATCHLISTS.get(item.upper(), (item,)):
+            symbols.append(resolve_ticker(ticker))
+    return list(dict.fromkeys(symbols))
+
+class PrefetchScheduler:
+    """
+    Tracks how often each symbol is requested and periodically refreshes the watchlist plus
+    the top-N symbols. `busy()` reports whether interactive work is in flight.
+    """
+
+    def __init__(self, watchlist=PREFETCH_WATCHLIST, top_n=PREFETCH_TOP_N, half_life=PREFETCH_HALF_LIFE,
+                 requests_per_minute=PREFETCH_REQUESTS_PER_MINUTE, busy=None):
+        self.watchlist_spec = watchlist
+        self.top_n = top_n
+        self.half_life = half_life
+        self.min_gap = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self.busy = busy or (lambda: False)
+
+        self._scores = {}  # symbol -> (score, updated_at)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_request = 0.0
+        self.cycles = 0
+        self.last_cycle = None
+
+    def record(self, symbols):
+        """
+        Counts one request for each resolved symbol.
+        """
+        now = time.time()
+        with self._lock:
+            for symbol in symbols:
+                score, updated_at = self._scores.get(symbol, (0.0, now))
+                self._scores[symbol] = (self._decay(score, now - updated_at) + 1.0, now)
+            if len(self._scores) > 10 * max(self.top_n, 100):
+                self._prune(now)
+
+    def _decay(self, score, elapsed):
+        return score * math.pow(0.5, elapsed / self.half_life) if self.half_life > 0 else score
+
+    def _prune(self, now):
+        # Keep the memory bounded: forget symbols whose decayed count has faded away
+        self._scores = {symbol: entry for symbol, entry in self._scores.items()
+                        if self._decay(entry[0], now - entry[1]) >= 0.05}
+
+    def top(self, n=None):
+        """
+        [(symbol, decayed request count)], most requested first.
+        """
+        now = time.time()
+        with self._lock:
+            scored = [(symbol, self._decay(score, now - updated_at)) for symbol, (score, updated_at) in self._scores.items()]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:self.top_n if n is None else n]
+
+    def targets(self):
+        return list(dict.fromkeys(parse_watchlist(self.watchlist_spec) + [symbol for symbol, _ in self.top()]))
+
+    def _throttle(self):
+        """
+        Spaces upstream requests at least `min_gap` apart (jittered +-50%), and waits for
+        interactive requests to drain first (up to PREFETCH_MAX_YIELD seconds).
+        """
+        gap = self.min_gap * random.uniform(0.5, 1.5)
+        wait = self._last_request + gap - time.monotonic()
+        if wait > 0:
+            self._stop.wait(wait)
+
+        deadline = time.monotonic() + PREFETCH_MAX_YIELD
+        while self.busy() and time.monotonic() < deadline and not self._stop.is_set():
+            telemetry.increment("prefetch_yields_total")
+            self._stop.wait(0.2)
+
+        if self._stop.is_set():
+            raise InterruptedError("prefetch scheduler stopped")
+        self._last_request = time.monotonic()
+
+    def interval(self):
+        """
+        Seconds until the next cycle: just inside the quote TTL while the market is open,
+        PREFETCH_OFF_HOURS_INTERVAL otherwise (jittered by +-10%).
+        """
+        base = max(15.0, history_cache.ttl * 0.75) if market_is_open() else PREFETCH_OFF_HOURS_INTERVAL
+        return base * random.uniform(0.9, 1.1)
+
+    def run_cycle(self):
+        """
+        One refresh pass over all targets. Returns (histories, infos) refreshed.
+        """
+        targets = self.targets()
+        refreshed = [0, 0]
+        with telemetry.span("prefetch.cycle"):
+            for start in range(0, len(targets), PREFETCH_BATCH_SIZE):
+                try:
+                    histories, infos = prefetch(targets[start:start + PREFETCH_BATCH_SIZE], throttle=self._throttle)
+                except InterruptedError:
+                    break
+                except Exception as e:
+                    telemetry.increment("prefetch_errors_total", stage="history")
+                    print(f"Prefetch batch failed: {e}", file=sys.stderr)
+                    continue
+                refreshed[0] += histories
+                refreshed[1] += infos
+            if PREFETCH_NEWS:
+                self._warm_news()
+        telemetry.increment("prefetch_symbols_total", refreshed[0], kind="history")
+        telemetry.increment("prefetch_symbols_total", refreshed[1], kind="info")
+        self.cycles += 1
+        self.last_cycle = {"at": time.time(), "targets": len(targets), "histories": refreshed[0], "infos": refreshed[1]}
+        return tuple(refreshed)
+
+    def _warm_news(self):
+        # Imported here so the scheduler does not pull in the analysis module unless asked to
+        from utils.ai_analysis import warm_company_searches
+
+        companies = {}
+        for symbol, _ in self.top():
+            info = info_cache.peek(symbol) or {}
+            if info.get("longName"):
+                companies[symbol] = info["longName"]
+        if companies:
+            try:
+                warm_company_searches(companies)
+            except Exception as e:
+                telemetry.increment("prefetch_errors_total", stage="news")
+                print(f"Prefetch news search failed: {e}", file=sys.stderr)
+
+    def _run(self):
+        # Small random delay so several server processes do not fire together
+        self._stop.wait(random.uniform(1.0, 5.0))
+        while not self._stop.is_set():
+            self.run_cycle()
+            self._stop.wait(self.interval())
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="prefetch", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "market_open": market_is_open(),
+            "cycles": self.cycles,
+            "last_cycle": self.last_cycle,
+            "top": [{"symbol": symbol, "score": round(score, 2)} for symbol, score in self.top(10)]
+        }
@@ -0,0 +1,182 @@
+"""
+Live quotes: a single poller refreshes every subscribed symbol at a shared cadence (one
+bulk download per cycle, however many clients watch the same tickers) and keeps a
+versioned copy of each quote, so clients can ask for just the fields that changed since
+the cursor they last saw.
+
+Subscriptions are leases: a client keeps its symbols alive by polling (or streaming) and
+they drop out of the poll set `QUOTE_LEASE_SECONDS` after the last renewal.
+"""
+import os
+import sys
+import threading
+import time
+import uuid
+
+from utils import history_store, telemetry
+from utils.prefetch import market_is_open
+from utils.stock_data import history_cache, is_listed
+
+# Seconds between upstream polls while the market is open, and outside market hours
+QUOTE_POLL_INTERVAL = float(os.getenv("QUOTE_POLL_INTERVAL", "5"))
+QUOTE_OFF_HOURS_INTERVAL = float(os.getenv("QUOTE_OFF_HOURS_INTERVAL", "60"))
+# A subscription lapses this long after it was last renewed
+QUOTE_LEASE_SECONDS = float(os.getenv("QUOTE_LEASE_SECONDS", "60"))
+# Most symbols polled at once
+QUOTE_MAX_SYMBOLS = int(os.getenv("QUOTE_MAX_SYMBOLS", "200"))
+
+def quote_from_history(history):
+    """
+    Quote fields from the latest (possibly still forming) daily bar.
+    """
+    close = history["close"]
+    price = round(float(close[-1]), 2)
+    previous = round(float(close[-2]), 2) if len(history) > 1 else None
+    change = round(price - previous, 2) if previous else None
+    return {
+        "price": price,
+        "previous_close": previous,
+        "change": change,
+        "change_pct": round(change / previous * 100.0, 2) if previous else None,
+        "open": round(float(history["open"][-1]), 2),
+        "day_high": round(float(history["high"][-1]), 2),
+        "day_low": round(float(history["low"][-1]), 2),
+        "volume": int(history["volume"][-1]),
+        "as_of": str(history["date"][-1])
+    }
+
+class QuoteHub:
+    """
+    Shared poller plus versioned quote store. Every change bumps a global cursor; each field
+    remembers the cursor at which it last changed, which is what `updates()` diffs against.
+    """
+
+    def __init__(self, poll_interval=QUOTE_POLL_INTERVAL, off_hours_interval=QUOTE_OFF_HOURS_INTERVAL,
+                 lease_seconds=QUOTE_LEASE_SECONDS):
+        self.poll_interval = poll_interval
+        self.off_hours_interval = off_hours_interval
+        self.lease_seconds = lease_seconds
+        # Cursors are only meaningful within one hub; clients reset when this changes
+        self.epoch = uuid.uuid4().hex[:12]
+
+        self._leases = {}  # symbol -> expiry (monotonic)
+        self._fields = {}  # symbol -> {field: (value, cursor)}
+        self._cursor = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.polls = 0
+
+    def subscribe(self, symbols):
+        """
+        Adds or renews leases for resolved `symbols` and starts the poller if needed.
+        Returns the symbols that have no quote yet (the caller can `poll()` them right away
+        rather than wait for the next cycle).
+        """
+        symbols = [symbol for symbol in dict.fromkeys(symbols) if is_listed(symbol)]
+        expiry = time.monotonic() + self.lease_seconds
+        with self._lock:
+            new = [symbol for symbol in symbols if symbol not in self._leases]
+            if len(self._leases) + len(new) > QUOTE_MAX_SYMBOLS:
+                raise ValueError(f"Too many live symbols; the limit is {QUOTE_MAX_SYMBOLS}")
+            for symbol in symbols:
+                self._leases[symbol] = expiry
+            missing = [symbol for symbol in symbols if symbol not in self._fields]
+        self.start()
+        return missing
+
+    def subscribed(self):
+        now = time.monotonic()
+        with self._lock:
+            for symbol in [symbol for symbol, expiry in self._leases.items() if expiry < now]:
+                del self._leases[symbol]
+                self._fields.pop(symbol, None)
+            return list(self._leases)
+
+    def poll(self, symbols=None):
+        """
+        One upstream round: tops up the stored history of `symbols` (default: everything
+        subscribed) with one bulk download and records what changed. Returns the new cursor.
+        """
+        symbols = self.subscribed() if symbols is None else list(dict.fromkeys(symbols))
+        if not symbols:
+            return self.cursor
+        with telemetry.span("quotes.poll"):
+            histories = history_store.sync_many(symbols)
+        self.polls += 1
+
+        quotes = {}
+        for symbol, history in histories.items():
+            # Keeps get_stock_metrics warm as a side effect
+            history_cache.set(symbol, history)
+            if not history.empty:
+                quotes[symbol] = quote_from_history(history)
+        return self._apply(quotes)
+
+    def _apply(self, quotes):
+        with self._lock:
+            changed = {}
+            for symbol, quote in quotes.items():
+                fields = self._fields.setdefault(symbol, {})
+                diff = {field: value for field, value in quote.items()
+                        if field not in fields or fields[field][0] != value}
+                if diff:
+                    changed[symbol] = diff
+            if changed:
+                self._cursor += 1
+                for symbol, diff in changed.items():
+                    for field, value in diff.items():
+                        self._fields[symbol][field] = (value, self._cursor)
+                telemetry.increment("quote_updates_total", len(changed))
+            return self._cursor
+
+    @property
+    def cursor(self):
+        with self._lock:
+            return self._cursor
+
+    def updates(self, symbols, since=0):
+        """
+        (cursor, {symbol: {field: value}}) with the fields of `symbols` that changed after
+        `since`. since=0 returns full quotes. Symbols with nothing new are left out.
+        """
+        with self._lock:
+            deltas = {}
+            for symbol in symbols:
+                fields = self._fields.get(symbol, {})
+                delta = {field: value for field, (value, cursor) in fields.items() if cursor > since}
+                if delta:
+                    deltas[symbol] = delta
+            return self._cursor, deltas
+
+    def interval(self):
+        return self.poll_interval if market_is_open() else self.off_hours_interval
+
+    def _run(self):
+        # New symbols get their first quote from the subscriber's own `poll()`
+        while not self._stop.wait(self.interval()):
+            try:
+                self.poll()
+            except Exception as e:
+                telemetry.increment("quote_poll_errors_total")
+                print(f"Quote poll failed: {e}", file=sys.stderr)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="quotes", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "epoch": self.epoch,
+            "cursor": self.cursor,
+            "subscribed": len(self.subscribed()),
+            "polls": self.polls,
+            "interval": self.interval()
+        }
@@ -0,0 +1,223 @@
+"""
+Vectorized portfolio risk analytics.
+
+Daily returns for every holding are aligned into one (n_tickers, n_days) matrix and all
+statistics are computed from it with whole-matrix NumPy operations: the pairwise
+covariance comes from three matrix products over the present/missing mask, so there is
+no Python loop over tickers or pairs.
+"""
+import os
+from statistics import NormalDist
+
+import numpy as np
+
+from utils.stock_data import get_histories
+from utils.technicals import BENCHMARK, TRADING_DAYS, align, beta
+
+# Trading days of history used by default (one year)
+RISK_LOOKBACK_DAYS = int(os.getenv("RISK_LOOKBACK_DAYS", "252"))
+CONFIDENCE_LEVELS = (0.95, 0.99)
+# Most correlated / least correlated pairs listed in the summary
+TOP_PAIRS = 10
+
+def forward_fill(x):
+    """
+    Carries each row's last value over NaN gaps (leading NaNs stay NaN).
+    """
+    x = np.atleast_2d(x)
+    index = np.where(~np.isnan(x), np.arange(x.shape[1]), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    return x[np.arange(x.shape[0])[:, None], index]
+
+def simple_returns(prices):
+    """
+    Daily simple returns from adjusted closes. Days on which a listed ticker has no bar
+    (e.g. a trading halt) count as unchanged; days before its first bar stay NaN.
+    """
+    filled = forward_fill(prices)
+    out = np.full(filled.shape, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[:, 1:] = filled[:, 1:] / filled[:, :-1] - 1.0
+    return out
+
+def covariance(returns, ddof=1):
+    """
+    Pairwise-complete covariance and correlation of the rows of `returns` (NaN = missing).
+    Returns (covariance, correlation, observations), each (n, n).
+    """
+    mask = (~np.isnan(returns)).astype(float)
+    x = np.where(mask > 0, returns, 0.0)
+
+    n = mask @ mask.T                    # days where both i and j have a return
+    sum_x = x @ mask.T                   # sum of x_i over those days
+    sum_sq = (x * x) @ mask.T            # sum of x_i^2 over those days
+    sum_xy = x @ x.T                     # sum of x_i * x_j
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = (sum_xy - sum_x * sum_x.T / n) / (n - ddof)
+        var_i = (sum_sq - sum_x * sum_x / n) / (n - ddof)
+        corr = cov / np.sqrt(var_i * var_i.T)
+    cov = np.where(n > ddof, cov, np.nan)
+    corr = np.where(n > ddof, np.clip(corr, -1.0, 1.0), np.nan)
+    return cov, corr, n
+
+def historical_var(returns, levels=CONFIDENCE_LEVELS):
+    """
+    Historical VaR and CVaR (expected shortfall) of 1-D `returns`, as positive loss
+    fractions. Returns ({level: var}, {level: cvar}).
+    """
+    returns = np.sort(returns[~np.isnan(returns)])
+    var, cvar = {}, {}
+    for level in levels:
+        if not len(returns):
+            var[level] = cvar[level] = None
+            continue
+        cutoff = np.quantile(returns, 1.0 - level)
+        var[level] = float(-cutoff)
+        cvar[level] = float(-returns[returns <= cutoff].mean())
+    return var, cvar
+
+def parametric_var(mean, std, levels=CONFIDENCE_LEVELS):
+    """
+    Gaussian (variance-covariance) VaR and CVaR for a daily return with `mean` and `std`.
+    """
+    normal = NormalDist()
+    var, cvar = {}, {}
+    for level in levels:
+        z = normal.inv_cdf(1.0 - level)
+        var[level] = float(-(mean + z * std))
+        cvar[level] = float(-(mean - std * normal.pdf(z) / (1.0 - level)))
+    return var, cvar
+
+def max_drawdown(returns):
+    """
+    Largest peak-to-trough fall of each row's compounded return path, as a positive fraction.
+    """
+    returns = np.atleast_2d(returns)
+    wealth = np.cumprod(1.0 + np.nan_to_num(returns), axis=1)
+    wealth = np.concatenate([np.ones((wealth.shape[0], 1)), wealth], axis=1)
+    peaks = np.maximum.accumulate(wealth, axis=1)
+    return (1.0 - wealth / peaks).max(axis=1)
+
+def _pairs(corr, symbols, largest=True, limit=TOP_PAIRS):
+    upper = np.triu_indices(len(symbols), k=1)
+    values = corr[upper]
+    valid = np.flatnonzero(~np.isnan(values))
+    if not len(valid):
+        return []
+    order = valid[np.argsort(values[valid])]
+    picked = order[::-1][:limit] if largest else order[:limit]
+    return [{"a": symbols[upper[0][i]], "b": symbols[upper[1][i]], "correlation": round(float(values[i]), 4)} for i in picked]
+
+def _level_key(level):
+    return f"{level * 100:g}"
+
+def compute_risk(histories, weights, benchmark=None, lookback=RISK_LOOKBACK_DAYS, levels=CONFIDENCE_LEVELS,
+                 include_matrix=True):
+    """
+    Risk statistics for a portfolio of `histories` (list of `PriceHistory`) held with
+    `weights` (same order, normalized here). `benchmark` is the index history for beta.
+    """
+    symbols = [history.symbol for history in histories]
+    weights = np.asarray(weights, dtype=float)
+    weights = weights / weights.sum()
+
+    all_histories = list(histories) + ([benchmark] if benchmark is not None else [])
+    dates, cols = align(all_histories, fields=("adj_close",))
+    returns = simple_returns(cols["adj_close"])[:, -lookback:]
+    dates = dates[-returns.shape[1]:]
+    assets, market = returns[:len(symbols)], (returns[len(symbols)] if benchmark is not None else None)
+
+    cov, corr, _ = covariance(assets)
+    mean = np.nanmean(assets, axis=1)
+
+    # Portfolio path: holdings not yet listed on a day contribute nothing that day
+    portfolio = np.nan_to_num(assets).T @ weights
+    portfolio_var = float(weights @ np.nan_to_num(cov) @ weights)
+    portfolio_std = np.sqrt(max(portfolio_var, 0.0))
+    # Each holding's share of portfolio volatility (sums to 1)
+    contribution = weights * (np.nan_to_num(cov) @ weights) / portfolio_var if portfolio_var > 0 else np.full(len(symbols), np.nan)
+
+    hist_var, hist_cvar = historical_var(portfolio, levels)
+    param_var, param_cvar = parametric_var(float(portfolio.mean()), portfolio_std, levels)
+    drawdowns = max_drawdown(np.vstack([assets, portfolio]))
+    volatility = np.sqrt(np.diag(cov) * TRADING_DAYS)
+
+    if market is not None:
+        betas = beta(np.vstack([assets, portfolio]), market, window=returns.shape[1])
+    else:
+        betas = np.full(len(symbols) + 1, np.nan)
+
+    result = {
+        "start": str(dates[0]) if len(dates) else None,
+        "end": str(dates[-1]) if len(dates) else None,
+        "days": int(returns.shape[1]),
+        "portfolio": {
+            "mean_daily_return": float(portfolio.mean()),
+            "volatility_annual": float(portfolio_std * np.sqrt(TRADING_DAYS)),
+            "historical_var": {_level_key(level): value for level, value in hist_var.items()},
+            "historical_cvar": {_level_key(level): value for level, value in hist_cvar.items()},
+            "parametric_var": {_level_key(level): value for level, value in param_var.items()},
+            "parametric_cvar": {_level_key(level): value for level, value in param_cvar.items()},
+            "max_drawdown": float(drawdowns[-1]),
+            "beta": float(betas[-1])
+        },
+        "holdings": [
+            {
+                "symbol": symbol,
+                "weight": float(weights[i]),
+                "mean_daily_return": float(mean[i]),
+                "volatility_annual": float(volatility[i]),
+                "max_drawdown": float(drawdowns[i]),
+                "beta": float(betas[i]),
+                "risk_contribution": float(contribution[i])
+            }
+            for i, symbol in enumerate(symbols)
+        ],
+        "most_correlated": _pairs(corr, symbols, largest=True),
+        "least_correlated": _pairs(corr, symbols, largest=False)
+    }
+    if include_matrix:
+        result["symbols"] = symbols
+        result["correlation"] = np.round(corr, 4)
+    return result
+
+def portfolio_risk(tickers, weights=None, lookback=RISK_LOOKBACK_DAYS, levels=CONFIDENCE_LEVELS, include_matrix=True):
+    """
+    Resolves `tickers` like `get_stock_data` does and computes `compute_risk` over their
+    cached/stored histories. Weights default to equal; repeated tickers have their weights
+    summed. Tickers without history are left out and listed under "excluded".
+    """
+    if weights is not None and len(weights) != len(tickers):
+        raise ValueError(f"Got {len(weights)} weights for {len(tickers)} tickers")
+    weights = [1.0] * len(tickers) if weights is None else [float(weight) for weight in weights]
+
+    # Trading days -> calendar days
+    resolved, histories = get_histories(list(tickers) + [BENCHMARK], min_days=int(lookback * 365 / TRADING_DAYS) + 7)
+
+    held = {}
+    excluded = {}
+    for ticker, weight in zip(tickers, weights):
+        if not ticker or not ticker.strip():
+            continue
+        symbol = resolved[ticker]
+        if histories[symbol].empty:
+            excluded[ticker] = f"No historical data found for {symbol}. Symbol might be invalid or delisted."
+            continue
+        held[symbol] = held.get(symbol, 0.0) + weight
+
+    if not held:
+        raise ValueError("None of the tickers has price history")
+    total = sum(held.values())
+    if total <= 0:
+        raise ValueError("Weights must sum to a positive number")
+
+    benchmark = histories.get(BENCHMARK)
+    if benchmark is not None and benchmark.empty:
+        benchmark = None
+
+    symbols = list(held)
+    result = compute_risk([histories[symbol] for symbol in symbols], [held[symbol] for symbol in symbols],
+                          benchmark, lookback, levels, include_matrix)
+    result["excluded"] = excluded
+    return result
@@ -0,0 +1,337 @@
+"""
+Universe screener.
+
+A universe (NIFTY 50, NIFTY 500 or any configured symbol list) is turned into one snapshot
+table: a dict of column arrays with one row per symbol, holding the quote fields
+`get_stock_data` reports, derived fields (distance from the 52-week high, volume vs its
+20-day average, trailing returns) and the technical indicators. Prices come from the cached
+histories (one bulk download for whatever is missing) and fundamentals from the `.info`
+cache only, so building the table makes no per-symbol calls. The table itself is cached,
+and a screen is then a handful of whole-column comparisons, a mask and an argsort.
+"""
+import csv
+import io
+import os
+import re
+import sys
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+from utils import telemetry
+from utils.cache import TTLCache
+from utils.prefetch import PREFETCH_REQUESTS_PER_MINUTE, WATCHLISTS
+from utils.stock_data import CACHE_DIR, get_histories, history_cache, info_cache, prefetch, resolve_ticker
+from utils.symbol_master import get_symbol_master
+from utils.technicals import BENCHMARK, adjust, compute_snapshot, stack
+
+# Symbol lists kept as <NAME>.csv (with a "Symbol" column) in this directory are universes too
+UNIVERSE_DIR = os.getenv("SCREENER_UNIVERSE_DIR", os.path.join(CACHE_DIR, "universes"))
+# Universes downloaded into UNIVERSE_DIR on first use (NSE index constituent files)
+UNIVERSE_SOURCES = {
+    "NIFTY500": os.getenv("NIFTY500_LIST_URL", "https://archives.nseindia.com/content/indices/ind_nifty500list.csv")
+}
+SCREENER_DEFAULT_UNIVERSE = os.getenv("SCREENER_DEFAULT_UNIVERSE", "NIFTY50")
+# Largest number of rows a screen returns
+SCREENER_MAX_RESULTS = 500
+
+# Numeric fields of the snapshot table, with a short description for clients
+FIELDS = {
+    "current_price": "Last close",
+    "previous_close": "Close before the last one",
+    "change_pct": "Last day's change, %",
+    "52_week_high": "Highest high over the last year",
+    "52_week_low": "Lowest low over the last year",
+    "pct_from_52w_high": "% below (negative) the 52-week high",
+    "pct_from_52w_low": "% above the 52-week low",
+    "volume": "Last day's volume",
+    "avg_volume_20d": "Average volume over the 20 days before the last one",
+    "volume_ratio": "Last day's volume / avg_volume_20d",
+    "return_1m": "Return over 21 trading days, %",
+    "return_3m": "Return over 63 trading days, %",
+    "return_1y": "Return over 252 trading days, %",
+    "market_cap": "Market capitalization (cached fundamentals)",
+    "pe_ratio": "Trailing P/E (cached fundamentals)",
+    "dividend_yield": "Dividend yield (cached fundamentals)",
+    "sma_20": "20-day SMA",
+    "sma_50": "50-day SMA",
+    "sma_200": "200-day SMA",
+    "ema_20": "20-day EMA",
+    "rsi_14": "14-day RSI",
+    "macd": "MACD line",
+    "macd_signal": "MACD signal line",
+    "macd_hist": "MACD histogram",
+    "bb_upper": "Upper Bollinger band",
+    "bb_lower": "Lower Bollinger band",
+    "atr_14": "14-day ATR",
+    "volatility_20d": "20-day realized volatility (annualized)",
+    "beta": "Beta vs NIFTY 50 (one year of daily returns)"
+}
+# Always returned with each match, besides the fields used to filter and sort
+DISPLAY_FIELDS = ("current_price", "change_pct", "market_cap", "pe_ratio", "pct_from_52w_high", "volume_ratio")
+
+OPERATORS = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "==": np.equal,
+    "!=": np.not_equal
+}
+_FILTER = re.compile(r"^\s*(\w+)\s*(<=|>=|==|!=|<|>)\s*(\S+)\s*$")
+
+# Snapshot tables per universe; rebuilt in the background once the quotes they hold are stale
+snapshot_cache = TTLCache(
+    "screener",
+    ttl=history_cache.ttl,
+    stale_ttl=float(os.getenv("SCREENER_STALE_TTL", "3600")),
+    max_entries=16
+)
+
+_universes = {}
+_universes_lock = threading.Lock()
+# Universes whose missing fundamentals are being fetched in the background
+_warming = set()
+
+def _download_universe(name, source, path):
+    request = urllib.request.Request(source, headers={"User-Agent": "Mozilla/5.0"})
+    with urllib.request.urlopen(request, timeout=15) as response:
+        text = response.read().decode("utf-8-sig")
+    if not _parse_symbols(text):
+        raise ValueError(f"No symbols found in {source}")
+    os.makedirs(UNIVERSE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def _parse_symbols(text):
+    reader = csv.DictReader(io.StringIO(text))
+    reader.fieldnames = [field.strip().upper() for field in reader.fieldnames or []]
+    return [row["SYMBOL"].strip() for row in reader if (row.get("SYMBOL") or "").strip()]
+
+def available_universes():
+    """
+    Names accepted by `load_universe`.
+    """
+    names = set(WATCHLISTS) | set(UNIVERSE_SOURCES)
+    if os.path.isdir(UNIVERSE_DIR):
+        names |= {name[:-4].upper() for name in os.listdir(UNIVERSE_DIR) if name.lower().endswith(".csv")}
+    return sorted(names)
+
+def load_universe(name):
+    """
+    Resolved symbols of a universe: a built-in watchlist (NIFTY50), or <NAME>.csv under
+    UNIVERSE_DIR, downloaded first for the names in UNIVERSE_SOURCES.
+    """
+    name = name.strip().upper()
+    with _universes_lock:
+        if name in _universes:
+            return _universes[name]
+
+        if name in WATCHLISTS:
+            tickers = list(WATCHLISTS[name])
+        else:
+            path = os.path.join(UNIVERSE_DIR, f"{name}.csv")
+            if not os.path.exists(path):
+                if name not in UNIVERSE_SOURCES:
+                    raise ValueError(f"Unknown universe '{name}', expected one of {tuple(available_universes())}")
+                try:
+                    _download_universe(name, UNIVERSE_SOURCES[name], path)
+                except Exception as e:
+                    raise ValueError(f"Universe {name} is not available: {e}") from e
+            with open(path, encoding="utf-8-sig") as f:
+                tickers = _parse_symbols(f.read())
+
+        _universes[name] = list(dict.fromkeys(resolve_ticker(ticker) for ticker in tickers))
+        return _universes[name]
+
+def _trailing_return(adj_close, days):
+    if adj_close.shape[1] <= days:
+        return np.full(adj_close.shape[0], np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (adj_close[:, -1] / adj_close[:, -1 - days] - 1.0) * 100.0
+
+def build_table(histories, benchmark=None, infos=None):
+    """
+    Snapshot table for a list of non-empty `PriceHistory`: {"symbol": [...], field: array}.
+    `infos` maps symbol -> cached `.info` dict (missing fundamentals are NaN).
+    Every field comes from the symbol's own last bars, as quoted; the 52-week range and the
+    trailing returns are split/dividend adjusted.
+    """
+    symbols = [history.symbol for history in histories]
+    cols = stack(histories, fields=("high", "low", "close", "adj_close", "volume"))
+    adjusted = adjust(cols)
+    close = cols["close"]
+    volume = cols["volume"]
+    n = len(symbols)
+
+    table = {"symbol": symbols}
+    table["current_price"] = close[:, -1]
+    table["previous_close"] = close[:, -2] if close.shape[1] > 1 else np.full(n, np.nan)
+
+    # 52-week range over each symbol's bars within a year of its latest one (fmax/fmin skip NaN)
+    year = np.zeros(close.shape, dtype=bool)
+    for row, history in enumerate(histories):
+        year[row, close.shape[1] - len(history.last_days(365)):] = True
+    table["52_week_high"] = np.fmax.reduce(np.where(year, adjusted["high"], np.nan), axis=1)
+    table["52_week_low"] = np.fmin.reduce(np.where(year, adjusted["low"], np.nan), axis=1)
+
+    # Last day's volume against the 20 sessions before it
+    previous = volume[:, -21:-1]
+    counts = (~np.isnan(previous)).sum(axis=1)
+    table["volume"] = volume[:, -1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        table["avg_volume_20d"] = np.where(counts > 0, np.nansum(previous, axis=1) / counts, np.nan)
+        table["volume_ratio"] = table["volume"] / table["avg_volume_20d"]
+        table["change_pct"] = (table["current_price"] / table["previous_close"] - 1.0) * 100.0
+        table["pct_from_52w_high"] = (table["current_price"] / table["52_week_high"] - 1.0) * 100.0
+        table["pct_from_52w_low"] = (table["current_price"] / table["52_week_low"] - 1.0) * 100.0
+    table["return_1m"] = _trailing_return(cols["adj_close"], 21)
+    table["return_3m"] = _trailing_return(cols["adj_close"], 63)
+    table["return_1y"] = _trailing_return(cols["adj_close"], 252)
+
+    infos = infos or {}
+    for field, key in (("market_cap", "marketCap"), ("pe_ratio", "trailingPE"), ("dividend_yield", "dividendYield")):
+        values = [infos.get(symbol, {}).get(key) for symbol in symbols]
+        table[field] = np.array([value if isinstance(value, (int, float)) else np.nan for value in values], dtype=float)
+
+    snapshots = compute_snapshot(histories, benchmark)
+    for field in FIELDS:
+        if field not in table:
+            table[field] = np.array([snapshot[field] for snapshot in snapshots], dtype=float)
+
+    table["as_of"] = str(max(history["date"][-1] for history in histories)) if histories else None
+    return table
+
+def _warm_fundamentals(universe, symbols):
+    """
+    Fetches the `.info` blobs missing from the cache at the prefetcher's request rate, then
+    drops the universe's table so the next screen sees the fundamentals.
+    """
+    try:
+        prefetch(symbols, throttle=lambda: time.sleep(60.0 / PREFETCH_REQUESTS_PER_MINUTE))
+        snapshot_cache.invalidate(universe)
+    except Exception as e:
+        telemetry.increment("prefetch_errors_total", stage="screener")
+        print(f"Screener fundamentals warm-up failed: {e}", file=sys.stderr)
+    finally:
+        with _universes_lock:
+            _warming.discard(universe)
+
+def snapshot_table(universe):
+    """
+    The cached snapshot table of a universe (built on a miss; refreshed in the background
+    once stale). Returns (table, symbols without history).
+    """
+    universe = universe.strip().upper()
+    symbols = load_universe(universe)
+
+    def load():
+        _, histories = get_histories(symbols + [BENCHMARK])
+        usable = [histories[symbol] for symbol in symbols if not histories[symbol].empty]
+        if not usable:
+            raise ValueError(f"No price history for any symbol in {universe}")
+        benchmark = histories[BENCHMARK] if not histories[BENCHMARK].empty else None
+        # Fundamentals only from the cache: no per-symbol `.info` requests here
+        infos = {history.symbol: info_cache.peek(history.symbol) or {} for history in usable}
+        table = build_table(usable, benchmark, infos)
+        table["missing"] = [symbol for symbol in symbols if histories[symbol].empty]
+
+        cold = [symbol for symbol, info in infos.items() if not info]
+        with _universes_lock:
+            start = cold and universe not in _warming
+            if start:
+                _warming.add(universe)
+        if start:
+            threading.Thread(target=_warm_fundamentals, args=(universe, cold), name=f"screener-warm-{universe}", daemon=True).start()
+        return table
+
+    table = snapshot_cache.get_or_load(universe, load)
+    return table, table["missing"]
+
+def parse_filter(spec):
+    """
+    "pe_ratio < 20" or {"field": "pe_ratio", "op": "<", "value": 20} -> (field, op, value).
+    `value` is a number or the name of another field ("current_price > sma_200").
+    """
+    if isinstance(spec, str):
+        match = _FILTER.match(spec)
+        if not match:
+            raise ValueError(f"Cannot parse filter '{spec}', expected '<field> <op> <number or field>'")
+        field, op, value = match.groups()
+    else:
+        field, op, value = spec.get("field"), spec.get("op"), spec.get("value")
+
+    if field not in FIELDS:
+        raise ValueError(f"Unknown field '{field}', expected one of {tuple(FIELDS)}")
+    if op not in OPERATORS:
+        raise ValueError(f"Unknown operator '{op}', expected one of {tuple(OPERATORS)}")
+    if isinstance(value, str) and value in FIELDS:
+        return field, op, value
+    try:
+        return field, op, float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Filter value '{value}' is neither a number nor a field name") from None
+
+def apply_filters(table, filters):
+    """
+    Boolean mask of the rows passing every (field, op, value) filter. Rows where either side
+    is missing (NaN) fail the filter.
+    """
+    mask = np.ones(len(table["symbol"]), dtype=bool)
+    for field, op, value in filters:
+        left = table[field]
+        right = table[value] if isinstance(value, str) else value
+        with np.errstate(invalid="ignore"):
+            mask &= OPERATORS[op](left, right) & ~np.isnan(left) & ~np.isnan(right)
+    return mask
+
+def rank(table, mask, sort_by, descending=True, limit=50):
+    """
+    Row indices of the matches ordered by `sort_by` (missing values last), at most `limit`.
+    """
+    rows = np.flatnonzero(mask)
+    values = table[sort_by][rows]
+    keys = np.where(np.isnan(values), np.inf, -values if descending else values)
+    return rows[np.argsort(keys, kind="stable")][:limit]
+
+def screen(filters, universe=SCREENER_DEFAULT_UNIVERSE, sort_by=None, descending=True, limit=50):
+    """
+    Runs declarative `filters` (see `parse_filter`) over a universe's snapshot table and
+    returns the matches ranked by `sort_by` (default: the first filter's field, else market cap).
+    """
+    parsed = [parse_filter(spec) for spec in filters or []]
+    sort_by = sort_by or (parsed[0][0] if parsed else "market_cap")
+    if sort_by not in FIELDS:
+        raise ValueError(f"Unknown sort field '{sort_by}', expected one of {tuple(FIELDS)}")
+    limit = max(1, min(limit, SCREENER_MAX_RESULTS))
+
+    table, missing = snapshot_table(universe)
+    mask = apply_filters(table, parsed)
+    rows = rank(table, mask, sort_by, descending, limit)
+
+    fields = list(dict.fromkeys(list(DISPLAY_FIELDS) + [field for field, _, _ in parsed]
+                                + [value for _, _, value in parsed if isinstance(value, str)] + [sort_by]))
+    master = get_symbol_master()
+    results = []
+    for row in rows:
+        symbol = table["symbol"][row]
+        result = {"symbol": symbol, "name": master.name_of(symbol)}
+        result.update({field: float(table[field][row]) for field in fields})
+        results.append(result)
+
+    return {
+        "universe": universe.strip().upper(),
+        "as_of": table["as_of"],
+        "filters": [{"field": field, "op": op, "value": value} for field, op, value in parsed],
+        "sort_by": sort_by,
+        "descending": descending,
+        "screened": len(table["symbol"]),
+        "matched": int(mask.sum()),
+        "fundamentals_coverage": float((~np.isnan(table["market_cap"])).mean()),
+        "results": results,
+        "missing": missing
+    }
@@ -0,0 +1,238 @@
+"""
+Rate-limit-aware web search client used by `ai_analysis`.
+
+DuckDuckGo throttles aggressively. Rather than fail fast, callers here queue on a token
+bucket, retry with exponential backoff and jitter (a rate-limit response pauses every
+caller, not just the one that hit it), and share a TTL cache and in-flight requests per
+query. When a search does fail, the most recent stale result for that query is used if
+there is one. Only after that does the caller get `SearchUnavailable`.
+"""
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+from utils import telemetry
+from utils.cache import TTLCache
+
+SEARCH_RATE_PER_MINUTE = float(os.getenv("SEARCH_RATE_PER_MINUTE", "20"))
+SEARCH_BURST = int(os.getenv("SEARCH_BURST", "5"))
+# Longest a caller waits for a token before giving up
+SEARCH_MAX_WAIT = float(os.getenv("SEARCH_MAX_WAIT", "30"))
+SEARCH_MAX_RETRIES = int(os.getenv("SEARCH_MAX_RETRIES", "3"))
+SEARCH_BACKOFF_BASE = float(os.getenv("SEARCH_BACKOFF_BASE", "1.0"))
+SEARCH_BACKOFF_MAX = float(os.getenv("SEARCH_BACKOFF_MAX", "20"))
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "4"))
+# Queries merged into one request in batch mode
+SEARCH_MERGE_SIZE = int(os.getenv("SEARCH_MERGE_SIZE", "3"))
+
+NO_RESULTS = "No good DuckDuckGo Search Result was found"
+
+class SearchUnavailable(RuntimeError):
+    """
+    The search failed (rate limited or erroring) and no cached result was available.
+    """
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, holding at most `capacity`.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """
+        Takes one token, waiting up to `timeout` seconds. Returns False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate if self.rate > 0 else 1.0
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def drain(self):
+        with self._lock:
+            self._tokens = 0.0
+            self._updated = time.monotonic()
+
+def _is_rate_limit(error):
+    text = f"{type(error).__name__} {error}".lower()
+    return "ratelimit" in text or "rate limit" in text or "429" in text
+
+class SearchClient:
+    """
+    `backend_factory()` builds the backend lazily on first use; the backend needs a
+    `results(query, max_results)` method returning [{"snippet", "title", "link"}, ...].
+    """
+
+    def __init__(self, backend_factory, rate_per_minute=SEARCH_RATE_PER_MINUTE, burst=SEARCH_BURST,
+                 max_retries=SEARCH_MAX_RETRIES, max_wait=SEARCH_MAX_WAIT, cache=None):
+        self.backend_factory = backend_factory
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst)
+        self.max_retries = max_retries
+        self.max_wait = max_wait
+        self.cache = cache or TTLCache(
+            "search",
+            ttl=float(os.getenv("SEARCH_CACHE_TTL", "1800")),
+            stale_ttl=float(os.getenv("SEARCH_CACHE_STALE_TTL", "86400")),
+            max_entries=int(os.getenv("SEARCH_CACHE_ENTRIES", "2000")),
+            persist_dir=os.getenv("STOCK_CACHE_DIR", ".cache")
+        )
+
+        self._backend = None
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._cooldown_until = 0.0
+
+    def _get_backend(self):
+        with self._lock:
+            if self._backend is None:
+                self._backend = self.backend_factory()
+            return self._backend
+
+    def _request(self, query, max_results):
+        """
+        One rate-limited request with retries. Raises SearchUnavailable when exhausted.
+        """
+        deadline = time.monotonic() + self.max_wait
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            # A rate-limit response pauses everyone until the cooldown ends
+            pause = self._cooldown_until - time.monotonic()
+            if pause > 0:
+                if time.monotonic() + pause > deadline:
+                    break
+                time.sleep(pause)
+            if not self.bucket.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                telemetry.increment("search_queue_timeouts_total")
+                break
+
+            try:
+                with telemetry.span("search.duckduckgo"):
+                    return self._get_backend().results(query, max_results=max_results)
+            except Exception as e:
+                last_error = e
+                delay = min(SEARCH_BACKOFF_MAX, SEARCH_BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+                if _is_rate_limit(e):
+                    telemetry.increment("search_rate_limited_total")
+                    self.bucket.drain()
+                    with self._lock:
+                        self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+                elif attempt < self.max_retries:
+                    time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+                if attempt < self.max_retries:
+                    telemetry.increment("search_retries_total")
+        raise SearchUnavailable(f"Search failed for {query!r}: {last_error or 'rate limit queue timed out'}")
+
+    @staticmethod
+    def _join(results):
+        # Same text DuckDuckGoSearchRun would produce
+        return " ".join(result["snippet"] for result in results) if results else NO_RESULTS
+
+    def _cached(self, query):
+        age = self.cache.age(query)
+        if age is not None and age < self.cache.ttl:
+            return self.cache.get(query)
+        return None
+
+    def search(self, query, max_results=SEARCH_MAX_RESULTS):
+        """
+        Snippets for `query` as one string. Identical concurrent queries share one request.
+        Falls back to a stale cached result, else raises SearchUnavailable.
+        """
+        cached = self._cached(query)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            future = self._inflight.get(query)
+            owner = future is None
+            if owner:
+                future = self._inflight[query] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            text = self._join(self._request(query, max_results))
+            self.cache.set(query, text)
+            future.set_result(text)
+        except SearchUnavailable as e:
+            stale = self.cache.get(query)
+            if stale is None:
+                future.set_exception(e)
+                raise
+            telemetry.increment("search_stale_served_total")
+            future.set_result(stale)
+            text = stale
+        except BaseException as e:
+            # Anything else must still release the callers waiting on this query
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(query, None)
+        return text
+
+    def search_batch(self, items, merge_size=SEARCH_MERGE_SIZE, max_results=SEARCH_MAX_RESULTS):
+        """
+        Batch mode. `items` maps key -> (query, match_terms). Cached queries are served
+        directly; the rest are merged `merge_size` at a time into one OR query, and each
+        returned snippet is credited to every item whose match terms it mentions (results
+        are then cached under each item's own query). Items that get no snippets fall back
+        to their own query. Returns {key: text}; keys whose search failed are omitted.
+        """
+        results = {}
+        pending = []
+        for key, (query, terms) in items.items():
+            cached = self._cached(query)
+            if cached is not None:
+                results[key] = cached
+            else:
+                pending.append((key, query, [term.lower() for term in terms if term]))
+
+        leftovers = []
+        for start in range(0, len(pending), max(1, merge_size)):
+            group = pending[start:start + merge_size]
+            if len(group) == 1:
+                leftovers.extend(group)
+                continue
+
+            merged = " OR ".join(f'"{terms[0]}"' if terms else query for _, query, terms in group) + " latest news company profile"
+            try:
+                hits = self._request(merged, max_results * len(group))
+            except SearchUnavailable:
+                leftovers.extend(group)
+                continue
+
+            for key, query, terms in group:
+                mine = [hit for hit in hits
+                        if any(re.search(rf"\b{re.escape(term)}\b", f"{hit.get('title', '')} {hit.get('snippet', '')}".lower())
+                               for term in terms)]
+                if mine:
+                    text = self._join(mine[:max_results])
+                    self.cache.set(query, text)
+                    results[key] = text
+                else:
+                    leftovers.append((key, query, terms))
+
+        for key, query, _ in leftovers:
+            try:
+                results[key] = self.search(query, max_results)
+            except SearchUnavailable:
+                pass
+        return results
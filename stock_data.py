@@ -1,66 +1,259 @@
 import yfinance as yf
-import pandas as pd
+import numpy as np
+import os
+from concurrent.futures import ThreadPoolExecutor
+from utils import history_store, telemetry
+from utils.cache import TTLCache
+from utils.symbol_master import get_symbol_master
 
-def get_stock_data(ticker):
-    # Smart Ticker Resolution (NSE Only)
+# Common aliases for Indices
+ALIAS_MAP = {
+    "NIFTY 50": "^NSEI",
+    "NIFTY": "^NSEI",
+    "NIFTY50": "^NSEI",
+    "BANKNIFTY": "^NSEBANK",
+    "BANK NIFTY": "^NSEBANK",
+    "SENSEX": "^BSESN",
+    "BSE SENSEX": "^BSESN"
+}
+
+# Upper bound on concurrent `.info` lookups in batch mode
+BATCH_INFO_WORKERS = 8
+
+# Caches keyed by resolved symbol. Quote fields come from the price history and go stale
+# quickly; fundamentals (`.info`) change rarely. Both serve stale entries while refreshing
+# in the background. Histories live in the on-disk `history_store` (so that cache only
+# decides how often the store is topped up); `.info` blobs are persisted under STOCK_CACHE_DIR.
+CACHE_DIR = os.getenv("STOCK_CACHE_DIR", ".cache")
+
+# Calendar days covered by the "52 week" fields
+YEAR_DAYS = 365
+
+history_cache = TTLCache(
+    "history",
+    ttl=float(os.getenv("STOCK_QUOTE_TTL", "60")),
+    stale_ttl=float(os.getenv("STOCK_QUOTE_STALE_TTL", "3600")),
+    max_entries=int(os.getenv("STOCK_HISTORY_CACHE_ENTRIES", "2000")),
+    max_bytes=int(os.getenv("STOCK_HISTORY_CACHE_MB", "256")) * 1024 * 1024
+)
+
+info_cache = TTLCache(
+    "info",
+    ttl=float(os.getenv("STOCK_FUNDAMENTALS_TTL", "21600")),
+    stale_ttl=float(os.getenv("STOCK_FUNDAMENTALS_STALE_TTL", "86400")),
+    max_entries=int(os.getenv("STOCK_INFO_CACHE_ENTRIES", "5000")),
+    max_bytes=int(os.getenv("STOCK_INFO_CACHE_MB", "64")) * 1024 * 1024,
+    persist_dir=CACHE_DIR
+)
+
+def resolve_ticker(ticker):
+    """
+    Smart Ticker Resolution (NSE Only): maps aliases to indices, looks symbols and company
+    names up in the local symbol master, and otherwise forces `.NS` on stocks.
+    """
     ticker = ticker.strip().upper()
-    
+
     # 1. Handle common aliases for Indices
-    alias_map = {
-        "NIFTY 50": "^NSEI",
-        "NIFTY": "^NSEI",
-        "NIFTY50": "^NSEI",
-        "BANKNIFTY": "^NSEBANK",
-        "BANK NIFTY": "^NSEBANK",
-        "SENSEX": "^BSESN", 
-        "BSE SENSEX": "^BSESN"
-    }
-    
-    if ticker in alias_map:
-        ticker = alias_map[ticker]
-    
-    # 2. Enforce NSE for stocks (ignore BSE suffix if present)
-    elif not ticker.startswith("^"):
+    if ticker in ALIAS_MAP:
+        return ALIAS_MAP[ticker]
+
+    # 2. Exact symbol or company name ("Reliance Industries") from the symbol master
+    symbol = get_symbol_master().lookup(ticker)
+    if symbol:
+        return symbol
+
+    # 3. Enforce NSE for stocks (ignore BSE suffix if present)
+    if not ticker.startswith("^"):
         # Remove any existing suffix (like .BO or .NS) to ensure we always apply .NS cleanly
         base_ticker = ticker.split('.')[0]
         ticker = f"{base_ticker}.NS"
 
+    return ticker
+
+def is_listed(symbol):
+    """
+    False only when the symbol master has the NSE equity list and `symbol` is not on it.
+    Indices are never rejected.
+    """
+    master = get_symbol_master()
+    return symbol.startswith("^") or not master.has_equities or master.is_known(symbol)
+
+def unlisted_error(symbol):
+    suggestions = [match["symbol"] for match in get_symbol_master().search(symbol, limit=3)]
+    hint = f" Did you mean {', '.join(suggestions)}?" if suggestions else ""
+    return f"Unknown symbol {symbol}: not in the NSE symbol list.{hint}"
+
+def _download_info(symbol):
+    with telemetry.span("yfinance.info"):
+        return yf.Ticker(symbol).info or {}
+
+def _fetch_history(symbol):
+    # Incremental: only bars missing from the local store are downloaded
+    return history_cache.get_or_load(symbol, lambda: history_store.sync(symbol))
+
+def _fetch_info(symbol):
+    # Safe retrieval of info with fallback (failures are not cached)
+    try:
+        return info_cache.get_or_load(symbol, lambda: _download_info(symbol))
+    except Exception:
+        return {}
+
+def _price(value):
+    # Stored prices are float32; quote them at paise precision
+    return round(float(value), 2)
+
+def _build_metrics(ticker, history, info):
+    close = history['close']
+    year = history.last_days(YEAR_DAYS)
+    current_price = _price(close[-1])
+
+    # Basic Technicals / Stats (Fallback to None if info fails)
+    return {
+        "current_price": current_price,
+        "previous_close": info.get("previousClose", _price(close[-2]) if len(history) > 1 else None),
+        "open": info.get("open", _price(history['open'][-1])),
+        "day_high": info.get("dayHigh", _price(history['high'][-1])),
+        "day_low": info.get("dayLow", _price(history['low'][-1])),
+        "52_week_high": info.get("fiftyTwoWeekHigh", _price(year['high'].max())),
+        "52_week_low": info.get("fiftyTwoWeekLow", _price(year['low'].min())),
+        "volume": info.get("volume", int(history['volume'][-1])),
+        "market_cap": info.get("marketCap", None),
+        "pe_ratio": info.get("trailingPE", None),
+        "dividend_yield": info.get("dividendYield", None),
+        "beta": info.get("beta", None),
+        "currency": info.get("currency", "INR" if ticker.endswith(".NS") else "USD"),
+        "company_name": info.get("longName", ticker.replace(".NS", ""))
+    }
+
+def get_stock_data(ticker, include_history=False):
+    """
+    Fetches a metrics dictionary for a ticker (or {"error": ...}).
+    With include_history=True the last year of OHLCV bars is attached as a DataFrame under "history".
+    """
+    ticker = resolve_ticker(ticker)
+
+    # Reject typos before spending a history download on them
+    if not is_listed(ticker):
+        return {"error": unlisted_error(ticker)}
+
     try:
-        stock = yf.Ticker(ticker)
-        
         # Get historical data for the last year failure check
-        history = stock.history(period="1y")
-        
+        history = _fetch_history(ticker)
+
         if history.empty:
             return {"error": f"No historical data found for {ticker} (period=1y). Symbol might be invalid or delisted."}
-            
-        current_price = history['Close'].iloc[-1]
-        
-        # Safe retrieval of info with fallback
-        try:
-            info = stock.info
-        except Exception:
-            info = {}
-        
-        # Basic Technicals / Stats (Fallback to None if info fails)
-        data = {
-            "current_price": current_price,
-            "previous_close": info.get("previousClose", history['Close'].iloc[-2] if len(history) > 1 else None),
-            # ... (keep existing fields) ...
-            "open": info.get("open", history['Open'].iloc[-1] if not history.empty else None),
-            "day_high": info.get("dayHigh", history['High'].iloc[-1] if not history.empty else None),
-            "day_low": info.get("dayLow", history['Low'].iloc[-1] if not history.empty else None),
-            "52_week_high": info.get("fiftyTwoWeekHigh", history['High'].max() if not history.empty else None),
-            "52_week_low": info.get("fiftyTwoWeekLow", history['Low'].min() if not history.empty else None),
-            "volume": info.get("volume", history['Volume'].iloc[-1] if not history.empty else None),
-            "market_cap": info.get("marketCap", None),
-            "pe_ratio": info.get("trailingPE", None),
-            "dividend_yield": info.get("dividendYield", None),
-            "currency": info.get("currency", "INR" if ticker.endswith(".NS") else "USD"),
-            "company_name": info.get("longName", ticker.replace(".NS", ""))
-        }
-        
+
+        data = _build_metrics(ticker, history, _fetch_info(ticker))
+
+        if include_history:
+            data["history"] = history.last_days(YEAR_DAYS).to_frame()
+
         return data
 
     except Exception as e:
         return {"error": f"Exception during fetch for {ticker}: {str(e)}"}
+
+def get_histories(tickers, min_days=None):
+    """
+    Resolves tickers and returns ({input_ticker: symbol}, {symbol: PriceHistory}).
+    Cached histories are reused; the rest are topped up in the local store with one bulk
+    `yf.download` call. With `min_days`, histories not reaching that many calendar days back
+    are backfilled too. Raises if that bulk download fails.
+    """
+    # Resolve (and de-duplicate) while keeping the caller's spelling as the result key
+    resolved = {}
+    for ticker in tickers:
+        if ticker and ticker.strip() and ticker not in resolved:
+            resolved[ticker] = resolve_ticker(ticker)
+    symbols = list(dict.fromkeys(resolved.values()))
+
+    # Unknown symbols get an empty history without a download
+    no_bars = np.empty(0, dtype=history_store.BAR_DTYPE)
+    histories = {symbol: history_store.PriceHistory(symbol, no_bars) for symbol in symbols if not is_listed(symbol)}
+    for symbol in symbols:
+        if symbol in histories:
+            continue
+        cached = history_cache.get(symbol, loader=lambda s=symbol: history_store.sync(s))
+        if cached is not None and (min_days is None or history_store.covers(cached, min_days)):
+            histories[symbol] = cached
+
+    missing = [symbol for symbol in symbols if symbol not in histories]
+    if missing:
+        synced = history_store.sync_many(missing, min_days or history_store.INITIAL_DAYS)
+        for symbol in missing:
+            histories[symbol] = synced[symbol]
+            history_cache.set(symbol, synced[symbol])
+
+    return resolved, histories
+
+def prefetch(symbols, refresh_at=0.75, throttle=None):
+    """
+    Warms the caches for resolved `symbols`: histories whose cache entry is missing or older
+    than `refresh_at` x TTL are topped up with one bulk download, and so are stale `.info`
+    blobs (one request each). `throttle()`, if given, is called before every upstream request.
+    Returns the number of histories and infos refreshed.
+    """
+    symbols = [symbol for symbol in dict.fromkeys(symbols) if is_listed(symbol)]
+
+    def due(cache, symbol):
+        age = cache.age(symbol)
+        return age is None or age >= cache.ttl * refresh_at
+
+    histories = [symbol for symbol in symbols if due(history_cache, symbol)]
+    if histories:
+        if throttle:
+            throttle()
+        for symbol, history in history_store.sync_many(histories).items():
+            history_cache.set(symbol, history)
+
+    # Indices have no fundamentals worth keeping warm
+    infos = [symbol for symbol in symbols if not symbol.startswith("^") and due(info_cache, symbol)]
+    for symbol in infos:
+        if throttle:
+            throttle()
+        try:
+            info_cache.set(symbol, _download_info(symbol))
+        except Exception:
+            telemetry.increment("prefetch_errors_total", stage="info")
+
+    return len(histories), len(infos)
+
+def get_stock_data_batch(tickers, include_history=False, max_workers=BATCH_INFO_WORKERS):
+    """
+    Batch version of `get_stock_data`.
+    Histories come from `get_histories` (one bulk download for cache misses), and the
+    `.info` lookups are fanned out over a bounded thread pool.
+    Returns {input_ticker: metrics or {"error": ...}} in input order.
+    """
+    try:
+        resolved, histories = get_histories(tickers)
+    except Exception as e:
+        return {ticker: {"error": f"Exception during bulk fetch: {str(e)}"}
+                for ticker in tickers if ticker and ticker.strip()}
+
+    valid = [symbol for symbol, history in histories.items() if not history.empty]
+    infos = {}
+    if valid:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(valid)))) as pool:
+            for symbol, info in zip(valid, pool.map(_fetch_info, valid)):
+                infos[symbol] = info
+
+    results = {}
+    for ticker, symbol in resolved.items():
+        history = histories[symbol]
+        if history.empty:
+            if not is_listed(symbol):
+                results[ticker] = {"error": unlisted_error(symbol)}
+            else:
+                results[ticker] = {"error": f"No historical data found for {symbol} (period=1y). Symbol might be invalid or delisted."}
+            continue
+        try:
+            data = _build_metrics(symbol, history, infos.get(symbol, {}))
+        except Exception as e:
+            results[ticker] = {"error": f"Exception during fetch for {symbol}: {str(e)}"}
+            continue
+        if include_history:
+            data["history"] = history.last_days(YEAR_DAYS).to_frame()
+        results[ticker] = data
+
+    return results
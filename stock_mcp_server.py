@@ -1,32 +1,445 @@
-from mcp.server.fastmcp import FastMCP
-from utils.stock_data import get_stock_data
-from utils.ai_analysis import get_company_details
+from mcp.server.fastmcp import Context, FastMCP
+from utils.stock_data import get_stock_data, get_stock_data_batch, is_listed, resolve_ticker
+from utils.symbol_master import get_symbol_master
+from utils.ai_analysis import invalidate_company_details, stream_company_details
+from utils import telemetry
+from utils.cache import all_stats
+from utils.prefetch import PrefetchScheduler
+from utils.quotes import QuoteHub
+from utils.concurrency import LLM_POOL, MARKET_DATA_POOL, SingleFlight, StreamingSingleFlight, run_in_pool
+from utils.technicals import BENCHMARK, get_technicals as compute_technicals
+from utils.risk import CONFIDENCE_LEVELS, RISK_LOOKBACK_DAYS, portfolio_risk as compute_portfolio_risk
+from utils.backtest import BACKTEST_LOOKBACK_DAYS, backtest as run_backtest
+from utils.screener import SCREENER_DEFAULT_UNIVERSE, parse_filter, screen
+from utils.charts import CHART_DEFAULT_POINTS, CHART_MAX_POINTS, check_range, get_price_history as load_price_history
+from utils.payloads import (
+    ENCODINGS,
+    StockMetricsBatchPayload,
+    StockMetricsPayload,
+    encode_columns,
+    history_columns,
+    make_payload,
+    to_jsonable
+)
 from dotenv import load_dotenv
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from typing import Any
+import argparse
+import anyio
+import json
 import os
+import time
 
 # Load environment variables
 load_dotenv()
 
-# Initialize FastMCP server
-mcp = FastMCP("AI Stock Agent")
+# Initialize FastMCP server (host/port only matter for the network transports)
+mcp = FastMCP(
+    "AI Stock Agent",
+    host=os.getenv("MCP_HOST", "127.0.0.1"),
+    port=int(os.getenv("MCP_PORT", "8000"))
+)
+
+# Per-tool concurrency caps on upstream work. Blocking calls run on separate thread pools
+# for market data and LLM work, and each tool also gets its own limiter so a burst of one
+# kind of request cannot starve the others.
+TOOL_LIMITERS = {
+    "get_stock_metrics": anyio.CapacityLimiter(int(os.getenv("MCP_METRICS_CONCURRENCY", "8"))),
+    "get_stock_metrics_batch": anyio.CapacityLimiter(int(os.getenv("MCP_BATCH_CONCURRENCY", "2"))),
+    "get_technicals": anyio.CapacityLimiter(int(os.getenv("MCP_TECHNICALS_CONCURRENCY", "2"))),
+    "get_price_history": anyio.CapacityLimiter(int(os.getenv("MCP_CHART_CONCURRENCY", "4"))),
+    "analyze_company": anyio.CapacityLimiter(int(os.getenv("MCP_ANALYSIS_CONCURRENCY", "2"))),
+    "get_quote_updates": anyio.CapacityLimiter(int(os.getenv("MCP_QUOTES_CONCURRENCY", "4"))),
+    "portfolio_risk": anyio.CapacityLimiter(int(os.getenv("MCP_RISK_CONCURRENCY", "2"))),
+    "backtest": anyio.CapacityLimiter(int(os.getenv("MCP_BACKTEST_CONCURRENCY", "1"))),
+    "screen_stocks": anyio.CapacityLimiter(int(os.getenv("MCP_SCREENER_CONCURRENCY", "2")))
+}
+
+# Load the symbol index (starting the equity list download if needed) before the first request
+get_symbol_master()
+
+# Largest watchlist accepted by get_stock_metrics_batch in one call
+BATCH_MAX_TICKERS = int(os.getenv("MCP_BATCH_MAX_TICKERS", "200"))
+# Largest basket accepted by portfolio_risk
+RISK_MAX_TICKERS = int(os.getenv("MCP_RISK_MAX_TICKERS", "1000"))
+
+# Identical concurrent requests share one upstream fetch / one LLM generation
+market_data_flight = SingleFlight()
+analysis_flight = StreamingSingleFlight()
+
+# Keeps popular symbols warm; yields to interactive market-data calls. "auto" runs it only
+# for the shared network transports (with stdio every pooled process would prefetch).
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "auto")
+scheduler = PrefetchScheduler(busy=lambda: market_data_flight.stats()["in_flight"] > 0)
+
+# Live quotes: one shared poller for every subscribed symbol (see quotes.py)
+quote_hub = QuoteHub()
+# How often stream_quotes checks the hub for changes, and its longest subscription
+QUOTE_PUSH_CHECK_SECONDS = float(os.getenv("QUOTE_PUSH_CHECK_SECONDS", "0.5"))
+QUOTE_STREAM_MAX_SECONDS = float(os.getenv("QUOTE_STREAM_MAX_SECONDS", "600"))
+
+async def _market_data(tool, key, fn, *args):
+    """
+    Runs `fn(*args)` on the market-data pool under the tool's limiter, coalesced by key.
+    """
+    async def fetch():
+        async with TOOL_LIMITERS[tool]:
+            return await run_in_pool(MARKET_DATA_POOL, fn, *args)
+
+    return await market_data_flight.do((tool, key), fetch)
+
+@mcp.tool(name="resolve_ticker")
+def resolve_ticker_tool(query: str) -> dict[str, Any]:
+    """
+    Resolves a ticker, index alias or company name against the local NSE symbol master,
+    without any network call. Returns a "symbol_resolution" payload: `symbol` is the Yahoo
+    symbol to use, or null when it is not a listed symbol (see `suggestions`).
+    """
+    symbol = resolve_ticker(query)
+    master = get_symbol_master()
+    if is_listed(symbol):
+        return make_payload("symbol_resolution", query=query, symbol=symbol, name=master.name_of(symbol), suggestions=[])
+    return make_payload("symbol_resolution", query=query, symbol=None, name=None, suggestions=master.search(query, limit=5))
+
+@mcp.tool()
+def search_symbols(query: str, limit: int = 10) -> dict[str, Any]:
+    """
+    Autocomplete over NSE symbols and company names: exact, prefix, then fuzzy matches.
+    Returns a "symbol_search" payload with up to `limit` results.
+    """
+    return make_payload("symbol_search", query=query, results=get_symbol_master().search(query, limit=max(1, min(limit, 50))))
 
 @mcp.tool()
-def get_stock_metrics(ticker: str) -> str:
+async def get_stock_metrics(ticker: str, include_history: bool = False, encoding: str = "json") -> StockMetricsPayload:
     """
     Fetches stock metrics for a given ticker.
-    Returns a string representation of the data dictionary.
+    Returns a versioned "stock_metrics" payload; `data` holds the metrics (or an "error" key).
+    With include_history=True the 1y OHLCV history is added as a column block, encoded as
+    plain JSON lists or, with encoding="columnar", as base64 little-endian arrays.
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown encoding '{encoding}', expected one of {ENCODINGS}")
+
+    with telemetry.trace("tool.get_stock_metrics", ticker=ticker):
+        key = (resolve_ticker(ticker), include_history)
+        scheduler.record([key[0]])
+        # Copy: coalesced callers share the same result dict
+        data = dict(await _market_data("get_stock_metrics", key, get_stock_data, ticker, include_history))
+
+        with telemetry.span("encode"):
+            history = data.pop("history", None)
+            payload = make_payload("stock_metrics", ticker=ticker, data=to_jsonable(data))
+            if history is not None:
+                payload["history"] = history_columns(history, encoding)
+        return payload
+
+@mcp.tool()
+async def get_stock_metrics_batch(tickers: list[str]) -> StockMetricsBatchPayload:
     """
-    data = get_stock_data(ticker)
-    
-    # Return the dictionary (or error dictionary) as a string
-    return str(data)
+    Fetches stock metrics for many tickers at once (one bulk history download).
+    Returns a "stock_metrics_batch" payload mapping each input ticker to its metrics
+    or to an {"error": ...} dict.
+    """
+    if len(tickers) > BATCH_MAX_TICKERS:
+        raise ValueError(f"Too many tickers ({len(tickers)}); the limit is {BATCH_MAX_TICKERS}")
+
+    with telemetry.trace("tool.get_stock_metrics_batch", tickers=len(tickers)):
+        scheduler.record(resolve_ticker(ticker) for ticker in tickers if ticker and ticker.strip())
+        results = await _market_data("get_stock_metrics_batch", tuple(tickers), get_stock_data_batch, tickers)
+        return make_payload("stock_metrics_batch", results=to_jsonable(results))
 
 @mcp.tool()
-def analyze_company(ticker: str, company_name: str) -> str:
+async def get_technicals(tickers: list[str]) -> dict[str, Any]:
+    """
+    Technical indicators (SMA/EMA, RSI, MACD, Bollinger bands, ATR, realized volatility and
+    beta vs NIFTY 50) for one or more tickers, computed together over their daily history.
+    Returns a "technicals" payload mapping each input ticker to its latest values or an error.
+    """
+    if len(tickers) > BATCH_MAX_TICKERS:
+        raise ValueError(f"Too many tickers ({len(tickers)}); the limit is {BATCH_MAX_TICKERS}")
+
+    with telemetry.trace("tool.get_technicals", tickers=len(tickers)):
+        scheduler.record(resolve_ticker(ticker) for ticker in tickers if ticker and ticker.strip())
+        results = await _market_data("get_technicals", tuple(tickers), compute_technicals, tickers)
+        return make_payload("technicals", benchmark=BENCHMARK, results=to_jsonable(results))
+
+@mcp.tool()
+async def analyze_company(ticker: str, company_name: str, ctx: Context) -> str:
     """
     Get AI analysis of a company based on ticker and company name.
+    If the caller sends a progress token, each generated chunk is also pushed as a
+    progress notification (`message` = the new text) while the model is still writing.
+    """
+    with telemetry.trace("tool.analyze_company", ticker=ticker):
+        key = (ticker.strip().upper(), company_name.strip())
+        chunks = analysis_flight.stream(
+            key,
+            lambda: stream_company_details(ticker, company_name),
+            LLM_POOL,
+            limiter=TOOL_LIMITERS["analyze_company"]
+        )
+
+        parts = []
+        async for chunk in chunks:
+            parts.append(chunk)
+            await ctx.report_progress(len(parts), None, chunk)
+        return "".join(parts)
+
+@mcp.tool()
+async def get_price_history(ticker: str, period: str = "1y", interval: str = "1d", points: int = CHART_DEFAULT_POINTS,
+                            encoding: str = "json") -> dict[str, Any]:
+    """
+    Close prices for a chart. period: 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y or max (everything
+    stored: 10y unless the server keeps more) with interval 1d, 1wk or 1mo; or an intraday
+    interval (1m, 5m, 15m, 30m, 60m) with period 1d or 5d (up to 1mo or 1y for the longer
+    intervals). The series is downsampled with LTTB to at most `points` samples. Returns a
+    "price_history" payload: a column block `series` ("t" epoch seconds, "close"),
+    `points_in` (bars before downsampling), `stats` over the full range (first/last/high/low
+    close, change_pct), or `error`.
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown encoding '{encoding}', expected one of {ENCODINGS}")
+    check_range(period, interval)
+    points = max(3, min(points, CHART_MAX_POINTS))
+
+    with telemetry.trace("tool.get_price_history", ticker=ticker, period=period, interval=interval):
+        key = (resolve_ticker(ticker), period, interval, points)
+        scheduler.record([key[0]])
+        result = await _market_data("get_price_history", key, load_price_history, ticker, period, interval, points)
+
+        with telemetry.span("encode"):
+            if "error" in result:
+                return make_payload("price_history", ticker=ticker, period=period, interval=interval, error=result["error"])
+            return make_payload(
+                "price_history", ticker=ticker, symbol=result["symbol"], period=period, interval=interval,
+                points_in=result["points_in"], stats=to_jsonable(result["stats"]),
+                series=encode_columns({"t": result["t"], "close": result["close"]}, encoding)
+            )
+
+@mcp.tool()
+async def portfolio_risk(tickers: list[str], weights: list[float] | None = None, lookback_days: int = RISK_LOOKBACK_DAYS,
+                         confidence_levels: list[float] | None = None, include_matrix: bool = True) -> dict[str, Any]:
+    """
+    Risk analytics for a basket held with `weights` (default equal; normalized to sum to 1)
+    over the last `lookback_days` daily returns. Returns a "portfolio_risk" payload with the
+    portfolio's historical and parametric (Gaussian) 1-day VaR/CVaR at each confidence level,
+    volatility, max drawdown and beta vs NIFTY 50; per-holding volatility, drawdown, beta and
+    risk contribution; the most/least correlated pairs; and, with include_matrix=True, the
+    full correlation matrix (rows/columns in `symbols` order). Losses are positive fractions.
+    """
+    if len(tickers) > RISK_MAX_TICKERS:
+        raise ValueError(f"Too many tickers ({len(tickers)}); the limit is {RISK_MAX_TICKERS}")
+    levels = tuple(confidence_levels or CONFIDENCE_LEVELS)
+    if not all(0.5 <= level < 1.0 for level in levels):
+        raise ValueError("Confidence levels must be between 0.5 and 1 (e.g. 0.95)")
+    lookback_days = max(20, min(lookback_days, 2520))
+
+    with telemetry.trace("tool.portfolio_risk", tickers=len(tickers)):
+        scheduler.record(resolve_ticker(ticker) for ticker in tickers if ticker and ticker.strip())
+        key = (tuple(tickers), tuple(weights or ()), lookback_days, levels, include_matrix)
+        result = await _market_data("portfolio_risk", key, compute_portfolio_risk, tickers, weights, lookback_days, levels, include_matrix)
+        with telemetry.span("encode"):
+            return make_payload("portfolio_risk", benchmark=BENCHMARK, **to_jsonable(result))
+
+@mcp.tool()
+async def backtest(tickers: list[str], strategy: str = "sma_cross", grid: dict[str, list[float]] | None = None,
+                   lookback_days: int = BACKTEST_LOOKBACK_DAYS, cost_bps: float = 10.0, top: int = 5,
+                   use_processes: bool = False) -> dict[str, Any]:
     """
-    return get_company_details(ticker, company_name)
+    Backtests a parameter grid of a signal rule on the tickers' stored daily history.
+    strategy="sma_cross" (grid keys "fast", "slow": long while SMA(fast) > SMA(slow)) or
+    "rsi" (grid keys "period", "lower", "upper": buy below `lower`, sell above `upper`);
+    keys left out use default ranges. Each trade costs `cost_bps`. Returns a "backtest"
+    payload: the `top` combinations by mean Sharpe ratio with their per-ticker stats and
+    equal-weight equity curve (one value per entry of `dates`), the best combination per
+    ticker, and buy-and-hold stats. use_processes=True spreads large grids over a process pool.
+    """
+    if len(tickers) > BATCH_MAX_TICKERS:
+        raise ValueError(f"Too many tickers ({len(tickers)}); the limit is {BATCH_MAX_TICKERS}")
+    lookback_days = max(20, min(lookback_days, 2520))
+    top = max(1, min(top, 20))
+
+    with telemetry.trace("tool.backtest", tickers=len(tickers), strategy=strategy):
+        scheduler.record(resolve_ticker(ticker) for ticker in tickers if ticker and ticker.strip())
+        result = await _market_data(
+            "backtest",
+            (tuple(tickers), strategy, json.dumps(grid, sort_keys=True), lookback_days, cost_bps, top),
+            run_backtest, tickers, strategy, grid, lookback_days, cost_bps, top, use_processes
+        )
+        with telemetry.span("encode"):
+            return make_payload("backtest", **to_jsonable(result))
+
+@mcp.tool()
+async def screen_stocks(filters: list[str | dict[str, Any]] | None = None, universe: str = SCREENER_DEFAULT_UNIVERSE,
+                        sort_by: str | None = None, descending: bool = True, limit: int = 50) -> dict[str, Any]:
+    """
+    Screens a whole universe (NIFTY50, NIFTY500 or a configured list) in one pass. Each
+    filter is "<field> <op> <number or field>" (e.g. "pe_ratio < 20", "pct_from_52w_high > -5",
+    "volume_ratio > 2", "current_price > sma_200") or {"field", "op", "value"}; op is one of
+    <, <=, >, >=, ==, !=. Fields: current_price, change_pct, 52_week_high/low,
+    pct_from_52w_high/low, volume, avg_volume_20d, volume_ratio, return_1m/3m/1y, market_cap,
+    pe_ratio, dividend_yield, sma_20/50/200, ema_20, rsi_14, macd, atr_14, volatility_20d,
+    beta. Fundamentals come from the cache and fill in over time. Returns a "screen" payload
+    with the matches ranked by `sort_by` (default: the first filter's field).
+    """
+    for spec in filters or []:
+        parse_filter(spec)
+
+    with telemetry.trace("tool.screen_stocks", universe=universe, filters=len(filters or [])):
+        key = (universe.strip().upper(), json.dumps(filters, sort_keys=True), sort_by, descending, limit)
+        result = await _market_data("screen_stocks", key, screen, filters, universe, sort_by, descending, limit)
+        with telemetry.span("encode"):
+            return make_payload("screen", **to_jsonable(result))
+
+async def _subscribe_quotes(tickers):
+    """
+    Subscribes (or renews) the tickers' symbols; symbols without a quote yet are polled now.
+    Returns {input_ticker: symbol}.
+    """
+    if len(tickers) > BATCH_MAX_TICKERS:
+        raise ValueError(f"Too many tickers ({len(tickers)}); the limit is {BATCH_MAX_TICKERS}")
+    symbols = {ticker: resolve_ticker(ticker) for ticker in tickers if ticker and ticker.strip()}
+    missing = quote_hub.subscribe(symbols.values())
+    if missing:
+        await _market_data("get_quote_updates", tuple(missing), quote_hub.poll, missing)
+    return symbols
+
+def _quote_payload(symbols, since):
+    cursor, deltas = quote_hub.updates(set(symbols.values()), since)
+    quotes = {ticker: deltas[symbol] for ticker, symbol in symbols.items() if symbol in deltas}
+    return make_payload("quote_updates", epoch=quote_hub.epoch, cursor=cursor, full=since == 0, quotes=quotes)
+
+@mcp.tool()
+async def get_quote_updates(tickers: list[str], since: int = 0, epoch: str | None = None) -> dict[str, Any]:
+    """
+    Live quotes by polling: subscribes the tickers to the server's shared quote poller and
+    returns a "quote_updates" payload with only the fields that changed after cursor `since`
+    (everything when since=0). Pass back the returned `cursor` and `epoch`; when `epoch` does
+    not match this server the full quotes are returned again (`full` is true).
+    """
+    with telemetry.trace("tool.get_quote_updates", tickers=len(tickers)):
+        if epoch is not None and epoch != quote_hub.epoch:
+            since = 0
+        symbols = await _subscribe_quotes(tickers)
+        if since == 0:
+            scheduler.record(symbols.values())
+        return _quote_payload(symbols, since)
+
+@mcp.tool()
+async def stream_quotes(tickers: list[str], ctx: Context, duration: float = 60) -> dict[str, Any]:
+    """
+    Live quotes by subscription: for up to `duration` seconds, every change to the tickers'
+    quotes is pushed as a progress notification whose `message` is a JSON "quote_updates"
+    payload holding only the changed fields (the first one holds full quotes). Returns the
+    full quotes when the subscription ends.
+    """
+    deadline = time.monotonic() + max(0.0, min(duration, QUOTE_STREAM_MAX_SECONDS))
+    symbols = await _subscribe_quotes(tickers)
+    scheduler.record(symbols.values())
+
+    since, pushes = 0, 0
+    renewed = time.monotonic()
+    while True:
+        if quote_hub.cursor > since:
+            payload = _quote_payload(symbols, since)
+            since = payload["cursor"]
+            if payload["quotes"]:
+                pushes += 1
+                await ctx.report_progress(pushes, None, json.dumps(payload))
+        if time.monotonic() >= deadline:
+            break
+        await anyio.sleep(min(QUOTE_PUSH_CHECK_SECONDS, max(0.0, deadline - time.monotonic())))
+        # Keep the lease alive while the stream is open
+        if time.monotonic() - renewed > quote_hub.lease_seconds / 2:
+            quote_hub.subscribe(symbols.values())
+            renewed = time.monotonic()
+    return _quote_payload(symbols, 0)
+
+@mcp.tool()
+def invalidate_analysis(ticker: str | None = None) -> dict[str, Any]:
+    """
+    Drops cached AI summaries for one ticker (or for every ticker when omitted), forcing
+    the next analyze_company call to search and regenerate.
+    """
+    dropped = invalidate_company_details(ticker)
+    return make_payload("analysis_invalidated", ticker=ticker, dropped=dropped)
+
+@mcp.tool()
+def get_cache_stats() -> dict[str, Any]:
+    """
+    Hit/miss/eviction counters and sizes for the server's data caches, plus request
+    coalescing counters and the state of the prefetch scheduler and live quote poller.
+    """
+    coalescing = {"market_data": market_data_flight.stats(), "analysis": analysis_flight.stats()}
+    return make_payload("cache_stats", caches=all_stats(), coalescing=coalescing, prefetch=scheduler.stats(),
+                        quotes=quote_hub.stats())
+
+# Sampled stats that only ever grow: exported as Prometheus counters, the rest as gauges
+_CUMULATIVE_STATS = {"hits", "stale_hits", "misses", "refreshes", "refresh_errors", "evictions", "executions", "coalesced"}
+
+def _sampled_metrics():
+    """
+    (gauges, counters) for the Prometheus dump: cache and coalescing stats.
+    """
+    sampled = []
+    for name, stats in all_stats().items():
+        sampled += [(f"cache_{field}", {"cache": name}, field, value) for field, value in stats.items()]
+    for name, flight in (("market_data", market_data_flight), ("analysis", analysis_flight)):
+        sampled += [(f"singleflight_{field}", {"flight": name}, field, value) for field, value in flight.stats().items()]
+
+    gauges, counters = [], []
+    for metric, labels, field, value in sampled:
+        if not isinstance(value, (int, float)):
+            continue
+        if field in _CUMULATIVE_STATS:
+            counters.append((f"{metric}_total", labels, value))
+        else:
+            gauges.append((metric, labels, value))
+    return gauges, counters
+
+@mcp.tool()
+def get_metrics(recent: int = 10) -> dict[str, Any]:
+    """
+    Server telemetry: per-stage latency summaries (tool calls, yfinance history/info/download,
+    DuckDuckGo search, LLM first token and generation), error and fallback counters, cache
+    stats, and the `recent` most recent tool-call traces with their stage breakdown.
+    """
+    return make_payload(
+        "metrics",
+        stages=telemetry.stage_summary(),
+        counters=telemetry.snapshot()["counters"],
+        caches=all_stats(),
+        recent_traces=telemetry.recent_traces(max(0, min(recent, 50)))
+    )
+
+@mcp.tool()
+def get_metrics_prometheus() -> str:
+    """
+    The same telemetry in Prometheus text exposition format.
+    """
+    return telemetry.prometheus_text(*_sampled_metrics())
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    # Scrape target when running with --transport sse / streamable-http
+    return PlainTextResponse(telemetry.prometheus_text(*_sampled_metrics()), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
-    mcp.run()
+    parser = argparse.ArgumentParser(description="AI Stock Agent MCP server")
+    parser.add_argument(
+        "--transport",
+        choices=["stdio", "sse", "streamable-http"],
+        default=os.getenv("MCP_TRANSPORT", "stdio"),
+        help="stdio (one private server per client) or a shared network transport"
+    )
+    parser.add_argument("--host", default=mcp.settings.host)
+    parser.add_argument("--port", type=int, default=mcp.settings.port)
+    args = parser.parse_args()
+
+    mcp.settings.host = args.host
+    mcp.settings.port = args.port
+
+    if PREFETCH_ENABLED == "1" or (PREFETCH_ENABLED == "auto" and args.transport != "stdio"):
+        scheduler.start()
+    mcp.run(transport=args.transport)
@@ -0,0 +1,319 @@
+"""
+Local symbol master for NSE-listed securities and the main Indian indices.
+
+The symbol lists are NSE's EQUITY_L.csv (main board), the ETF list and the SME (Emerge)
+list, merged into a small CSV under STOCK_CACHE_DIR and re-downloaded once it is older than
+SYMBOL_MASTER_MAX_AGE (rebuild it by hand with `python symbol_master.py`). It is indexed in
+memory for exact, prefix and fuzzy (trigram) lookups by symbol or company name, so typos
+and names like "Reliance Industries" are resolved without touching Yahoo.
+"""
+import argparse
+import bisect
+import csv
+import io
+import os
+import re
+import sys
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+MASTER_PATH = os.getenv("SYMBOL_MASTER_PATH", os.path.join(os.getenv("STOCK_CACHE_DIR", ".cache"), "symbol_master.csv"))
+NSE_EQUITY_LIST_URL = os.getenv("NSE_EQUITY_LIST_URL", "https://archives.nseindia.com/content/equities/EQUITY_L.csv")
+NSE_ETF_LIST_URL = os.getenv("NSE_ETF_LIST_URL", "https://archives.nseindia.com/content/equities/eq_etfseclist.csv")
+NSE_SME_LIST_URL = os.getenv("NSE_SME_LIST_URL", "https://archives.nseindia.com/emerge/corporates/content/SME_EQUITY_L.csv")
+# Lists merged into the master (set a URL to "" to leave that list out)
+SYMBOL_LIST_SOURCES = [url for url in (NSE_EQUITY_LIST_URL, NSE_ETF_LIST_URL, NSE_SME_LIST_URL) if url]
+# Download the symbol lists (in the background) on first use when no master file exists
+# yet, and again once it is older than MAX_AGE seconds so new listings are picked up
+AUTO_DOWNLOAD = os.getenv("SYMBOL_MASTER_AUTO_DOWNLOAD", "1") == "1"
+MAX_AGE = float(os.getenv("SYMBOL_MASTER_MAX_AGE", "86400"))
+# After a failed download, wait this long before trying again; the marker file's mtime
+# carries the failure across restarts
+RETRY_SECONDS = float(os.getenv("SYMBOL_MASTER_RETRY_SECONDS", "3600"))
+FAILURE_MARKER = f"{MASTER_PATH}.failed"
+
+# Indices are always known, whether or not the equity list is available
+INDICES = {
+    "^NSEI": "NIFTY 50",
+    "^NSEBANK": "NIFTY BANK",
+    "^CNXIT": "NIFTY IT",
+    "^BSESN": "S&P BSE SENSEX",
+    "^INDIAVIX": "INDIA VIX"
+}
+
+# Minimum trigram similarity (Dice coefficient) for a fuzzy match
+FUZZY_THRESHOLD = 0.35
+
+_NAME_SUFFIXES = re.compile(r"\b(LIMITED|LTD)\b")
+_NON_ALNUM = re.compile(r"[^A-Z0-9 ]+")
+_EXCHANGE_SUFFIX = re.compile(r"\.(NS|BO)$")
+
+def _normalize(text):
+    """
+    Upper-cases, drops punctuation and "Limited"/"Ltd", and collapses whitespace.
+    """
+    text = text.upper().replace("&", " AND ")
+    text = _NON_ALNUM.sub(" ", _NAME_SUFFIXES.sub(" ", text))
+    return " ".join(text.split())
+
+def _base(symbol):
+    # "RELIANCE.NS" -> "RELIANCE", "^NSEI" -> "NSEI"
+    return _EXCHANGE_SUFFIX.sub("", symbol.strip().upper().lstrip("^"))
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class _TrigramIndex:
+    """
+    Trigram -> sorted entry ids (int32 arrays), scored with one bincount per query.
+    """
+
+    def __init__(self, keys):
+        postings = {}
+        self.sizes = np.zeros(len(keys), dtype=np.int32)
+        for entry_id, key in enumerate(keys):
+            grams = _trigrams(key)
+            self.sizes[entry_id] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(entry_id)
+        self.postings = {gram: np.asarray(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    def scores(self, text):
+        grams = _trigrams(text)
+        hits = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not hits:
+            return np.zeros(len(self.sizes))
+        overlap = np.bincount(np.concatenate(hits), minlength=len(self.sizes))
+        return 2.0 * overlap / (len(grams) + self.sizes)
+
+class SymbolMaster:
+    """
+    In-memory index over (yahoo_symbol, company_name) entries.
+    """
+
+    def __init__(self, entries):
+        entries = list(dict(entries).items())
+        self.symbols = [symbol for symbol, _ in entries]
+        self.names = [name for _, name in entries]
+        self.has_equities = any(not symbol.startswith("^") for symbol in self.symbols)
+
+        self._by_symbol = {}
+        self._by_name = {}
+        prefix_keys = []
+        for entry_id, (symbol, name) in enumerate(entries):
+            self._by_symbol.setdefault(symbol, entry_id)
+            self._by_symbol.setdefault(_base(symbol), entry_id)
+            self._by_name.setdefault(_normalize(name), entry_id)
+            prefix_keys.append((_normalize(_base(symbol)), entry_id))
+            prefix_keys.append((_normalize(name), entry_id))
+
+        # Sorted keys for prefix search with bisect
+        prefix_keys.sort()
+        self._prefix_keys = [key for key, _ in prefix_keys]
+        self._prefix_ids = [entry_id for _, entry_id in prefix_keys]
+
+        self._symbol_grams = _TrigramIndex([_normalize(_base(symbol)) for symbol in self.symbols])
+        self._name_grams = _TrigramIndex([_normalize(name) for name in self.names])
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def is_known(self, symbol):
+        # Full Yahoo symbols only ("RELIANCE.NS", "^NSEI")
+        entry_id = self._by_symbol.get(symbol.upper())
+        return entry_id is not None and self.symbols[entry_id] == symbol.upper()
+
+    def name_of(self, symbol):
+        entry_id = self._by_symbol.get(symbol.upper())
+        return self.names[entry_id] if entry_id is not None else None
+
+    def lookup(self, query):
+        """
+        Exact match on a symbol (with or without exchange suffix) or a company name.
+        Returns the Yahoo symbol or None.
+        """
+        query = query.strip().upper()
+        for key in (query, _base(query)):
+            if key in self._by_symbol:
+                return self.symbols[self._by_symbol[key]]
+        entry_id = self._by_name.get(_normalize(query))
+        return self.symbols[entry_id] if entry_id is not None else None
+
+    def _entry(self, entry_id, match, score):
+        return {"symbol": self.symbols[entry_id], "name": self.names[entry_id], "match": match, "score": round(float(score), 3)}
+
+    def search(self, query, limit=10):
+        """
+        Ranked suggestions for a partial or misspelled symbol/company name: exact match
+        first, then prefix matches (shortest first), then fuzzy matches by trigram similarity.
+        """
+        normalized = _normalize(_base(query))
+        if not normalized:
+            return []
+
+        results = {}
+        exact = self.lookup(query)
+        if exact is not None:
+            results[self._by_symbol[exact]] = self._entry(self._by_symbol[exact], "exact", 1.0)
+
+        # 1. Prefix matches on symbols and names
+        start = bisect.bisect_left(self._prefix_keys, normalized)
+        prefix_hits = []
+        for position in range(start, len(self._prefix_keys)):
+            key = self._prefix_keys[position]
+            if not key.startswith(normalized):
+                break
+            prefix_hits.append((len(key), self._prefix_ids[position]))
+        for length, entry_id in sorted(prefix_hits):
+            if len(results) >= limit:
+                break
+            if entry_id not in results:
+                results[entry_id] = self._entry(entry_id, "prefix", len(normalized) / length)
+
+        # 2. Fuzzy matches to fill the remaining slots
+        if len(results) < limit:
+            scores = np.maximum(self._symbol_grams.scores(normalized), self._name_grams.scores(normalized))
+            candidates = np.flatnonzero(scores >= FUZZY_THRESHOLD)
+            for entry_id in candidates[np.argsort(-scores[candidates], kind="stable")]:
+                if len(results) >= limit:
+                    break
+                if int(entry_id) not in results:
+                    results[int(entry_id)] = self._entry(int(entry_id), "fuzzy", scores[entry_id])
+
+        return list(results.values())[:limit]
+
+# Company name columns: EQUITY_L / SME_EQUITY_L, and the ETF list
+_NAME_COLUMNS = ("NAME OF COMPANY", "SECURITYNAME", "SECURITY NAME")
+
+def _parse_symbol_list(text):
+    """
+    (symbol, name) rows from one of NSE's symbol lists (header names vary in case, spacing
+    and underscores between files).
+    """
+    reader = csv.DictReader(io.StringIO(text))
+    reader.fieldnames = [" ".join(field.replace("_", " ").split()).upper() for field in reader.fieldnames or []]
+    rows = []
+    for row in reader:
+        symbol = (row.get("SYMBOL") or "").strip().upper()
+        if symbol:
+            name = next((row[column].strip() for column in _NAME_COLUMNS if (row.get(column) or "").strip()), symbol)
+            rows.append((f"{symbol}.NS", name))
+    return rows
+
+def _read_source(source):
+    if re.match(r"https?://", source):
+        request = urllib.request.Request(source, headers={"User-Agent": "Mozilla/5.0"})
+        with urllib.request.urlopen(request, timeout=15) as response:
+            return response.read().decode("utf-8-sig")
+    with open(source, encoding="utf-8-sig") as f:
+        return f.read()
+
+def build(sources=None, path=MASTER_PATH):
+    """
+    Downloads (or reads, for local paths) NSE's symbol lists and writes them, merged, as the
+    master CSV. Every list must load, so a partial download never replaces a full master.
+    Returns the number of symbols written.
+    """
+    rows = {}
+    for source in sources or SYMBOL_LIST_SOURCES:
+        parsed = _parse_symbol_list(_read_source(source))
+        if not parsed:
+            raise ValueError(f"No symbols found in {source}")
+        for symbol, name in parsed:
+            rows.setdefault(symbol, name)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["symbol", "name"])
+        writer.writerows(rows.items())
+    os.replace(tmp_path, path)
+    try:
+        os.remove(f"{path}.failed")
+    except FileNotFoundError:
+        pass
+    return len(rows)
+
+def load(path=MASTER_PATH):
+    """
+    SymbolMaster over the indices plus the stored symbol lists (indices only if they are missing).
+    """
+    entries = dict(INDICES)
+    try:
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                entries.setdefault(row["symbol"], row["name"])
+    except FileNotFoundError:
+        pass
+    return SymbolMaster(entries.items())
+
+_master = None
+_master_lock = threading.Lock()
+# Modification time of the master file `_master` was loaded from
+_loaded_mtime = 0.0
+# Earliest time for the next download attempt (inf while one is running)
+_next_attempt = 0.0
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+def _download():
+    global _master, _loaded_mtime, _next_attempt
+    try:
+        build(path=MASTER_PATH)
+        mtime = _mtime(MASTER_PATH)
+        master = load(MASTER_PATH)
+    except Exception as e:
+        # Until a retry succeeds the previous master stays in use (indices only, and no
+        # validation, if there is none yet)
+        print(f"Symbol master download failed (retrying in {RETRY_SECONDS:.0f}s): {e}", file=sys.stderr)
+        try:
+            os.makedirs(os.path.dirname(FAILURE_MARKER) or ".", exist_ok=True)
+            with open(FAILURE_MARKER, "w") as f:
+                f.write(f"{e}\n")
+        except OSError:
+            pass
+        with _master_lock:
+            _next_attempt = time.time() + RETRY_SECONDS
+    else:
+        with _master_lock:
+            _master, _loaded_mtime = master, mtime
+            _next_attempt = 0.0
+
+def get_symbol_master():
+    """
+    The process-wide SymbolMaster. Never blocks on the network: without a master file the
+    indices-only master is returned while the symbol lists download in a background thread,
+    and an outdated one is used while it is refreshed. Picks up a master file rewritten by
+    another process.
+    """
+    global _master, _loaded_mtime, _next_attempt
+    with _master_lock:
+        mtime = _mtime(MASTER_PATH)
+        if _master is None or mtime > _loaded_mtime:
+            _master, _loaded_mtime = load(MASTER_PATH), mtime
+        outdated = not _master.has_equities or time.time() - mtime > MAX_AGE
+        if AUTO_DOWNLOAD and outdated and time.time() >= _next_attempt:
+            retry_at = _mtime(FAILURE_MARKER) + RETRY_SECONDS
+            if retry_at > time.time():
+                _next_attempt = retry_at
+            else:
+                _next_attempt = float("inf")
+                threading.Thread(target=_download, name="symbol-master-download", daemon=True).start()
+    return _master
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the local NSE symbol master.")
+    parser.add_argument("--source", action="append",
+                        help="URL or path of an NSE symbol list such as EQUITY_L.csv (repeatable; default: all configured lists)")
+    parser.add_argument("--output", default=MASTER_PATH)
+    args = parser.parse_args()
+    print(f"Wrote {build(args.source, args.output)} symbols to {args.output}")
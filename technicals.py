@@ -0,0 +1,251 @@
+"""
+Vectorized technical indicators.
+
+Every function takes 2-D float arrays shaped (n_tickers, n_days), oldest bar first, with
+NaN where a ticker has no bar, and returns arrays of the same shape. Work is done for all
+tickers at once: rolling windows use cumulative sums, and recursive filters (EMA, Wilder
+smoothing) step through time once with whole-column vector operations.
+"""
+import numpy as np
+
+from utils.stock_data import get_histories
+
+# Trading days per year, for annualizing volatility
+TRADING_DAYS = 252
+
+# Benchmark used for beta
+BENCHMARK = "^NSEI"
+
+def align(histories, fields=("open", "high", "low", "close", "adj_close", "volume")):
+    """
+    Aligns several `PriceHistory` objects on the union of their dates.
+    Returns (dates, {field: (n_tickers, n_days) float64 array}).
+    """
+    histories = list(histories)
+    if not histories:
+        return np.empty(0, dtype="datetime64[D]"), {field: np.empty((0, 0)) for field in fields}
+
+    dates = np.unique(np.concatenate([np.asarray(h["date"]) for h in histories]))
+    columns = {field: np.full((len(histories), len(dates)), np.nan) for field in fields}
+    for row, history in enumerate(histories):
+        positions = np.searchsorted(dates, np.asarray(history["date"]))
+        for field in fields:
+            columns[field][row, positions] = history[field]
+    return dates, columns
+
+def stack(histories, fields=("open", "high", "low", "close", "adj_close", "volume")):
+    """
+    Stacks each `PriceHistory`'s own bars, right-aligned: column -1 is every ticker's latest
+    bar and shorter histories are NaN-padded on the left. Unlike `align`, a day one ticker
+    did not trade never leaves a hole in another ticker's rolling windows.
+    Returns {field: (n_tickers, n_bars) float64 array}.
+    """
+    histories = list(histories)
+    length = max((len(history) for history in histories), default=0)
+    columns = {field: np.full((len(histories), length), np.nan) for field in fields}
+    for row, history in enumerate(histories):
+        if len(history):
+            for field in fields:
+                columns[field][row, length - len(history):] = history[field]
+    return columns
+
+def adjust(columns):
+    """
+    Scales the open/high/low/close arrays by `adj_close / close`, so price levels before a
+    split, bonus or dividend are comparable with today's (the latest bar is unchanged).
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = columns["adj_close"] / columns["close"]
+    factor = np.where(np.isfinite(factor) & (factor > 0), factor, 1.0)
+    return {
+        field: values * factor if field in ("open", "high", "low", "close") else values
+        for field, values in columns.items()
+    }
+
+def _rolling_sum(x, window):
+    """
+    Rolling sum over the last `window` bars; NaN unless all `window` values are present.
+    """
+    x = np.atleast_2d(x)
+    valid = ~np.isnan(x)
+    zero_pad = np.zeros((x.shape[0], 1))
+    total = np.concatenate([zero_pad, np.cumsum(np.where(valid, x, 0.0), axis=1)], axis=1)
+    count = np.concatenate([zero_pad, np.cumsum(valid, axis=1)], axis=1)
+
+    out = np.full(x.shape, np.nan)
+    if window <= x.shape[1]:
+        sums = total[:, window:] - total[:, :-window]
+        counts = count[:, window:] - count[:, :-window]
+        out[:, window - 1:] = np.where(counts == window, sums, np.nan)
+    return out
+
+def sma(x, window):
+    return _rolling_sum(x, window) / window
+
+def rolling_std(x, window, ddof=1):
+    x = np.atleast_2d(x)
+    mean = sma(x, window)
+    mean_sq = _rolling_sum(x * x, window) / window
+    var = np.maximum(mean_sq - mean * mean, 0.0) * window / (window - ddof)
+    return np.sqrt(var)
+
+def ewm(x, alpha):
+    """
+    Exponentially weighted mean (pandas `ewm(adjust=False)` semantics), seeded at each
+    row's first valid value. Missing bars carry the previous average forward.
+    """
+    x = np.atleast_2d(x)
+    out = np.full(x.shape, np.nan)
+    state = np.full(x.shape[0], np.nan)
+    for t in range(x.shape[1]):
+        column = x[:, t]
+        has_value = ~np.isnan(column)
+        seeded = ~np.isnan(state)
+        state = np.where(has_value & seeded, state + alpha * (column - state), state)
+        state = np.where(has_value & ~seeded, column, state)
+        out[:, t] = state
+    return out
+
+def ema(x, span):
+    return ewm(x, 2.0 / (span + 1.0))
+
+def wilder(x, period):
+    return ewm(x, 1.0 / period)
+
+def _shift(x, periods=1):
+    out = np.full(x.shape, np.nan)
+    out[:, periods:] = x[:, :-periods]
+    return out
+
+def rsi(close, period=14):
+    delta = close - _shift(close)
+    gain = wilder(np.where(delta > 0, delta, np.where(np.isnan(delta), np.nan, 0.0)), period)
+    loss = wilder(np.where(delta < 0, -delta, np.where(np.isnan(delta), np.nan, 0.0)), period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = gain / loss
+        out = 100.0 - 100.0 / (1.0 + rs)
+    # No losses in the window -> RSI 100
+    return np.where((loss == 0) & (gain > 0), 100.0, out)
+
+def macd(close, fast=12, slow=26, signal=9):
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return line, signal_line, line - signal_line
+
+def bollinger(close, window=20, num_std=2.0):
+    mid = sma(close, window)
+    width = num_std * rolling_std(close, window, ddof=0)
+    return mid, mid + width, mid - width
+
+def atr(high, low, close, period=14):
+    prev_close = _shift(close)
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return wilder(true_range, period)
+
+def log_returns(close):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.log(close / _shift(close))
+
+def realized_volatility(close, window=20):
+    """
+    Annualized standard deviation of daily log returns over `window` bars.
+    """
+    return rolling_std(log_returns(close), window) * np.sqrt(TRADING_DAYS)
+
+def beta(returns, market_returns, window=TRADING_DAYS):
+    """
+    Beta of each row of `returns` against a 1-D `market_returns`, over the last `window`
+    bars where both exist.
+    """
+    returns = np.atleast_2d(returns)[:, -window:]
+    market = np.broadcast_to(np.asarray(market_returns)[-window:], returns.shape)
+    mask = ~np.isnan(returns) & ~np.isnan(market)
+    n = mask.sum(axis=1)
+
+    r = np.where(mask, returns, 0.0)
+    m = np.where(mask, market, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r_mean = r.sum(axis=1) / n
+        m_mean = m.sum(axis=1) / n
+        cov = (np.where(mask, (r - r_mean[:, None]) * (m - m_mean[:, None]), 0.0)).sum(axis=1) / (n - 1)
+        var = (np.where(mask, (m - m_mean[:, None]) ** 2, 0.0)).sum(axis=1) / (n - 1)
+        out = cov / var
+    return np.where(n > 2, out, np.nan)
+
+def _latest(x):
+    """
+    Value at each row's latest bar (the last column of a `stack`ed array).
+    """
+    return x[:, -1] if x.shape[1] else np.full(x.shape[0], np.nan)
+
+def compute_snapshot(histories, benchmark=None):
+    """
+    Latest indicator values for many tickers at once.
+    `histories` is a list of `PriceHistory`; `benchmark` (optional) is the index history for beta.
+    Indicators run on each ticker's own, split/dividend adjusted bars; only beta lines the
+    tickers up with the benchmark by date.
+    Returns a list of dicts, one per history, in order.
+    """
+    histories = list(histories)
+    cols = adjust(stack(histories, fields=("high", "low", "close", "adj_close")))
+    close, high, low = cols["close"], cols["high"], cols["low"]
+
+    macd_line, macd_signal, macd_hist = macd(close)
+    bb_mid, bb_upper, bb_lower = bollinger(close)
+    indicators = {
+        "sma_20": sma(close, 20),
+        "sma_50": sma(close, 50),
+        "sma_200": sma(close, 200),
+        "ema_20": ema(close, 20),
+        "rsi_14": rsi(close, 14),
+        "macd": macd_line,
+        "macd_signal": macd_signal,
+        "macd_hist": macd_hist,
+        "bb_middle": bb_mid,
+        "bb_upper": bb_upper,
+        "bb_lower": bb_lower,
+        "atr_14": atr(high, low, close, 14),
+        "volatility_20d": realized_volatility(cols["adj_close"], 20)
+    }
+    latest = {name: _latest(values) for name, values in indicators.items()}
+
+    n = len(histories)
+    if benchmark is not None:
+        # Returns across a ticker's missing day are NaN and left out of the regression
+        _, aligned = align(histories + [benchmark], fields=("adj_close",))
+        returns = log_returns(aligned["adj_close"])
+        latest["beta"] = beta(returns[:n], returns[n])
+    else:
+        latest["beta"] = np.full(n, np.nan)
+
+    snapshots = []
+    for row, history in enumerate(histories):
+        snapshot = {name: float(values[row]) for name, values in latest.items()}
+        snapshot["as_of"] = str(history["date"][-1]) if len(history) else None
+        snapshots.append(snapshot)
+    return snapshots
+
+def get_technicals(tickers):
+    """
+    Indicator snapshot per ticker, using the cached/stored histories from `stock_data`.
+    Returns {input_ticker: indicators or {"error": ...}}.
+    """
+    tickers = [ticker for ticker in dict.fromkeys(tickers) if ticker and ticker.strip()]
+    try:
+        resolved, histories = get_histories(tickers + [BENCHMARK])
+    except Exception as e:
+        return {ticker: {"error": f"Exception during fetch: {str(e)}"} for ticker in tickers}
+
+    benchmark = histories.get(BENCHMARK)
+    if benchmark is not None and benchmark.empty:
+        benchmark = None
+
+    usable = [ticker for ticker in tickers if not histories[resolved[ticker]].empty]
+    snapshots = compute_snapshot([histories[resolved[ticker]] for ticker in usable], benchmark)
+
+    results = {ticker: {"error": f"No historical data found for {resolved[ticker]}. Symbol might be invalid or delisted."}
+               for ticker in tickers}
+    for ticker, snapshot in zip(usable, snapshots):
+        snapshot["symbol"] = resolved[ticker]
+        results[ticker] = snapshot
+    return results
@@ -0,0 +1,236 @@
+"""
+Lightweight in-process telemetry: timing spans, latency histograms and counters, with a
+JSON snapshot and a Prometheus text dump. Everything is process-local and thread-safe.
+
+    with telemetry.span("yfinance.info"):
+        ...
+
+Each span is observed in the `stage_duration_seconds{stage=...}` histogram; spans that
+raise are also counted in `stage_errors_total`. Spans recorded inside a `trace()` block
+(including ones run on `concurrency.run_in_pool` threads) are collected into that trace,
+and the most recent traces are kept for debugging.
+"""
+import bisect
+import collections
+import contextlib
+import contextvars
+import os
+import threading
+import time
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RECENT_TRACES = int(os.getenv("TELEMETRY_RECENT_TRACES", "50"))
+PROMETHEUS_PREFIX = "stock_agent_"
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """
+        Estimate by linear interpolation inside the bucket holding the q-th observation.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = BUCKETS[index - 1] if index > 0 else 0.0
+                upper = BUCKETS[index] if index < len(BUCKETS) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "max": self.max
+        }
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = collections.defaultdict(float)
+_recent = collections.deque(maxlen=RECENT_TRACES)
+_current_trace = contextvars.ContextVar("telemetry_trace", default=None)
+
+def _key(name, labels):
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def increment(name, value=1, **labels):
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+def observe(name, seconds, **labels):
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+def _record(stage, seconds, error=None, **labels):
+    observe("stage_duration_seconds", seconds, stage=stage, **labels)
+    if error is not None:
+        increment("stage_errors_total", stage=stage, error=error, **labels)
+    current = _current_trace.get()
+    if current is not None:
+        entry = {"stage": stage, "ms": round(seconds * 1000.0, 2), **labels}
+        if error is not None:
+            entry["error"] = error
+        current["spans"].append(entry)
+
+@contextlib.contextmanager
+def span(stage, **labels):
+    """
+    Times the block as `stage`. Labels must be low-cardinality (e.g. a tool name, not a ticker).
+    """
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _record(stage, time.perf_counter() - start, error, **labels)
+
+def record_duration(stage, seconds, **labels):
+    """
+    Records a duration measured elsewhere (e.g. time to first token) as if it were a span.
+    """
+    _record(stage, seconds, **labels)
+
+@contextlib.contextmanager
+def trace(name, **attributes):
+    """
+    Opens a trace for one request: the block is timed as stage `name`, and every span
+    recorded inside it is collected into the trace dict yielded here.
+    """
+    record = {"name": name, **attributes, "started": time.time(), "spans": []}
+    token = _current_trace.set(record)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield record
+    except Exception as e:
+        error = record["error"] = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        _current_trace.reset(token)
+        _record(name, elapsed, error)
+        record["ms"] = round(elapsed * 1000.0, 2)
+        with _lock:
+            _recent.append(record)
+
+def recent_traces(limit=10):
+    with _lock:
+        return list(_recent)[-limit:][::-1] if limit > 0 else []
+
+def snapshot():
+    """
+    All counters and histogram summaries (seconds) as plain dicts.
+    """
+    with _lock:
+        counters = [{"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(_counters.items())]
+        histograms = [{"name": name, "labels": dict(labels), **histogram.snapshot()}
+                      for (name, labels), histogram in sorted(_histograms.items())]
+    return {"counters": counters, "histograms": histograms}
+
+def stage_summary():
+    """
+    {stage: {count, p50_ms, p99_ms, ...}} for the stage_duration_seconds histogram.
+    """
+    def stage_name(labels):
+        labels = {key: value for key, value in labels.items() if key != "error"}
+        stage = labels.pop("stage")
+        return f"{stage}[{','.join(f'{key}={value}' for key, value in sorted(labels.items()))}]" if labels else stage
+
+    current = snapshot()
+    summary = {}
+    for histogram in current["histograms"]:
+        if histogram["name"] != "stage_duration_seconds":
+            continue
+        summary[stage_name(histogram["labels"])] = {
+            "count": histogram["count"],
+            "errors": 0,
+            **{f"{field}_ms": round(histogram[field] * 1000.0, 2) if histogram[field] is not None else None
+               for field in ("mean", "p50", "p90", "p99", "max")}
+        }
+    for counter in current["counters"]:
+        if counter["name"] == "stage_errors_total" and stage_name(counter["labels"]) in summary:
+            summary[stage_name(counter["labels"])]["errors"] += int(counter["value"])
+    return summary
+
+def _labels_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+def prometheus_text(gauges=(), counters=()):
+    """
+    Prometheus text exposition of all counters and histograms. `gauges` and `counters` are
+    optional iterables of (name, labels_dict, value) sampled by the caller (e.g. cache sizes,
+    and the hit/miss totals the caches keep themselves).
+    """
+    lines = []
+    sampled = [(_key(name, labels), value) for name, labels, value in counters]
+    # Sorted by (name, labels) so every metric family is one contiguous block
+    gauges = sorted((_key(name, labels), value) for name, labels, value in gauges)
+    with _lock:
+        counters = sorted(list(_counters.items()) + sampled)
+        histograms = sorted((key, histogram.snapshot(), list(histogram.counts)) for key, histogram in _histograms.items())
+
+    typed = set()
+    for (name, labels), value in counters:
+        metric = PROMETHEUS_PREFIX + name
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} counter")
+            typed.add(metric)
+        lines.append(f"{metric}{_labels_text(labels)} {value:g}")
+
+    for (name, labels), summary, counts in histograms:
+        metric = PROMETHEUS_PREFIX + name
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} histogram")
+            typed.add(metric)
+        cumulative = 0
+        for bound, count in zip(list(BUCKETS) + ["+Inf"], counts):
+            cumulative += count
+            lines.append(f"{metric}_bucket{_labels_text(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{metric}_sum{_labels_text(labels)} {summary['sum']:.6f}")
+        lines.append(f"{metric}_count{_labels_text(labels)} {summary['count']}")
+
+    for (name, labels), value in gauges:
+        metric = PROMETHEUS_PREFIX + name
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} gauge")
+            typed.add(metric)
+        lines.append(f"{metric}{_labels_text(labels)} {value:g}")
+
+    return "\n".join(lines) + "\n"
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _recent.clear()
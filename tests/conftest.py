@@ -0,0 +1,14 @@
+"""
+The modules import each other as `utils.<module>` (this directory is the `utils` package of
+the app), so register the repository root under that name before the tests import anything.
+"""
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if "utils" not in sys.modules:
+    package = types.ModuleType("utils")
+    package.__path__ = [ROOT]
+    sys.modules["utils"] = package
@@ -0,0 +1,127 @@
+import pickle
+import time
+
+from utils import cache
+from utils.cache import TTLCache
+
+def make_cache(tmp_path, name="test", **kwargs):
+    kwargs.setdefault("ttl", 60)
+    cache.CACHES.pop(name, None)
+    return TTLCache(name, persist_dir=str(tmp_path) if tmp_path else None, **kwargs)
+
+def test_fresh_stale_and_expired(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    c = make_cache(None, ttl=10, stale_ttl=20)
+    c.set("a", 1)
+
+    now[0] += 5
+    assert c.get("a") == 1
+    now[0] += 10
+    assert c.get("a") == 1
+    now[0] += 20
+    assert c.get("a", default="gone") == "gone"
+    stats = c.stats()
+    assert (stats["hits"], stats["stale_hits"], stats["misses"]) == (1, 1, 1)
+
+def test_stale_hit_refreshes_in_background(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    c = make_cache(None, ttl=10, stale_ttl=100)
+    c.set("a", 1)
+    now[0] += 50
+
+    assert c.get("a", loader=lambda: 2) == 1
+    cache._refresh_pool.submit(lambda: None).result()
+    assert c.get("a") == 2
+
+def test_lru_eviction_by_entries_and_bytes():
+    c = make_cache(None, max_entries=2)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")
+    c.set("c", 3)
+    assert c.get("b") is None and c.get("a") == 1
+
+    c = make_cache(None, max_bytes=3000)
+    c.set("a", b"x" * 1000)
+    c.set("b", b"x" * 1000)
+    c.set("c", b"x" * 1500)
+    assert c.get("a") is None and c.get("c") is not None
+
+def test_persists_and_reloads(tmp_path):
+    c = make_cache(tmp_path)
+    c.set("a", {"price": 1.0})
+    c.save()
+
+    assert make_cache(tmp_path).get("a") == {"price": 1.0}
+
+def test_saves_happen_off_the_calling_thread(tmp_path, monkeypatch):
+    c = make_cache(tmp_path, persist_interval=0)
+    threads = []
+    monkeypatch.setattr(c, "save", lambda: threads.append(cache.threading.current_thread().name))
+    c.set("a", 1)
+    cache._save_pool.submit(lambda: None).result()
+
+    assert threads and all(name.startswith("cache-save") for name in threads)
+
+def test_save_merges_with_other_processes(tmp_path):
+    ours = make_cache(tmp_path)
+    # Another process saved after this one started
+    with open(ours.persist_path, "wb") as f:
+        pickle.dump({"b": (time.time(), "theirs"), "shared": (time.time(), "new")}, f)
+    ours.set("a", "ours")
+    ours.set("shared", "old", stored_at=time.time() - 10)
+    ours.save()
+
+    reloaded = make_cache(tmp_path)
+    assert reloaded.get("a") == "ours"
+    assert reloaded.get("b") == "theirs"
+    assert reloaded.get("shared") == "new"
+
+def test_invalidated_keys_are_not_merged_back(tmp_path):
+    c = make_cache(tmp_path)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.save()
+    c.invalidate("a")
+    c.save()
+    assert make_cache(tmp_path).get("a") is None
+
+    c.invalidate()
+    c.save()
+    assert make_cache(tmp_path).get("b") is None
+
+def test_peek_does_not_count_or_reorder():
+    c = make_cache(None, max_entries=2)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.peek("a") == 1 and c.peek("missing", default=0) == 0
+    c.set("c", 3)
+
+    stats = c.stats()
+    assert (stats["hits"], stats["misses"]) == (0, 0)
+    # "a" was not moved to the end by peek, so it was evicted first
+    assert c.peek("a") is None and c.peek("b") == 2
+
+def test_writes_during_a_background_save_are_saved_too(tmp_path, monkeypatch):
+    c = make_cache(tmp_path, persist_interval=0.05)
+    started, release = cache.threading.Event(), cache.threading.Event()
+    real_merge = c._merge
+
+    def slow_merge(*args):
+        # The snapshot is already taken; hold the save here
+        started.set()
+        release.wait(5)
+        return real_merge(*args)
+
+    monkeypatch.setattr(c, "_merge", slow_merge)
+    c.set("a", 1)
+    assert started.wait(5)
+    c.set("b", 2)
+    release.set()
+
+    deadline = time.time() + 5
+    while time.time() < deadline and make_cache(tmp_path, name="test").peek("b") is None:
+        time.sleep(0.05)
+    assert make_cache(tmp_path, name="test").peek("b") == 2
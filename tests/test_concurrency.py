@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.concurrency import SingleFlight, StreamingSingleFlight, run_in_pool
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "quote"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("TCS.NS", fetch) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["quote"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "executions": 1, "coalesced": 4}
+
+def test_key_is_released_after_the_call():
+    flight = SingleFlight()
+    counter = iter(range(10))
+
+    async def fetch():
+        return next(counter)
+
+    async def main():
+        return [await flight.do("k", fetch), await flight.do("k", fetch)]
+
+    assert asyncio.run(main()) == [0, 1]
+
+def test_errors_reach_every_waiter():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream down")
+
+    async def main():
+        return await asyncio.gather(*(flight.do("k", fail) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.stats()["in_flight"] == 0
+
+def test_cancelling_one_waiter_keeps_the_shared_call():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(flight.do("k", fetch))
+        second = asyncio.ensure_future(flight.do("k", fetch))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "done"
+
+def test_streaming_callers_get_every_chunk_from_one_run():
+    flight = StreamingSingleFlight()
+    pool = ThreadPoolExecutor(max_workers=2)
+    runs = []
+
+    def generate():
+        runs.append(threading.current_thread().name)
+        for chunk in ("a", "b", "c"):
+            time.sleep(0.01)
+            yield chunk
+
+    async def consume():
+        return [chunk async for chunk in flight.stream("k", generate, pool)]
+
+    async def main():
+        return await asyncio.gather(consume(), consume())
+
+    assert asyncio.run(main()) == [["a", "b", "c"], ["a", "b", "c"]]
+    assert len(runs) == 1
+
+def test_run_in_pool_passes_arguments():
+    pool = ThreadPoolExecutor(max_workers=1)
+    assert asyncio.run(run_in_pool(pool, lambda a, b=0: a + b, 1, b=2)) == 3
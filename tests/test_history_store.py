@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import history_store
+
+TODAY = np.datetime64("2024-06-28", "D")
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(history_store, "STORE_DIR", str(tmp_path))
+    monkeypatch.setattr(history_store, "_today", lambda: TODAY)
+    monkeypatch.setattr(history_store, "_listed_from", {})
+    return tmp_path
+
+class FakeYahoo:
+    """
+    Serves business-day bars from `first` to TODAY at `price * scale`, and records the
+    start of every download. Once `downloads_left` reaches zero, downloads come back empty.
+    """
+
+    def __init__(self, monkeypatch, first="2020-01-01", price=100.0):
+        self.first = np.datetime64(first, "D")
+        self.price = price
+        self.scale = 1.0
+        self.starts = []
+        self.downloads_left = None
+        monkeypatch.setattr(history_store, "_download", self.download)
+        monkeypatch.setattr(history_store, "_download_many", lambda symbols, start: {
+            symbol: self.download(symbol, start) for symbol in symbols
+        })
+
+    def download(self, symbol, start):
+        self.starts.append(np.datetime64(start, "D"))
+        if self.downloads_left is not None:
+            if self.downloads_left == 0:
+                return np.empty(0, dtype=history_store.BAR_DTYPE)
+            self.downloads_left -= 1
+        dates = pd.bdate_range(max(self.first, np.datetime64(start, "D")), TODAY)
+        close = self.price * self.scale * np.ones(len(dates))
+        frame = pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close,
+                              "Adj Close": close, "Volume": 1e5}, index=dates)
+        return history_store.frame_to_bars(frame)
+
+def test_merge_overwrites_overlap_and_trims_old_bars(monkeypatch):
+    monkeypatch.setattr(history_store, "MAX_DAYS", 30)
+    dates = np.arange(TODAY - 40, TODAY, dtype="datetime64[D]")
+    existing = np.zeros(len(dates), dtype=history_store.BAR_DTYPE)
+    existing["date"], existing["close"] = dates, 1.0
+    new_bars = np.zeros(3, dtype=history_store.BAR_DTYPE)
+    new_bars["date"], new_bars["close"] = np.arange(TODAY - 2, TODAY + 1, dtype="datetime64[D]"), 2.0
+
+    merged = history_store._merge("X", existing, new_bars)
+    assert merged["date"][0] == TODAY - 30
+    assert merged["date"][-1] == TODAY and np.all(np.diff(merged["date"]) == np.timedelta64(1, "D"))
+    assert list(merged["close"][-4:]) == [1.0, 2.0, 2.0, 2.0]
+    assert np.array_equal(history_store.load("X").bars, merged)
+
+def test_second_sync_only_fetches_the_tail(monkeypatch):
+    yahoo = FakeYahoo(monkeypatch)
+    first = history_store.sync("X.NS", min_days=100)
+    second = history_store.sync("X.NS", min_days=100)
+
+    assert yahoo.starts[0] == TODAY - 100
+    assert yahoo.starts[1] == first["date"][-2]
+    assert np.array_equal(first.bars, second.bars)
+
+def test_unchanged_tail_is_not_rewritten(monkeypatch):
+    FakeYahoo(monkeypatch)
+    history_store.sync("X.NS", min_days=100)
+    writes = []
+    monkeypatch.setattr(history_store, "_write", lambda symbol, bars: writes.append(symbol))
+
+    # The quote poller does this every few seconds; nothing new means no file rewrite
+    history_store.sync_many(["X.NS"], min_days=100)
+    assert writes == []
+
+def test_rebased_history_is_downloaded_again(monkeypatch):
+    yahoo = FakeYahoo(monkeypatch)
+    history_store.sync("X.NS", min_days=100)
+    # A 1:2 split: Yahoo now reports every earlier bar at half the price
+    yahoo.scale = 0.5
+    history = history_store.sync("X.NS", min_days=100)
+
+    assert len(yahoo.starts) == 3 and yahoo.starts[2] <= TODAY - 100
+    assert np.all(history["close"] == 50.0)
+
+def test_partial_last_bar_is_not_a_rebase(monkeypatch):
+    yahoo = FakeYahoo(monkeypatch)
+    history_store.sync("X.NS", min_days=100)
+    bars = np.array(history_store.load("X.NS").bars)
+    bars["close"][-1] = 90.0
+    history_store._write("X.NS", bars)
+
+    history = history_store.sync("X.NS", min_days=100)
+    assert len(yahoo.starts) == 2
+    assert history["close"][-1] == 100.0
+
+def test_recent_listing_counts_as_covered(monkeypatch):
+    yahoo = FakeYahoo(monkeypatch, first="2024-05-01")
+    history = history_store.sync("NEW.NS", min_days=365)
+    assert history_store.covers(history, 365)
+    assert history_store.covers(history, 3000)
+
+    history_store.sync_many(["NEW.NS"], min_days=365)
+    assert yahoo.starts[-1] > TODAY - 365
+
+    # The marker is kept on disk for other processes
+    history_store._listed_from.clear()
+    assert history_store.listed_from("NEW.NS") == history["date"][0]
+
+def test_sync_many_refetches_only_rebased_symbols(monkeypatch):
+    yahoo = FakeYahoo(monkeypatch)
+    history_store.sync_many(["A.NS", "B.NS"], min_days=100)
+    bars = np.array(history_store.load("B.NS").bars)
+    bars["adj_close"][:-1] *= 1.01
+    history_store._write("B.NS", bars)
+
+    yahoo.starts.clear()
+    histories = history_store.sync_many(["A.NS", "B.NS"], min_days=100)
+    assert list(histories) == ["A.NS", "B.NS"]
+    assert sum(start <= TODAY - 100 for start in yahoo.starts) == 1
+    assert np.all(histories["B.NS"]["adj_close"] == 100.0)
+
+def test_empty_refetch_keeps_the_stored_history(monkeypatch):
+    yahoo = FakeYahoo(monkeypatch, first="2024-05-01")
+    stored = np.array(history_store.sync("NEW.NS", min_days=365).bars)
+    yahoo.scale = 0.5
+    # The tail shows a re-base, but the full re-download comes back empty
+    yahoo.downloads_left = 1
+    histories = history_store.sync_many(["NEW.NS"], min_days=365)
+
+    assert len(yahoo.starts) == 3 and yahoo.starts[2] <= TODAY - 365
+    assert np.array_equal(histories["NEW.NS"].bars, stored)
+    assert np.array_equal(history_store.load("NEW.NS").bars, stored)
+    history_store._listed_from.clear()
+    assert history_store.listed_from("NEW.NS") == stored["date"][0]
@@ -0,0 +1,62 @@
+import asyncio
+import itertools
+
+import pytest
+
+from utils import mcp_pool
+from utils.mcp_pool import MCPClientPool
+
+class FakeSession:
+    """
+    Stands in for an initialized ClientSession; every call answers with the session's id.
+    """
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+
+    async def call_tool(self, name, arguments=None, read_timeout_seconds=None, progress_callback=None):
+        await asyncio.sleep(60 if name == "hang" else 0.02)
+        return self.session_id
+
+    async def send_ping(self):
+        pass
+
+@pytest.fixture
+def pool(monkeypatch):
+    ids = itertools.count()
+
+    async def open_session(self, stack):
+        return FakeSession(next(ids))
+
+    monkeypatch.setattr(MCPClientPool, "_open_session", open_session)
+    pool = MCPClientPool(pool_size=2, session_concurrency=1)
+    yield pool
+    pool.close()
+
+def test_unpinned_calls_spread_over_the_pool(pool):
+    futures = [pool.submit("get_quote_updates") for _ in range(8)]
+    assert len({future.result(5) for future in futures}) == 2
+
+def test_pinned_calls_share_one_server(pool):
+    futures = [pool.submit("get_quote_updates", pinned=True) for _ in range(8)]
+    assert len({future.result(5) for future in futures}) == 1
+
+def test_timeout_covers_the_wait_for_a_session(pool):
+    # Both sessions are busy with calls that never finish
+    pool.submit("hang", timeout=60)
+    pool.submit("hang", timeout=60)
+    with pytest.raises(TimeoutError):
+        pool.call_tool("get_quote_updates", timeout=0.2)
+
+def test_calls_fail_once_the_server_will_not_start(monkeypatch):
+    async def open_session(self, stack):
+        raise OSError("no such server")
+
+    monkeypatch.setattr(MCPClientPool, "_open_session", open_session)
+    monkeypatch.setattr(mcp_pool, "SPAWN_ATTEMPTS", 2)
+    pool = MCPClientPool(pool_size=1)
+    try:
+        with pytest.raises(RuntimeError, match="no such server"):
+            pool.call_tool("get_quote_updates", timeout=10)
+    finally:
+        pool.close()
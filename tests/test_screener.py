@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from utils import screener
+from test_technicals import make_history
+
+def test_fields_come_from_each_symbols_own_bars():
+    dates = pd.bdate_range("2024-01-01", periods=300).values.astype("datetime64[D]")
+    close = np.linspace(100.0, 130.0, len(dates))
+    full = make_history("A", dates, close)
+    # B did not trade on the latest date
+    halted = make_history("B", dates[:-1], close[:-1] * 2)
+
+    table = screener.build_table([full, halted])
+    assert table["current_price"][1] == np.float32(close[-2] * 2)
+    assert table["previous_close"][1] == np.float32(close[-3] * 2)
+    assert table["volume"][1] == 1e5 and table["volume_ratio"][1] == 1.0
+    assert table["as_of"] == str(dates[-1])
+
+def test_returns_and_range_are_adjusted():
+    dates = pd.bdate_range("2024-01-01", periods=300).values.astype("datetime64[D]")
+    # A 1:2 split 10 sessions ago: quoted prices halve, adjusted prices stay flat
+    close = np.where(np.arange(len(dates)) < len(dates) - 10, 200.0, 100.0)
+    factor = np.where(np.arange(len(dates)) < len(dates) - 10, 0.5, 1.0)
+    table = screener.build_table([make_history("S", dates, close, factor)])
+
+    assert table["return_1m"][0] == 0.0 and table["return_1y"][0] == 0.0
+    assert table["52_week_high"][0] == 100.0 and table["pct_from_52w_high"][0] == 0.0
@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+from utils.cache import TTLCache
+from utils.search_client import SearchClient
+
+class SlowBackend:
+    def __init__(self, results):
+        self.results_to_return = results
+        self.calls = 0
+        self.release = threading.Event()
+
+    def results(self, query, max_results=4):
+        self.calls += 1
+        self.release.wait(5)
+        return self.results_to_return
+
+def make_client(backend):
+    return SearchClient(lambda: backend, rate_per_minute=6000, burst=10, max_retries=0,
+                        cache=TTLCache("search-test", ttl=60))
+
+def run_concurrently(client, backend, query, callers=3):
+    outcomes = [None] * callers
+
+    def call(i):
+        try:
+            outcomes[i] = client.search(query)
+        except BaseException as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,), daemon=True) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    while backend.calls == 0:
+        pass
+    backend.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert not any(thread.is_alive() for thread in threads)
+    return outcomes
+
+def test_identical_queries_share_one_request():
+    backend = SlowBackend([{"snippet": "news", "title": "t", "link": "l"}])
+    outcomes = run_concurrently(make_client(backend), backend, "TCS news")
+    assert outcomes == ["news"] * 3
+    assert backend.calls == 1
+
+def test_unexpected_error_reaches_every_waiter():
+    # A malformed backend response fails in the owner after the request returned
+    backend = SlowBackend([{"title": "no snippet"}])
+    outcomes = run_concurrently(make_client(backend), backend, "TCS news")
+    assert all(isinstance(outcome, KeyError) for outcome in outcomes)
+    with pytest.raises(KeyError):
+        make_client(backend).search("TCS news")
@@ -0,0 +1,95 @@
+import os
+import time
+
+import pytest
+
+from utils import stock_data, symbol_master
+from utils.symbol_master import SymbolMaster
+
+EQUITY_L = """SYMBOL,NAME OF COMPANY, SERIES, DATE OF LISTING
+RELIANCE,Reliance Industries Limited,EQ,29-NOV-1995
+INFY,Infosys Limited,EQ,08-FEB-1995
+TCS,Tata Consultancy Services Limited,EQ,25-AUG-2004
+"""
+ETF_LIST = """Symbol,Underlying,SecurityName,DateofListing
+NIFTYBEES,Nifty 50 Index,Nippon India ETF Nifty 50 BeES,08-JAN-2002
+"""
+SME_LIST = """SYMBOL,NAME_OF_COMPANY,SERIES,DATE_OF_LISTING
+NEWSME,New SME Limited,SM,01-JUN-2024
+"""
+
+@pytest.fixture
+def master():
+    return SymbolMaster(list(symbol_master.INDICES.items()) + [
+        ("RELIANCE.NS", "Reliance Industries Limited"),
+        ("INFY.NS", "Infosys Limited"),
+        ("TCS.NS", "Tata Consultancy Services Limited"),
+        ("NIFTYBEES.NS", "Nippon India ETF Nifty 50 BeES")
+    ])
+
+@pytest.fixture
+def lists(tmp_path):
+    paths = []
+    for name, text in (("EQUITY_L.csv", EQUITY_L), ("eq_etfseclist.csv", ETF_LIST), ("SME_EQUITY_L.csv", SME_LIST)):
+        path = tmp_path / name
+        path.write_text(text)
+        paths.append(str(path))
+    return paths
+
+def test_lookup_by_symbol_or_company_name(master):
+    assert master.lookup("reliance") == "RELIANCE.NS"
+    assert master.lookup("INFY.BO") == "INFY.NS"
+    assert master.lookup("Infosys Ltd") == "INFY.NS"
+    assert master.lookup("NSEI") == "^NSEI"
+    assert master.lookup("RELIANC") is None
+
+def test_search_ranks_exact_then_prefix_then_fuzzy(master):
+    assert [match["match"] for match in master.search("TCS")][:1] == ["exact"]
+    assert master.search("Tata Con")[0]["symbol"] == "TCS.NS"
+    fuzzy = master.search("Relaince Industries")
+    assert fuzzy[0]["symbol"] == "RELIANCE.NS" and fuzzy[0]["match"] == "fuzzy"
+    assert master.search("") == []
+
+def test_is_listed(master, monkeypatch):
+    monkeypatch.setattr(stock_data, "get_symbol_master", lambda: master)
+    assert stock_data.is_listed("RELIANCE.NS") and stock_data.is_listed("NIFTYBEES.NS")
+    assert stock_data.is_listed("^NSEBANK")
+    assert not stock_data.is_listed("RELIANC.NS")
+    # Without the symbol lists nothing is rejected
+    monkeypatch.setattr(stock_data, "get_symbol_master", lambda: SymbolMaster(symbol_master.INDICES.items()))
+    assert stock_data.is_listed("RELIANC.NS")
+
+def test_build_merges_equities_etfs_and_sme(lists, tmp_path):
+    path = str(tmp_path / "master.csv")
+    assert symbol_master.build(lists, path) == 5
+    master = symbol_master.load(path)
+    assert master.is_known("NIFTYBEES.NS") and master.is_known("NEWSME.NS") and master.is_known("^NSEI")
+    assert master.name_of("NEWSME.NS") == "New SME Limited"
+
+def test_failed_list_keeps_the_previous_master(lists, tmp_path):
+    path = str(tmp_path / "master.csv")
+    symbol_master.build(lists, path)
+    with pytest.raises(FileNotFoundError):
+        symbol_master.build(lists + [str(tmp_path / "missing.csv")], path)
+    assert len(symbol_master.load(path)) == len(symbol_master.INDICES) + 5
+
+def test_outdated_master_is_refreshed(lists, tmp_path, monkeypatch):
+    path = str(tmp_path / "master.csv")
+    symbol_master.build(lists[:1], path)
+    stale = time.time() - 2 * symbol_master.MAX_AGE
+    os.utime(path, (stale, stale))
+
+    monkeypatch.setattr(symbol_master, "MASTER_PATH", path)
+    monkeypatch.setattr(symbol_master, "FAILURE_MARKER", f"{path}.failed")
+    monkeypatch.setattr(symbol_master, "SYMBOL_LIST_SOURCES", lists)
+    monkeypatch.setattr(symbol_master, "AUTO_DOWNLOAD", True)
+    monkeypatch.setattr(symbol_master, "_master", None)
+    monkeypatch.setattr(symbol_master, "_loaded_mtime", 0.0)
+    monkeypatch.setattr(symbol_master, "_next_attempt", 0.0)
+
+    # The outdated master answers straight away while the lists download in the background
+    assert not symbol_master.get_symbol_master().is_known("NIFTYBEES.NS")
+    deadline = time.time() + 5
+    while time.time() < deadline and not symbol_master.get_symbol_master().is_known("NIFTYBEES.NS"):
+        time.sleep(0.02)
+    assert symbol_master.get_symbol_master().is_known("NIFTYBEES.NS")
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from utils import technicals
+from utils.history_store import BAR_DTYPE, PriceHistory
+
+def make_history(symbol, dates, close, factor=1.0):
+    bars = np.zeros(len(dates), dtype=BAR_DTYPE)
+    bars["date"] = dates
+    bars["open"] = bars["high"] = bars["low"] = bars["close"] = close
+    bars["adj_close"] = close * factor
+    bars["volume"] = 1e5
+    return PriceHistory(symbol, bars)
+
+def test_missing_bar_in_one_ticker_does_not_affect_its_indicators():
+    dates = pd.bdate_range("2024-01-01", periods=120).values.astype("datetime64[D]")
+    close = 100.0 + np.cumsum(np.random.default_rng(1).normal(0, 1, len(dates)))
+    full = make_history("A", dates, close)
+    # B skipped a session near the end (e.g. a trading halt)
+    gap = np.arange(len(dates)) != len(dates) - 3
+    halted = make_history("B", dates[gap], close[gap])
+
+    snapshots = technicals.compute_snapshot([full, halted])
+    expected = pd.Series(close[gap]).rolling(20).mean().iloc[-1]
+    assert np.isclose(snapshots[1]["sma_20"], expected)
+    assert not np.isnan(snapshots[1]["rsi_14"])
+    assert np.isclose(snapshots[0]["sma_20"], pd.Series(close).rolling(20).mean().iloc[-1])
+
+def test_indicators_use_adjusted_prices():
+    dates = pd.bdate_range("2024-01-01", periods=60).values.astype("datetime64[D]")
+    # A 1:2 split half way: quoted prices halve, adjusted prices stay flat
+    close = np.where(np.arange(len(dates)) < 30, 200.0, 100.0)
+    factor = np.where(np.arange(len(dates)) < 30, 0.5, 1.0)
+    history = make_history("S", dates, close, factor)
+
+    snapshot = technicals.compute_snapshot([history])[0]
+    assert np.isclose(snapshot["sma_50"], 100.0)
+    assert np.isclose(snapshot["atr_14"], 0.0)
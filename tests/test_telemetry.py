@@ -0,0 +1,18 @@
+from utils import telemetry
+
+def test_prometheus_families_are_contiguous_and_typed():
+    telemetry.reset()
+    gauges = [("cache_entries", {"cache": "b"}, 2), ("cache_bytes", {"cache": "a"}, 10), ("cache_entries", {"cache": "a"}, 1)]
+    counters = [("cache_hits_total", {"cache": "b"}, 5), ("cache_misses_total", {"cache": "a"}, 3),
+                ("cache_hits_total", {"cache": "a"}, 4)]
+    lines = telemetry.prometheus_text(gauges, counters).splitlines()
+
+    prefix = telemetry.PROMETHEUS_PREFIX
+    assert f"# TYPE {prefix}cache_hits_total counter" in lines
+    assert f"# TYPE {prefix}cache_entries gauge" in lines
+    samples = [line.split("{")[0] for line in lines if not line.startswith("#")]
+    # Each family appears as one block, right after its TYPE line
+    assert len(set(samples)) == sum(1 for line in lines if line.startswith("# TYPE"))
+    blocks = [name for i, name in enumerate(samples) if i == 0 or samples[i - 1] != name]
+    assert len(blocks) == len(set(blocks))
+    assert lines.index(f'{prefix}cache_entries{{cache="a"}} 1') < lines.index(f'{prefix}cache_entries{{cache="b"}} 2')